@@ -1,3 +1,4 @@
+import click
 from flask import Flask
 from .extensions import db, login_manager
 from .utils.filters import format_currency
@@ -13,15 +14,23 @@ def create_app():
 
     import os
     os.makedirs(app.instance_path, exist_ok=True)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(app.instance_path, 'devsoft.db')
+    # Banco: DATABASE_URL (Postgres com pool) ou SQLite local em instance/devsoft.db
+    from .utils.banco import url_do_banco, opcoes_do_engine, configurar_sqlite
+    app.config['SQLALCHEMY_DATABASE_URI'] = url_do_banco(app.instance_path)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_do_engine(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     db.init_app(app)
     login_manager.init_app(app)
 
+    # 👇 PERFIL DO SQLITE (WAL, busy_timeout...) aplicado a cada conexão
+    with app.app_context():
+        configurar_sqlite(db.engine, app.config.get('SQLITE_PRAGMAS'))
+
     # 👇 VERIFICAÇÃO GLOBAL DE AMBIENTE
     from flask import request, redirect, url_for, flash
     from flask_login import current_user
+    from .utils.permissoes import eh_master, permissoes_do_usuario
 
     @app.before_request
     def verificar_ambiente():
@@ -33,11 +42,11 @@ def create_app():
             return
 
         # Master tem acesso total
-        if hasattr(current_user, 'us_email') and current_user.us_email in {'cruz@devsoft', 'master@system'}:
+        if eh_master(current_user):
             return
 
-        # Usuários comuns: verificar ambientes_permitidos
-        if not hasattr(current_user, 'ambientes_permitidos') or len(current_user.ambientes_permitidos) == 0:
+        # Usuários comuns: verificar ambientes permitidos (snapshot em cache)
+        if not permissoes_do_usuario(current_user).nomes:
             flash("Usuário não tem ambiente associado.", "danger")
             return redirect(url_for('auth.logout'))
 
@@ -56,6 +65,75 @@ def create_app():
     app.register_blueprint(financeiro_bp, url_prefix='/financeiro')
     app.register_blueprint(caixa_bp, url_prefix='/caixa')
 
+    # 👇 COMANDO DE INICIALIZAÇÃO: flask --app run init-db
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Cria o esquema e os registros iniciais do banco."""
+        from .utils.inicializacao import inicializar_banco
+        inicializar_banco()
+        print("✅ Banco inicializado com sucesso!")
+
+    # 👇 CONFERÊNCIA DOS ÍNDICES: flask --app run verificar-indices
+    @app.cli.command('verificar-indices')
+    def verificar_indices_command():
+        """Cria os índices que faltam e mostra, via EXPLAIN, se as consultas quentes os usam."""
+        from .utils.indices import criar_indices, verificar_planos
+        criados = criar_indices()
+        if criados:
+            print(f"🗂️  Índices criados: {', '.join(criados)}")
+        falhas = 0
+        for nome, usa_indice, plano in verificar_planos():
+            falhas += not usa_indice
+            print(f"{'✅' if usa_indice else '❌'} {nome}: {' | '.join(plano)}")
+        if falhas:
+            raise click.ClickException(f"{falhas} consulta(s) sem índice")
+
+    # 👇 ÍNDICES DE BUSCA: flask --app run reindexar-busca
+    @app.cli.command('reindexar-busca')
+    def reindexar_busca_command():
+        """Recria do zero os índices de busca de produtos, clientes e fornecedores."""
+        from .utils.busca import criar_indices_busca
+        criar_indices_busca(reconstruir=True)
+        print("✅ Índices de busca reconstruídos!")
+
+    # 👇 FECHAMENTO DO DIA POR LOJA: flask --app run fechar-dia [--data 2026-01-31] [--loja 01]
+    @app.cli.command('fechar-dia')
+    @click.option('--data', 'data_txt', default=None, help='Dia a fechar (AAAA-MM-DD); padrão: hoje.')
+    @click.option('--loja', 'lojas', multiple=True, help='Loja(s) a fechar; padrão: todas com caixa no dia.')
+    def fechar_dia_command(data_txt, lojas):
+        """Finaliza os caixas do dia e consolida o resumo de cada loja, em paralelo."""
+        from datetime import date
+        from .utils.fechamento_dia import consolidar_dia
+        dia = date.fromisoformat(data_txt) if data_txt else date.today()
+        resultados = consolidar_dia(dia, [l.zfill(2) for l in lojas] or None)
+        if not resultados:
+            print(f"⚠️  Nenhum caixa em {dia:%d/%m/%Y}.")
+        for r in resultados:
+            if r['ok']:
+                print(f"✅ Loja {r['loja']}: {r['caixas']} caixa(s) finalizado(s), vendas R$ {r['vendas']:.2f}")
+            else:
+                print(f"❌ Loja {r['loja']}: {r['erro']}")
+
+    # 👇 IMPORTAÇÃO EM LOTE DE NF-e: flask --app run importar-nfe <zip ou pasta>
+    @app.cli.command('importar-nfe')
+    @click.argument('caminho', type=click.Path(exists=True))
+    @click.option('--usuario', default='cruz@devsoft', help='E-mail do usuário responsável pelas entradas.')
+    @click.option('--vincular', is_flag=True, help='Vincula os itens a produtos já cadastrados pelo código.')
+    def importar_nfe_command(caminho, usuario, vincular):
+        """Importa as NF-e de um arquivo ZIP ou de uma pasta de XMLs."""
+        from .models import Usuario
+        from .utils.importacao_nfe import importar_nfes, arquivos_do_zip, arquivos_do_diretorio
+        responsavel = Usuario.query.filter_by(us_email=usuario).first()
+        if not responsavel:
+            raise click.ClickException(f"Usuário não encontrado: {usuario}")
+        arquivos = arquivos_do_diretorio(caminho) if os.path.isdir(caminho) else arquivos_do_zip(caminho)
+        relatorio = importar_nfes(arquivos, responsavel.us_reg, vincular_produtos=vincular)
+        for r in relatorio['arquivos']:
+            print(f"{r['status']:<10} {r['arquivo']} {r['nf_chave']} {r['itens']} item(s) {r['mensagem']}")
+        print(f"✅ {relatorio['importadas']} importada(s), {relatorio['duplicadas']} duplicada(s), "
+              f"{relatorio['erros']} erro(s) em {relatorio['segundos']:.2f}s "
+              f"({relatorio['notas_por_segundo']:.1f} NF-e/s, {relatorio['itens_por_segundo']:.0f} itens/s)")
+
     # 👇 CONTEXT PROCESSOR PARA INJETAR AMBIENTES NO TEMPLATE
     @app.context_processor
     def inject_ambientes():
@@ -63,17 +141,8 @@ def create_app():
         ambientes_permitidos = []
         try:
             if current_user.is_authenticated:
-                from .models import Ambiente
-
-                # Super admin: vê todos os ambientes ativos
-                if hasattr(current_user, 'us_email') and current_user.us_email in {'cruz@devsoft', 'master@system'}:
-                    ambientes_permitidos = Ambiente.query.filter_by(amb_ativo=True).all()
-                else:
-                    # Usuário comum: usa ambientes_permitidos do próprio usuário
-                    if hasattr(current_user, 'ambientes_permitidos'):
-                        ambientes_permitidos = current_user.ambientes_permitidos
-                    else:
-                        ambientes_permitidos = []
+                # Super admin vê todos os ambientes ativos; usuário comum, os seus
+                ambientes_permitidos = list(permissoes_do_usuario(current_user).ambientes)
         except Exception:
             ambientes_permitidos = []
         return dict(ambientes_permitidos=ambientes_permitidos)
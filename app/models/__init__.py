@@ -27,11 +27,21 @@ from .ordem_compra import OrdemCompra, ItemOrdemCompra
 from .devolucao import Devolucao
 from .saida_nf import SaidaNF
 from .ordem_servico import OrdemServico
+from .item_venda import ItemVenda
 from .caixa import Caixa
 from .item_devolucao import ItemDevolucao
 from .convenio import Convenio
 from .laboratorio import Laboratorio
 from .medico import Medico
+from .sequencia import Sequencia
+from .entrada_temp import EntradaTemp
+from .venda_pagamento import VendaPagamento, CaixaTotalForma
+from .movimento_caixa import MovimentoCaixa
+from .resumo_dia_loja import ResumoDiaLoja
+from .ordem_servico_evento import OrdemServicoEvento
+from .contagem_status_os import ContagemStatusOS
+from .codigo_barras_alterado import CodigoBarrasAlterado
+from .versao import Versao
 
 # Exportar db e login_manager se necessário
 from ..extensions import login_manager
\ No newline at end of file
@@ -3,6 +3,10 @@ from datetime import datetime, date
 
 class Caixa(db.Model):
     __tablename__ = 'caixa'
+    __table_args__ = (
+        db.Index('ix_caixa_cai_data_cai_status', 'cai_data', 'cai_status'),  # caixa.index, finalizar dia
+        db.Index('ix_caixa_cai_loja_cai_status', 'cai_loja', 'cai_status'),  # caixa aberto da loja (PDV)
+    )
     
     cai_reg = db.Column(db.Integer, primary_key=True)
     cai_data = db.Column(db.Date, default=date.today)
@@ -17,7 +21,7 @@ class Caixa(db.Model):
     cai_retiradas = db.Column(db.Numeric(10, 2), default=0.0)
     cai_suprimentos = db.Column(db.Numeric(10, 2), default=0.0)
     cai_observacao = db.Column(db.Text)
-    cai_status = db.Column(db.String(20), default='fechado') 
+    cai_status = db.Column(db.String(20), default='fechado', index=True)
 
     # Formas de pagamento (fechamento)
     cai_dinheiro_caixa = db.Column(db.Numeric(10, 2), default=0.0)
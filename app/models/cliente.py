@@ -5,7 +5,7 @@ class Cliente(db.Model):
     __tablename__ = 'tb_cliente'
 
     cli_reg = db.Column(db.Integer, primary_key=True)
-    cli_nome = db.Column(db.String(150), nullable=False)
+    cli_nome = db.Column(db.String(150), nullable=False, index=True)  # listas e seleção ordenadas por nome
     cli_nasc = db.Column(db.Date, nullable=True)
     cli_cpf_cnpj = db.Column(db.String(18), unique=True, nullable=True)
     cli_cep = db.Column(db.String(9), nullable=True)
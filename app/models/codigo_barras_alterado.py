@@ -0,0 +1,10 @@
+from datetime import datetime
+from ..extensions import db
+
+class CodigoBarrasAlterado(db.Model):
+    """Código de barras de um Produto/LenteGenerica alterado, gravado no mesmo flush (utils/codigos_barras.py)."""
+    __tablename__ = 'tb_codigo_barras_alterado'
+
+    cb_reg = db.Column(db.Integer, primary_key=True)      # crescente: cursor dos mapas dos workers
+    cb_codigo = db.Column(db.String(7), nullable=False)
+    cb_data = db.Column(db.DateTime, default=datetime.utcnow)
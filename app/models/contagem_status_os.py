@@ -0,0 +1,9 @@
+from ..extensions import db
+
+class ContagemStatusOS(db.Model):
+    """Quantas OS cada loja tem em cada status; mantida junto com tb_os_evento (utils/os_status.py)."""
+    __tablename__ = 'tb_os_contagem_status'
+
+    cs_loja = db.Column(db.String(2), primary_key=True)
+    cs_status = db.Column(db.String(50), primary_key=True)
+    cs_quantidade = db.Column(db.Integer, nullable=False, default=0)
@@ -10,7 +10,7 @@ class Devolucao(db.Model):
     tipo = db.Column(db.String(20))  # 'parcial', 'total'
     valor_credito = db.Column(db.Numeric(10, 2))
     observacao = db.Column(db.Text)
-    data_devolucao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_devolucao = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     usuario_id = db.Column(db.Integer)  # quem fez a devolução
     
     # Relacionamento com itens (opcional)
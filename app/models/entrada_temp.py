@@ -0,0 +1,12 @@
+from datetime import datetime
+from ..extensions import db
+
+class EntradaTemp(db.Model):
+    """Entrada em conferência (cabeçalho + produtos), guardada no servidor até ser confirmada."""
+    __tablename__ = 'tb_entrada_temp'
+
+    et_token = db.Column(db.String(32), primary_key=True)  # único dado guardado no cookie da sessão
+    et_usuario_id = db.Column(db.Integer, db.ForeignKey('tb_us.us_reg'), nullable=False)
+    et_dados = db.Column(db.JSON, nullable=False)           # {'origem', 'cabecalho', 'produtos'}
+    et_criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    et_expira_em = db.Column(db.DateTime, nullable=False, index=True)
@@ -7,7 +7,7 @@ class Entrada(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(20), nullable=False)
     descricao = db.Column(db.String(200))
-    nf_chave = db.Column(db.String(44))
+    nf_chave = db.Column(db.String(44), index=True)
     nf_numero = db.Column(db.String(50))
     serie = db.Column(db.String(10))
     data_emissao = db.Column(db.Date)
@@ -7,6 +7,8 @@ class Fornecedor(db.Model):
     forn_cnpj = db.Column(db.String(14), primary_key=True)
     forn_razao = db.Column(db.String(150), nullable=False)
     forn_fantasia = db.Column(db.String(100), nullable=True)
+    # Inteiro estável para o índice de busca no SQLite (preenchido por trigger, utils/busca.py)
+    forn_seq = db.Column(db.Integer, nullable=True)
     forn_representante = db.Column(db.String(150), nullable=True)
     forn_tel_representante = db.Column(db.String(15), nullable=True)
     forn_cep = db.Column(db.String(9), nullable=True)
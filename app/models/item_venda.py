@@ -5,7 +5,7 @@ class ItemVenda(db.Model):
     __tablename__ = 'item_venda'
     
     id = db.Column(db.Integer, primary_key=True)
-    cv_numero = db.Column(db.Integer, nullable=False)
+    cv_numero = db.Column(db.Integer, nullable=False, index=True)
     produto_id = db.Column(db.Integer)
     tipo = db.Column(db.String(20))  # 'armação', 'lente_direita', 'lente_esquerda'
     descricao = db.Column(db.String(200))
@@ -0,0 +1,19 @@
+from datetime import datetime
+from ..extensions import db
+
+class MovimentoCaixa(db.Model):
+    """Sangria/suprimento do caixa. Só recebe INSERT; mc_saldo é o acumulado do caixa até este lançamento."""
+    __tablename__ = 'tb_movimento_caixa'
+    __table_args__ = (
+        # último lançamento do caixa (saldo atual) e extrato em ordem
+        db.Index('ix_movimento_caixa_caixa_reg', 'mc_caixa_id', 'mc_reg'),
+    )
+
+    mc_reg = db.Column(db.Integer, primary_key=True)
+    mc_caixa_id = db.Column(db.Integer, db.ForeignKey('caixa.cai_reg'), nullable=False)
+    mc_tipo = db.Column(db.String(20), nullable=False)       # 'sangria' ou 'suprimento'
+    mc_valor = db.Column(db.Numeric(10, 2), nullable=False)  # sempre positivo; o tipo dá o sinal
+    mc_saldo = db.Column(db.Numeric(10, 2), nullable=False)  # suprimentos - sangrias até aqui
+    mc_observacao = db.Column(db.Text)
+    mc_usuario_id = db.Column(db.Integer)
+    mc_data = db.Column(db.DateTime, default=datetime.utcnow)
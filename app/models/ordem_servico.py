@@ -3,15 +3,21 @@ from ..extensions import db
 
 class OrdemServico(db.Model):
     __tablename__ = 'ordem_servico'
+    __table_args__ = (
+        # monitor de produção, vendas/garantias do dia: status + período
+        db.Index('ix_ordem_servico_status_data_emissao', 'status', 'data_emissao'),
+    )
     
     os_numero = db.Column(db.String(7), primary_key=True)
-    cv_numero = db.Column(db.Integer, nullable=False)
-    loja_id = db.Column(db.String(2), nullable=False)
+    cv_numero = db.Column(db.Integer, nullable=False, index=True)
+    loja_id = db.Column(db.String(2), nullable=False, index=True)
     cliente_id = db.Column(db.Integer)  
     fornecedor_id = db.Column(db.Integer) 
     numero_pedido_fornecedor = db.Column(db.String(50))
-    status = db.Column(db.String(50), default='venda_concluida')
-    data_emissao = db.Column(db.DateTime, default=datetime.utcnow)
+    # active_history: o valor anterior é carregado ao trocar o status mesmo com
+    # o objeto expirado (depois de um commit), para o evento de transição
+    status = db.column_property(db.Column(db.String(50), default='venda_concluida'), active_history=True)
+    data_emissao = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     observacao_devolucao = db.Column(db.Text)
     data_alerta_armação = db.Column(db.DateTime)
     data_leitura_alerta = db.Column(db.DateTime)
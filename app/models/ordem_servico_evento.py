@@ -0,0 +1,14 @@
+from datetime import datetime
+from ..extensions import db
+
+class OrdemServicoEvento(db.Model):
+    """Mudança de status de uma OS, gravada no mesmo flush da alteração (utils/os_eventos.py)."""
+    __tablename__ = 'tb_os_evento'
+
+    ev_reg = db.Column(db.Integer, primary_key=True)      # crescente: cursor dos monitores
+    ev_os_numero = db.Column(db.String(7), nullable=False, index=True)
+    ev_loja = db.Column(db.String(2))
+    ev_status_anterior = db.Column(db.String(50))          # None = OS criada
+    ev_status = db.Column(db.String(50), nullable=False)
+    ev_usuario_id = db.Column(db.Integer)
+    ev_data = db.Column(db.DateTime, default=datetime.utcnow)
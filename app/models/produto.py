@@ -48,7 +48,7 @@ class Produto(db.Model):
     prod_empresa = db.Column(db.String(100), nullable=False)
     prod_empresa_id = db.Column(db.Integer, db.ForeignKey('tb_empresa.emp_reg'), nullable=True)
     prod_preco_custo = db.Column(db.Numeric(10, 2), default=0.00)
-    prod_tipo = db.Column(db.String(20), nullable=False)  # 'armacao' ou 'servico'
+    prod_tipo = db.Column(db.String(20), nullable=False, index=True)  # 'armacao' ou 'servico'
 
     # === Campo OBRIGATÓRIO para relacionamento com Fornecedor ===
     prod_fabricante_id = db.Column(db.String(18), db.ForeignKey('tb_fornecedor.forn_cnpj'), nullable=True)
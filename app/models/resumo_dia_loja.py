@@ -0,0 +1,19 @@
+from datetime import datetime
+from ..extensions import db
+
+class ResumoDiaLoja(db.Model):
+    """Consolidação do fechamento do dia por loja, gravada pelo job de fim de dia (utils/fechamento_dia.py)."""
+    __tablename__ = 'tb_resumo_dia_loja'
+
+    rd_data = db.Column(db.Date, primary_key=True)
+    rd_loja = db.Column(db.String(2), primary_key=True)
+    rd_caixas = db.Column(db.Integer, nullable=False, default=0)
+    rd_saldo_inicial = db.Column(db.Numeric(12, 2), default=0)
+    rd_vendas = db.Column(db.Numeric(12, 2), default=0)        # total registrado pelo sistema
+    rd_conferencia = db.Column(db.Numeric(12, 2), default=0)   # total conferido no fechamento
+    rd_falta = db.Column(db.Numeric(12, 2), default=0)
+    rd_retiradas = db.Column(db.Numeric(12, 2), default=0)
+    rd_suprimentos = db.Column(db.Numeric(12, 2), default=0)
+    rd_saldo_final = db.Column(db.Numeric(12, 2), default=0)
+    rd_vendas_forma = db.Column(db.JSON)                       # {forma: 'valor'}
+    rd_processado_em = db.Column(db.DateTime, default=datetime.utcnow)
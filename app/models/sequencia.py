@@ -0,0 +1,9 @@
+from ..extensions import db
+
+class Sequencia(db.Model):
+    """Contador por (sequência, loja) usado para CV, OS, OC e códigos de produto."""
+    __tablename__ = 'tb_sequencia'
+
+    seq_nome = db.Column(db.String(30), primary_key=True)   # ex: 'cv', 'os', 'armacao', 'oc_2026'
+    seq_loja = db.Column(db.String(2), primary_key=True, default='00')  # '00' = sequência global
+    seq_valor = db.Column(db.BigInteger, nullable=False, default=0)     # último número entregue
@@ -0,0 +1,24 @@
+from datetime import datetime
+from ..extensions import db
+
+class VendaPagamento(db.Model):
+    """Livro de vendas: um lançamento por pagamento recebido (caixa + forma). Só recebe INSERT."""
+    __tablename__ = 'tb_venda_pagamento'
+
+    vp_reg = db.Column(db.Integer, primary_key=True)
+    vp_caixa_id = db.Column(db.Integer, db.ForeignKey('caixa.cai_reg'), nullable=False, index=True)
+    vp_forma = db.Column(db.String(20), nullable=False)     # ver utils/livro_caixa.FORMAS_PAGAMENTO
+    vp_valor = db.Column(db.Numeric(10, 2), nullable=False)  # negativo = estorno
+    vp_cv_numero = db.Column(db.Integer, index=True)
+    vp_usuario_id = db.Column(db.Integer)
+    vp_data = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CaixaTotalForma(db.Model):
+    """Total acumulado por (caixa, forma), atualizado junto com cada lançamento do livro."""
+    __tablename__ = 'tb_caixa_total_forma'
+
+    ct_caixa_id = db.Column(db.Integer, db.ForeignKey('caixa.cai_reg'), primary_key=True)
+    ct_forma = db.Column(db.String(20), primary_key=True)
+    ct_total = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    ct_quantidade = db.Column(db.Integer, nullable=False, default=0)
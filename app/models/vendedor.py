@@ -12,6 +12,8 @@ class Vendedor(db.Model):
 
     @staticmethod
     def gerar_codigo():
-        ultimo = db.session.query(db.func.max(Vendedor.vend_reg)).scalar()
-        proximo = (ultimo or 0) + 1
+        from ..utils.sequencias import proximo_numero
+        def maior_codigo():
+            return db.session.query(db.func.max(Vendedor.vend_reg)).scalar()
+        proximo = proximo_numero('vendedor', inicial=maior_codigo)
         return f"{proximo:04d}"
\ No newline at end of file
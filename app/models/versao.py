@@ -0,0 +1,8 @@
+from ..extensions import db
+
+class Versao(db.Model):
+    """Contador de versão de um cache em memória (utils/versoes.py), usado fora do SQLite."""
+    __tablename__ = 'tb_versao'
+
+    ver_nome = db.Column(db.String(50), primary_key=True)
+    ver_valor = db.Column(db.BigInteger, nullable=False, default=0)
@@ -32,8 +32,9 @@ from app.models.medico import Medico
 
 from app.utils.cep import buscar_cep
 from app.utils.codigos import gerar_proximo_codigo
-from app.utils.lentes import gerar_combinacoes_lente
+from app.utils.lentes import gerar_combinacoes_lente, estatisticas_cache_grades
 from app.utils.crypto import criptografar_senha
+from app.utils.paginacao import paginar
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -132,11 +133,11 @@ def listar_usuarios():
                         flash('Usuário criado com sucesso!', 'success')
                         return redirect(url_for('admin.listar_usuarios'))
         
-        usuarios = Usuario.query.all()
-        return render_template('admin/usuarios.html', usuarios=usuarios, ambientes=ambientes, empresas=empresas)
+        pagina = paginar(Usuario.query, Usuario.us_reg)
+        return render_template('admin/usuarios.html', usuarios=pagina.itens, pagina=pagina, ambientes=ambientes, empresas=empresas)
     
-    usuarios = Usuario.query.all()
-    return render_template('admin/usuarios.html', usuarios=usuarios, ambientes=ambientes, empresas=empresas)
+    pagina = paginar(Usuario.query, Usuario.us_reg)
+    return render_template('admin/usuarios.html', usuarios=pagina.itens, pagina=pagina, ambientes=ambientes, empresas=empresas)
 
 @bp.route('/usuarios/toggle-ativo', methods=['POST'])
 @login_required
@@ -404,4 +405,13 @@ def toggle_ambiente_ativo():
     else:
         flash("Ambiente não encontrado.", "danger")
     
-    return redirect(url_for('admin.listar_ambientes'))
\ No newline at end of file
+    return redirect(url_for('admin.listar_ambientes'))
+
+# =============== GRADES DE LENTES ===============
+@bp.route('/grades/cache')
+@login_required
+def cache_grades_lentes():
+    """Contadores do cache de grades deste worker (acertos, falhas, memória)."""
+    if not _tem_permissao_master():
+        return jsonify({'erro': 'Permissão insuficiente.'}), 403
+    return jsonify(estatisticas_cache_grades())
@@ -1,10 +1,19 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
+from sqlalchemy.exc import SQLAlchemyError
 from ..extensions import db
-from ..models import OrdemServico, Cliente, Caixa, Devolucao, ItemDevolucao, Usuario, Produto, Convenio, Laboratorio, Medico
+from ..models import OrdemServico, Cliente, Caixa, Devolucao, ItemDevolucao, ItemVenda, Usuario, Produto, Convenio, Laboratorio, Medico, ResumoDiaLoja
 from datetime import datetime, date, timedelta
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from ..utils.gerar_proximo import gerar_proximo_cv, gerar_proximo_os 
+from ..utils.indice_lentes import lentes_compativeis
+from ..utils.codigos_barras import resolver_codigo, resolver_codigos
+from ..utils.busca import buscar
+from ..utils.fechamento_dia import consolidar_dia
+from ..utils.os_eventos import cursor_eventos, aguardar_eventos, como_dict
+from ..utils.os_status import mudar_status, TransicaoInvalida, contagens_por_loja, TRANSICOES
+from ..utils.livro_caixa import (FORMAS_PAGAMENTO, FORMAS_CARTAO, registrar_pagamento, saldo_esperado,
+                                 totais_por_forma, registrar_movimento, movimentos_do_caixa, saldo_gaveta)
 
 bp = Blueprint('caixa', __name__, url_prefix='/caixa')
 
@@ -97,14 +106,14 @@ def fechar_caixa():
             cai_cartao_caixa + cai_ticket_caixa + cai_convenio_caixa +
             cai_banco_caixa + cai_carnet_caixa
         )
-        total_retirado = cai_dinheiro_retrada + cai_cheque_retrada
-        saldo_final = (caixa.cai_saldo_inicial or Decimal('0.00')) + total_recebido - total_retirado
+        # Conferido: tudo o que está no caixa, antes do que é retirado no fechamento
+        total_conferencia = Decimal(str(caixa.cai_saldo_inicial or 0)) + total_recebido
 
-        # Total registrado pelo sistema (substitua pela sua lógica real)
-        # Exemplo: soma de todas as vendas do dia
-        total_sistema = Decimal("813.00")  # ← Substitua por lógica real depois
+        # Esperado pelo sistema: fundo + vendas do livro + suprimentos - sangrias do dia
+        total_sistema = saldo_esperado(caixa)
 
-        falta = saldo_final - total_sistema
+        # Diferença entre o conferido e o esperado (negativa = falta)
+        falta = total_conferencia - total_sistema
         malote = Decimal("0.00")
 
         # Atualiza o caixa
@@ -119,7 +128,7 @@ def fechar_caixa():
         caixa.cai_banco_caixa = cai_banco_caixa
         caixa.cai_carnet_caixa = cai_carnet_caixa
         caixa.cai_observacao = observacao
-        caixa.cai_total_conferencia = saldo_final
+        caixa.cai_total_conferencia = total_conferencia
         caixa.cai_total_sistema = total_sistema
         caixa.cai_falta = falta
         caixa.cai_malote = malote
@@ -158,6 +167,15 @@ def reabrir_caixa():
                       saldo_inicial=saldo_inicial,
                       hoje=date.today())
 
+def _resumo_do_caixa(caixa):
+    """Vendas por forma e sangrias/suprimentos do caixa, para os resumos."""
+    return dict(
+        formas=FORMAS_PAGAMENTO,
+        totais_sistema=totais_por_forma(caixa.cai_reg),
+        movimentos=movimentos_do_caixa(caixa.cai_reg),
+        saldo_gaveta=saldo_gaveta(caixa),
+    )
+
 @bp.route('/resumo/imprimir')
 @login_required
 def imprimir_resumo():
@@ -173,7 +191,7 @@ def imprimir_resumo():
         flash('Nenhum caixa encontrado para gerar o resumo.', 'warning')
         return redirect(url_for('caixa.index'))
     
-    return render_template('caixa/resumo_impressao.html', caixa=caixa)
+    return render_template('caixa/resumo_impressao.html', caixa=caixa, **_resumo_do_caixa(caixa))
 
 
 @bp.route('/resumo/visualizar')
@@ -187,7 +205,7 @@ def visualizar_resumo():
         flash('Nenhum caixa encontrado para gerar o resumo.', 'warning')
         return redirect(url_for('caixa.index'))
     
-    return render_template('caixa/resumo_visualizacao.html', caixa=caixa)
+    return render_template('caixa/resumo_visualizacao.html', caixa=caixa, **_resumo_do_caixa(caixa))
 
 from datetime import date
 
@@ -207,19 +225,13 @@ def finalizar_dia():
         return redirect(url_for('caixa.index'))
 
     if request.method == 'POST':
-        for c in caixas_ativos:
-            # 👇 SÓ CAMPOS QUE EXISTEM NO SEU MODELO 👇
-            total_recebido = (
-                (c.cai_dinheiro_caixa or 0) +
-                (c.cai_pix_caixa or 0) +
-                (c.cai_cartao_caixa or 0)
-            )
-            total_retirado = (c.cai_dinheiro_retrada or 0) + (c.cai_cheque_retrada or 0)
-            c.cai_saldo_final = (c.cai_saldo_inicial or 0) + total_recebido - total_retirado
-            c.cai_hora_fechamento = datetime.utcnow()
-            c.cai_status = 'finalizado_dia'
-        
-        db.session.commit()
+        # Cada loja é fechada na sua própria transação, em paralelo
+        resultados = consolidar_dia(hoje)
+        falhas = [r for r in resultados if not r['ok']]
+        for r in falhas:
+            flash(f"Loja {r['loja']}: erro ao finalizar o dia ({r['erro']}).", 'danger')
+        if falhas and len(falhas) == len(resultados):
+            return redirect(url_for('caixa.index'))
         flash('Dia finalizado com sucesso!', 'success')
         return redirect(url_for('caixa.imprimir_resumo_dia'))
     
@@ -232,13 +244,15 @@ def imprimir_resumo_dia():
     caixas = Caixa.query.filter(
         Caixa.cai_data == date.today(),
         Caixa.cai_status == 'finalizado_dia'
-    ).all()
+    ).order_by(Caixa.cai_loja, Caixa.cai_reg).all()
     
     if not caixas:
         flash('Nenhum caixa finalizado para imprimir.', 'warning')
         return redirect(url_for('caixa.index'))
     
-    return render_template('caixa/resumo_dia_impressao.html', caixas=caixas, hoje=date.today())
+    # Totais por loja já consolidados no fechamento do dia
+    resumos = ResumoDiaLoja.query.filter_by(rd_data=date.today()).order_by(ResumoDiaLoja.rd_loja).all()
+    return render_template('caixa/resumo_dia_impressao.html', caixas=caixas, resumos=resumos, hoje=date.today())
 
 # --- PDV (Venda Rápida) ---
 @bp.route('/pdv', methods=['GET', 'POST'])
@@ -258,14 +272,37 @@ def pdv():
         return redirect(url_for('caixa.index'))
     
     if request.method == 'POST':
+        if request.form.get('acao') == 'finalizar':
+            # Pagamento da venda: entra no livro do caixa
+            forma = request.form.get('pagamento', 'dinheiro')
+            try:
+                valor = Decimal(request.form.get('valor', '0').replace(',', '.'))
+            except InvalidOperation:
+                valor = Decimal('0')
+            # NaN/Infinity passam pelo Decimal: só vale número finito e positivo
+            if not valor.is_finite() or valor <= 0 or forma not in FORMAS_PAGAMENTO:
+                flash('Informe o valor e a forma de pagamento.', 'danger')
+                return redirect(url_for('caixa.pdv'))
+            # Cartão: o número do comprovante (CV/NSU) é o que casa o lançamento com o extrato da operadora
+            cv_numero = request.form.get('cv_numero', '').strip()
+            if forma in FORMAS_CARTAO and not cv_numero.isdigit():
+                flash('Informe o número do comprovante (CV/NSU) do cartão.', 'danger')
+                return redirect(url_for('caixa.pdv'))
+            registrar_pagamento(caixa_aberto, forma, valor,
+                                cv_numero=int(cv_numero) if cv_numero.isdigit() else None,
+                                usuario_id=current_user.us_reg)
+            db.session.commit()
+            flash('Venda registrada com sucesso!', 'success')
+            return redirect(url_for('caixa.pdv'))
+
         # Processar venda (simplificado)
         produto_id = request.form.get('produto_id')
         quantidade = int(request.form.get('quantidade', 1))
         # ... lógica de venda ...
-        flash('Venda registrada com sucesso!', 'success')
+        flash('Produto adicionado!', 'success')
         return redirect(url_for('caixa.pdv'))
     
-    return render_template('caixa/pdv.html', caixa=caixa_aberto)
+    return render_template('caixa/pdv.html', caixa=caixa_aberto, formas=FORMAS_PAGAMENTO)
 
 # --- Sangria / Suprimento ---
 @bp.route('/movimentacao', methods=['GET', 'POST'])
@@ -278,22 +315,28 @@ def movimentacao_caixa():
     
     if request.method == 'POST':
         tipo = request.form.get('tipo')  # 'sangria' ou 'suprimento'
-        valor = Decimal(request.form.get('valor', '0.00'))
-        observacao = request.form.get('observacao', '')
-        if observacao:
-            caixa.cai_observacao = observacao
-        
-        if tipo == 'sangria':
-            # Registrar sangria (subtrai do saldo)
-            pass
-        elif tipo == 'suprimento':
-            # Registrar suprimento (adiciona ao saldo)
-            pass
-        
+        observacao = request.form.get('observacao', '').strip()
+        try:
+            valor = Decimal(request.form.get('valor', '0.00').replace(',', '.'))
+            registrar_movimento(caixa, tipo, valor, observacao=observacao or None,
+                                usuario_id=current_user.us_reg)
+            db.session.commit()
+        except (InvalidOperation, ValueError) as e:
+            db.session.rollback()
+            flash(str(e) if isinstance(e, ValueError) else 'Valor inválido.', 'danger')
+            return redirect(url_for('caixa.movimentacao_caixa'))
+        except SQLAlchemyError:
+            # Outro lançamento no mesmo caixa ao mesmo tempo ("database is locked" no SQLite)
+            db.session.rollback()
+            flash('O caixa estava ocupado com outro lançamento. Nada foi gravado: tente novamente.', 'warning')
+            return redirect(url_for('caixa.movimentacao_caixa'))
+
         flash(f'{tipo.capitalize()} registrada com sucesso!', 'success')
         return redirect(url_for('caixa.movimentacao_caixa'))
     
-    return render_template('caixa/sangria_suprimento.html', caixa=caixa)
+    return render_template('caixa/sangria_suprimento.html', caixa=caixa,
+                           movimentos=movimentos_do_caixa(caixa.cai_reg),
+                           saldo_gaveta=saldo_gaveta(caixa))
 
 # --- Criar nova OS (simulando finalização de venda) ---
 @bp.route('/nova-venda', methods=['GET', 'POST'])
@@ -321,8 +364,8 @@ def nova_venda():
         flash(f'Venda criada! CV: {novo_cv}, OS: {novo_os}', 'success')
         return redirect(url_for('caixa.monitor_producao'))
     
-    clientes = Cliente.query.all()
-    return render_template('caixa/nova_venda.html', clientes=clientes)
+    # Cliente escolhido pela busca (/caixa/buscar-cliente): o formulário fica numa página só
+    return render_template('caixa/nova_venda.html')
 
 # --- Monitor de Produção ---
 @bp.route('/producao')
@@ -331,7 +374,33 @@ def monitor_producao():
     ordens = OrdemServico.query.filter(
         OrdemServico.status.in_(['venda_concluida', 'liberado_compra'])
     ).order_by(OrdemServico.data_emissao.desc()).all()
-    return render_template('caixa/monitor_producao.html', ordens=ordens)
+    return render_template('caixa/monitor_producao.html', ordens=ordens, cursor_eventos=cursor_eventos())
+
+@bp.route('/producao/eventos')
+@login_required
+def eventos_producao():
+    """
+    Mudanças de status das OS depois de `desde` (e nas `lacunas`, ids
+    separados por vírgula), em long-poll: volta assim que houver eventos.
+    """
+    ultimo_id = request.args.get('desde', 0, type=int)
+    lacunas = [int(i) for i in request.args.get('lacunas', '').split(',') if i.strip().isdigit()]
+    eventos, esperou = aguardar_eventos(ultimo_id, lacunas)
+    return {
+        'eventos': [como_dict(e) for e in eventos],
+        # Worker sem vaga de espera: o navegador espera um pouco antes de repetir
+        'repetir_em_ms': 0 if esperou else 3000,
+    }
+
+@bp.route('/producao/painel')
+@login_required
+def painel_producao():
+    """Quantas OS há em cada etapa, por loja (lido de tb_os_contagem_status)."""
+    por_loja = contagens_por_loja()
+    # Etapas na ordem do fluxo; status fora de TRANSICOES (dados antigos) vão no fim
+    status = list(TRANSICOES) + sorted({s for c in por_loja.values() for s in c} - set(TRANSICOES))
+    totais = {s: sum(c.get(s, 0) for c in por_loja.values()) for s in status}
+    return render_template('caixa/painel_producao.html', por_loja=por_loja, status=status, totais=totais)
 
 # --- Visualizar OS (somente leitura) ---
 @bp.route('/producao/<os_numero>')
@@ -346,7 +415,7 @@ def visualizar_os(os_numero):
 def translado_loja_estoque(os_numero):
     ordem = OrdemServico.query.get_or_404(os_numero)
     if ordem.status == 'venda_concluida':
-        ordem.status = 'liberado_compra'
+        mudar_status(ordem, 'liberado_compra')
         db.session.commit()
         flash('OS liberada para compra no estoque!', 'success')
     return redirect(url_for('caixa.monitor_producao'))
@@ -355,7 +424,11 @@ def translado_loja_estoque(os_numero):
 @login_required
 def cancelar_os(os_numero):
     ordem = OrdemServico.query.get_or_404(os_numero)
-    ordem.status = 'cancelada'
+    try:
+        mudar_status(ordem, 'cancelada')
+    except TransicaoInvalida:
+        flash('OS já está cancelada.', 'warning')
+        return redirect(url_for('caixa.monitor_producao'))
     db.session.commit()
     flash('OS cancelada.', 'info')
     return redirect(url_for('caixa.monitor_producao'))
@@ -378,7 +451,7 @@ def registrar_quebra_armação(os_numero):
             return redirect(request.url)
         
         # Atualiza status e observação
-        ordem.status = 'devolucao_quebra_armação'
+        mudar_status(ordem, 'devolucao_quebra_armação')
         ordem.observacao_devolucao = observacao
         db.session.commit()
         flash('Quebra de armação registrada com sucesso!', 'success')
@@ -399,7 +472,7 @@ def reativar_com_nova_armação(os_numero):
         return redirect(url_for('caixa.monitor_producao'))
     
     # Volta para o status anterior à montagem
-    ordem.status = 'servico_aguardando_armação'
+    mudar_status(ordem, 'servico_aguardando_armação')
     # Opcional: limpar observação antiga ou manter como histórico
     # ordem.observacao_devolucao = None  # ou mantém para histórico
     
@@ -417,7 +490,7 @@ def receber_servico(os_numero):
         flash('Apenas serviços montados e conferidos podem ser recebidos.', 'warning')
         return redirect(url_for('caixa.monitor_producao'))
     
-    ordem.status = 'servico_pronto_entrega'
+    mudar_status(ordem, 'servico_pronto_entrega')
     db.session.commit()
     flash('Serviço recebido e pronto para entrega!', 'success')
     return redirect(url_for('caixa.monitor_producao'))
@@ -499,7 +572,8 @@ def processar_devolucao():
         for item in todos_itens:
             devolver_item_ao_estoque(item)
             item.status = 'cancelado'
-        os.status = 'cancelada'
+        if os.status != 'cancelada':
+            mudar_status(os, 'cancelada')
         tipo_dev = 'total'
         valor_cred = sum(item.valor for item in todos_itens)
         itens_para_registro = todos_itens
@@ -638,102 +712,61 @@ def nova_venda_os():
 @bp.route('/buscar-cliente')
 @login_required
 def buscar_cliente():
+    """Clientes pelo nome (busca textual), CPF/CNPJ ou código; `cliente` é o primeiro."""
     termo = request.args.get('termo', '').strip()
     tipo = request.args.get('tipo', 'nome')
-
-    cliente = None
-    if tipo == 'cpf':
-        cliente = Cadastro.query.filter(Cadastro.cpf_cnpj.like(f"%{termo}%")).first()
-    elif tipo == 'codigo':
-        cliente = Cadastro.query.filter(Cadastro.codigo.like(f"%{termo}%")).first()
-    else:  # nome
-        cliente = Cadastro.query.filter(Cadastro.nome.ilike(f"%{termo}%")).first()
-
-    if cliente:
-        return {
-            'cliente': {
-                'id': cliente.id,
-                'nome': cliente.nome,
-                'cpf_cnpj': cliente.cpf_cnpj,
-                'codigo': cliente.codigo
-            }
-        }
-    return {'cliente': None}
+    limite = min(request.args.get('limite', 10, type=int) or 10, 50)
+
+    clientes = []
+    if termo and tipo == 'cpf':
+        clientes = (Cliente.query.filter(Cliente.cli_cpf_cnpj.like(f"{termo}%"))
+                    .order_by(Cliente.cli_cpf_cnpj).limit(limite).all())
+    elif termo and tipo == 'codigo':
+        cliente = db.session.get(Cliente, int(termo)) if termo.isdigit() else None
+        clientes = [cliente] if cliente else []
+    elif termo:  # nome
+        clientes = buscar('cliente', termo, limite=limite)
+
+    encontrados = [{
+        'id': c.cli_reg,
+        'nome': c.cli_nome,
+        'cpf_cnpj': c.cli_cpf_cnpj,
+        'codigo': c.cli_reg
+    } for c in clientes]
+    return {'cliente': encontrados[0] if encontrados else None, 'clientes': encontrados}
 
 @bp.route('/buscar-item-venda')
 @login_required
 def buscar_item_venda():
-    codigo = request.args.get('codigo', '').strip()
-    if not codigo or len(codigo) != 7:
-        return {'item': None, 'erro': 'Código deve ter exatamente 7 dígitos'}
-
-    primeiro_digito = codigo[0]
-
-    # 👇 SERVIÇO: começa com '2'
-    if primeiro_digito == '2':
-        servico = Produto.query.filter_by(
-            prod_codigo_barras=codigo,
-            prod_tipo='servico'
-        ).first()
-        if servico:
-            return {
-                'item': {
-                    'id': servico.prod_reg,
-                    'codigo': servico.prod_codigo_barras,
-                    'descricao': servico.prod_descricao_servico or servico.prod_nome,
-                    'valor_venda': float(servico.prod_preco_custo),
-                    'tipo': 'servico',
-                    'saldo': 0,
-                    'reserva': 0
-                }
-            }
-        else:
-            return {'item': None, 'erro': 'Serviço não encontrado'}
-
-    # 👇 ARMAÇÃO: começa com '1'
-    elif primeiro_digito == '1':
-        armacao = Produto.query.filter_by(
-            prod_codigo_barras=codigo,
-            prod_tipo='armacao'
-        ).first()
-        if armacao:
-            saldo = getattr(armacao, 'prod_estoque', 0)
-            reserva = getattr(armacao, 'prod_reserva', 0)
-            return {
-                'item': {
-                    'id': armacao.prod_reg,
-                    'codigo': armacao.prod_codigo_barras,
-                    'descricao': f"{armacao.prod_nome} ({armacao.prod_tipo_aramacao or ''})",
-                    'valor_venda': float(armacao.prod_preco_custo),
-                    'tipo': 'armação',
-                    'saldo': max(0, int(saldo)),
-                    'reserva': int(reserva)
-                }
-            }
-        else:
-            return {'item': None, 'erro': 'Armação não encontrada'}
-
-    # 👇 LENTE GENÉRICA: começa com '0'
-    elif primeiro_digito == '0':
-        lente = LenteGenerica.query.filter_by(codigo_base=codigo).first()
-        if lente:
-            return {
-                'item': {
-                    'id': lente.id,
-                    'codigo': lente.codigo_base,
-                    'descricao': lente.descricao,
-                    'valor_venda': float(lente.preco_base),
-                    'tipo': 'lente',
-                    'saldo': 0,
-                    'reserva': 0
-                }
-            }
-        else:
-            return {'item': None, 'erro': 'Lente genérica não encontrada'}
+    item, erro = resolver_codigo(request.args.get('codigo', ''))
+    if item is None:
+        return {'item': None, 'erro': erro}
+    return {'item': item}
 
-    # 👇 Código inválido (não começa com 0, 1 ou 2)
-    else:
-        return {'item': None, 'erro': 'Código inválido. Use: 0=lente, 1=armação, 2=serviço'}
+@bp.route('/buscar-itens-venda', methods=['POST'])
+@login_required
+def buscar_itens_venda():
+    """Resolve vários códigos lidos de uma vez: {"codigos": [...]}."""
+    dados = request.get_json(silent=True) or {}
+    codigos = dados.get('codigos')
+    if not isinstance(codigos, list):
+        return {'itens': [], 'erro': 'Informe a lista "codigos"'}
+    return {'itens': resolver_codigos([str(c) for c in codigos])}
+
+@bp.route('/lentes-compativeis')
+@login_required
+def lentes_compativeis_receita():
+    """Lentes genéricas cuja grade atende a receita (esf, cil e add)."""
+    try:
+        lentes = lentes_compativeis(
+            request.args.get('esf', ''),
+            request.args.get('cil', '0'),
+            request.args.get('add', '0')
+        )
+    except (InvalidOperation, ValueError):
+        # ValueError: NaN/Infinity passam pelo Decimal mas não viram centésimos
+        return {'lentes': [], 'erro': 'Informe esf, cil e add numéricos'}, 400
+    return {'lentes': lentes}
 
 #----- GARANTIA -----    
 
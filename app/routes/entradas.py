@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app
 from flask_login import login_required, current_user
 from ..extensions import db
 from ..models import *
@@ -7,9 +7,21 @@ from datetime import datetime, date
 import xml.etree.ElementTree as ET
 from werkzeug.utils import secure_filename
 import os
+import zipfile
 import random
 import string
 import re
+from ..utils.codigos import gerar_proximo_codigo
+from ..utils.sequencias import proximo_numero
+from ..utils.permissoes import eh_master, permissoes_do_usuario
+from ..utils.nfe import ler_nfe_completa
+from ..utils.paginacao import paginar
+from ..utils.busca import buscar
+from ..utils.os_eventos import cursor_eventos
+from ..utils.os_status import mudar_status, transicao_permitida
+from ..utils.entradas import (criar_entrada, str_to_date, produtos_por_codigo, guardar_entrada_temp,
+                              carregar_entrada_temp, descartar_entrada_temp)
+from ..utils.importacao_nfe import importar_nfes, arquivos_do_zip, arquivos_do_diretorio
 
 bp = Blueprint('entradas', __name__, url_prefix='/entradas')
 
@@ -17,22 +29,12 @@ def verificar_acesso():
     if not current_user.is_authenticated:
         return "Usuário não autenticado."
     # ✅ CERTO: permitir master OU usuários com ambiente "entradas"
-    if hasattr(current_user, 'us_email') and current_user.us_email in {'cruz@devsoft', 'master@system'}:
+    if eh_master(current_user):
         return None  # master tem acesso total
     # Verificar se o usuário tem acesso ao módulo "entradas"
-    if hasattr(current_user, 'ambientes_permitidos'):
-        nomes_ambientes = [amb.amb_nome for amb in current_user.ambientes_permitidos]
-        if 'entradas' in nomes_ambientes:
-            return None
-    return "Você não tem permissão para acessar este módulo."
-
-def str_to_date(s):
-    if not s:
-        return None
-    try:
-        return datetime.strptime(s, '%Y-%m-%d').date()
-    except (ValueError, TypeError):
+    if 'entradas' in permissoes_do_usuario(current_user).nomes:
         return None
+    return "Você não tem permissão para acessar este módulo."
 
 def eh_armacao_por_ncm(ncm: str) -> bool:
     ncm = ncm.replace('.', '').replace('-', '').strip()
@@ -43,65 +45,34 @@ def obter_tipo_aramacao(ncm: str) -> str:
     return 'AR' if ncm == '90031100' else 'OC'
 
 def gerar_codigo_armacao():
-    prefixo = '1'
-    ultimo = db.session.query(db.func.max(Produto.prod_codigo_barras)) \
-        .filter(Produto.prod_codigo_barras.like(f"{prefixo}%")).scalar()
-    num = int(ultimo[1:]) + 1 if ultimo else 1
-    return f"{prefixo}{num:06d}"
-
-def extrair_produtos_xml(filepath):
-    produtos = []
-    try:
-        tree = ET.parse(filepath)
-        root = tree.getroot()
-    except Exception as e:
-        raise Exception(f"Erro ao carregar XML: {str(e)}")
-
-    ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-    for det in root.findall('.//nfe:det', ns):
-        prod_elem = det.find('.//nfe:prod', ns)
-        if prod_elem is None:
-            continue  # pula itens sem elemento <prod>
-
-        codigo = (prod_elem.find('nfe:cProd', ns).text if prod_elem.find('nfe:cProd', ns) is not None else '').strip()
-        descricao = (prod_elem.find('nfe:xProd', ns).text if prod_elem.find('nfe:xProd', ns) is not None else '').strip()
-        quantidade = float(prod_elem.find('nfe:qCom', ns).text) if prod_elem.find('nfe:qCom', ns) is not None else 0.0
-        preco_unitario = float(prod_elem.find('nfe:vUnCom', ns).text) if prod_elem.find('nfe:vUnCom', ns) is not None else 0.0
-        ncm_elem = prod_elem.find('nfe:NCM', ns)
-        ncm = ncm_elem.text if ncm_elem is not None else ''
-
-        produto_cadastrado = Produto.query.filter_by(prod_codigo_barras=codigo).first()
-        produtos.append({
-            'codigo': codigo,
-            'descricao': descricao,
-            'quantidade': quantidade,
-            'preco_unitario': preco_unitario,
-            'ncm': ncm,
-            'cadastrado': produto_cadastrado is not None,
-            'produto_id': produto_cadastrado.prod_reg if produto_cadastrado else None,
-            'codigo_fornecedor': codigo
-        })
+    return gerar_proximo_codigo('armacao')
+
+def marcar_cadastrados(produtos):
+    """Preenche 'cadastrado' e 'produto_id' de todos os itens com uma consulta por lote."""
+    cadastrados = produtos_por_codigo(p['codigo'] for p in produtos)
+    for p in produtos:
+        p['produto_id'] = cadastrados.get(p['codigo'])
+        p['cadastrado'] = p['produto_id'] is not None
     return produtos
 
+
+def extrair_produtos_xml(arquivo):
+    """Itens da NF-e (caminho ou objeto arquivo) já marcados como cadastrados ou não."""
+    _, produtos = ler_nfe_completa(arquivo)
+    return marcar_cadastrados(produtos)
+
 def gerar_numero_ordem_compra():
     from datetime import datetime
     ano = datetime.now().year
-    try:
-        # Tenta obter o último número com lock
-        ultima = OrdemCompra.query.with_for_update().filter(
+
+    def maior_numero():
+        ultimo = db.session.query(db.func.max(OrdemCompra.oc_numero)).filter(
             OrdemCompra.oc_numero.like(f'OC-{ano}-%')
-        ).order_by(OrdemCompra.oc_reg.desc()).first()
-        
-        if ultima:
-            ultimo_num = int(ultima.oc_numero.split('-')[-1])
-            novo_num = ultimo_num + 1
-        else:
-            novo_num = 1
-            
-        return f'OC-{ano}-{novo_num:04d}'
-    except Exception as e:
-        db.session.rollback()
-        raise e
+        ).scalar()
+        return int(ultimo.split('-')[-1]) if ultimo else 0
+
+    novo_num = proximo_numero(f'oc_{ano}', inicial=maior_numero)
+    return f'OC-{ano}-{novo_num:04d}'
 
 # === ROTAS ===
 
@@ -170,48 +141,62 @@ def entrada_nf():
             }
 
         elif xml_file and xml_file.filename:
-            filepath = os.path.join('uploads', secure_filename(xml_file.filename))
-            os.makedirs('uploads', exist_ok=True)
-            xml_file.save(filepath)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    print("Conteúdo do XML (primeiros 500 chars):")
-                    print(f.read()[:500])
-            except Exception as e:
-                print(f"Erro ao ler XML para debug: {e}")
             try:
-                tree = ET.parse(filepath)
-                root = tree.getroot()
-                ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-                ide = root.find('.//nfe:ide', ns)
-                emit = root.find('.//nfe:emit', ns)
-                cabecalho = {
-                    'nf_chave': 'XML',
-                    'nf_numero': ide.find('nfe:nNF', ns).text if ide.find('nfe:nNF', ns) is not None else '',
-                    'serie': ide.find('nfe:serie', ns).text if ide.find('nfe:serie', ns) is not None else '1',
-                    'data_emissao': (ide.find('nfe:dhEmi', ns).text[:10] if ide.find('nfe:dhEmi', ns) is not None else datetime.now().strftime('%Y-%m-%d')),
-                    'fornecedor_cnpj': (emit.find('nfe:CNPJ', ns).text if emit.find('nfe:CNPJ', ns) is not None else ''),
-                    'nota_fiscal': 'recebida',
-                    'tipo_nota': 'nfe',
-                    'natureza_operacao': '1.102'
-                }
-                produtos_nf = extrair_produtos_xml(filepath)
+                # Lido direto do upload, em fluxo: sem arquivo em uploads/
+                cabecalho, produtos_nf = ler_nfe_completa(xml_file.stream)
+                marcar_cadastrados(produtos_nf)
             except Exception as e:
                 flash(f'Erro ao processar XML: {str(e)}', 'danger')
                 return render_template('entradas/entrada_nf.html')
-            finally:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
 
-        session['entrada_temp'] = {
+        dados = guardar_entrada_temp({
             'origem': 'xml' if xml_file else 'chave',
             'cabecalho': cabecalho,
             'produtos': produtos_nf
-        }
-        return render_template('entradas/conferir_entrada.html', dados=session['entrada_temp'])
+        }, current_user.us_reg)
+        return render_template('entradas/conferir_entrada.html', dados=dados)
 
     return render_template('entradas/entrada_nf.html')
 
+def diretorio_importacao():
+    return current_app.config.get('NFE_IMPORTACAO_DIR') or os.path.join(current_app.instance_path, 'nfe_importacao')
+
+@bp.route('/importacao-lote', methods=['GET', 'POST'])
+@login_required
+def importacao_lote():
+    erro = verificar_acesso()
+    if erro:
+        return erro
+
+    diretorio = diretorio_importacao()
+    relatorio = None
+    if request.method == 'POST':
+        arquivo_zip = request.files.get('zip_file')
+        try:
+            if request.form.get('origem') == 'diretorio':
+                if not os.path.isdir(diretorio):
+                    flash(f'Pasta de importação não encontrada: {diretorio}', 'warning')
+                    return render_template('entradas/importacao_lote.html', diretorio=diretorio)
+                arquivos = arquivos_do_diretorio(diretorio)
+            elif arquivo_zip and arquivo_zip.filename:
+                arquivos = arquivos_do_zip(arquivo_zip.stream)
+            else:
+                flash('Selecione um arquivo ZIP ou a pasta do servidor.', 'warning')
+                return render_template('entradas/importacao_lote.html', diretorio=diretorio)
+            relatorio = importar_nfes(arquivos, current_user.us_reg,
+                                      vincular_produtos=request.form.get('vincular_produtos') == '1')
+        except zipfile.BadZipFile:
+            flash('Arquivo ZIP inválido.', 'danger')
+            return render_template('entradas/importacao_lote.html', diretorio=diretorio)
+
+        if not relatorio['arquivos']:
+            flash('Nenhum XML encontrado.', 'warning')
+        else:
+            flash(f"{relatorio['importadas']} NF-e importada(s), {relatorio['duplicadas']} duplicada(s), "
+                  f"{relatorio['erros']} com erro.", 'success' if not relatorio['erros'] else 'warning')
+
+    return render_template('entradas/importacao_lote.html', diretorio=diretorio, relatorio=relatorio)
+
 @bp.route('/cadastrar-armacao/<int:item_id>', methods=['GET', 'POST'])
 @login_required
 def cadastrar_armacao(item_id):
@@ -226,11 +211,7 @@ def cadastrar_armacao(item_id):
 
     if request.method == 'POST':
         # Gerar código único para armação (prefixo 1)
-        prefixo = '1'
-        ultimo = db.session.query(db.func.max(Produto.prod_codigo_barras)) \
-            .filter(Produto.prod_codigo_barras.like(f"{prefixo}%")).scalar()
-        num = int(ultimo[1:]) + 1 if ultimo else 1
-        codigo = f"{prefixo}{num:06d}"
+        codigo = gerar_codigo_armacao()
 
         # Obter dados do formulário
         tipo_aramacao = request.form.get('tipo_aramacao', 'AR')  # AR ou OC
@@ -304,9 +285,11 @@ def associar_produto(item_id):
                         pedido.oc_status = 'recebida'
                         
                         # Atualiza TODAS as OSs vinculadas
-                        ordens = OrdemServico.query.filter_by(pedido_compra_id=pedido.oc_reg).all()
+                        # (as canceladas ou já adiantadas ficam como estão)
+                        ordens = [os for os in OrdemServico.query.filter_by(pedido_compra_id=pedido.oc_reg)
+                                  if transicao_permitida(os.status, 'lente_recebida')]
                         for os in ordens:
-                            os.status = 'lente_recebida'
+                            mudar_status(os, 'lente_recebida')
                         
                         db.session.commit()
                         flash(f'Pedido {numero_pedido_fornecedor} recebido! {len(ordens)} OS(s) atualizada(s).', 'success')
@@ -352,12 +335,12 @@ def entrada_manual():
             'natureza_operacao': request.form.get('natureza_operacao')
         }
 
-        session['entrada_temp'] = {
+        dados = guardar_entrada_temp({
             'origem': 'manual',
             'cabecalho': cabecalho,
             'produtos': produtos_manuais
-        }
-        return render_template('entradas/conferir_entrada.html', dados=session['entrada_temp'])
+        }, current_user.us_reg)
+        return render_template('entradas/conferir_entrada.html', dados=dados)
 
     fornecedores = Fornecedor.query.all()
     naturezas = NaturezaOperacao.query.all()
@@ -371,7 +354,7 @@ def confirmar_entrada():
     if erro:
         return erro
 
-    dados = session.get('entrada_temp')
+    dados = carregar_entrada_temp(current_user.us_reg)
     if not dados:
         flash('Nenhum dado de entrada encontrado.', 'danger')
         return redirect(url_for('entradas.index'))
@@ -379,36 +362,12 @@ def confirmar_entrada():
     cabecalho = dados['cabecalho']
     produtos = dados['produtos']
 
-    # Criar entrada
-    entrada = Entrada(
-        tipo=dados['origem'],
-        descricao=f"Entrada via {dados['origem']}",
-        nf_chave=cabecalho.get('nf_chave'),
-        nf_numero=cabecalho.get('nf_numero'),
-        serie=cabecalho.get('serie'),
-        data_emissao=str_to_date(cabecalho.get('data_emissao')),
-        data_recebimento=str_to_date(cabecalho.get('data_recebimento')),
-        nota_fiscal=cabecalho.get('nota_fiscal'),
-        tipo_nota=cabecalho.get('tipo_nota'),
-        natureza_operacao=cabecalho.get('natureza_operacao'),
-        fornecedor_id=cabecalho.get('fornecedor_cnpj'),
-        usuario_id=current_user.us_reg
-    )
-    db.session.add(entrada)
-    db.session.flush()
-
-    # Criar itens SEM vínculo
-    for prod in produtos:
-        item = ItemEntrada(
-            entrada_id=entrada.id,
-            produto_id=None,  # ← SEMPRE NULL
-            quantidade=int(float(prod.get('quantidade', 1) or 1)),
-            preco_unitario=float(prod.get('preco_unitario', 0.0) or 0.0)
-        )
-        db.session.add(item)
+    # Criar entrada e itens (em lote); sem vínculo, a menos que pedido no formulário
+    vincular = request.form.get('vincular_produtos') == '1'
+    entrada = criar_entrada(dados['origem'], cabecalho, produtos, current_user.us_reg, vincular_produtos=vincular)
 
+    descartar_entrada_temp()
     db.session.commit()
-    session.pop('entrada_temp', None)
     return redirect(url_for('entradas.editar_entrada', entrada_id=entrada.id))
 
 @bp.route('/editar/<int:entrada_id>')
@@ -426,7 +385,7 @@ def ajustar_precos():
     erro = verificar_acesso()
     if erro:
         return erro
-    dados = session.get('entrada_temp', {})
+    dados = carregar_entrada_temp(current_user.us_reg) or {}
     return render_template('entradas/ajustar_precos.html', dados=dados)
 
 @bp.route('/inventario')
@@ -435,8 +394,8 @@ def inventario():
     erro = verificar_acesso()
     if erro:
         return erro
-    produtos = Produto.query.all()
-    return render_template('entradas/inventario.html', produtos=produtos)
+    pagina = paginar(Produto.query, Produto.prod_reg)
+    return render_template('entradas/inventario.html', produtos=pagina.itens, pagina=pagina)
 
 @bp.route('/relatorio_cadastros_automaticos')
 @login_required
@@ -509,10 +468,17 @@ def devolucao_nf():
 @login_required
 def pesquisa(tipo):
     if tipo == 'cliente':
-        clientes = Cliente.query.all()  
+        q = request.args.get('q', '').strip()
+        if q:
+            # Busca por nome: resultado limitado e ordenado por relevância, sem páginas
+            clientes = buscar('cliente', q)
+            return render_template('admin/clientes.html', clientes=clientes, pagina=None,
+                                   origem='entradas', modo_pesquisa=True)
+        pagina = paginar(Cliente.query, Cliente.cli_nome, Cliente.cli_reg)
         return render_template(
             'admin/clientes.html',   
-            clientes=clientes,
+            clientes=pagina.itens,
+            pagina=pagina,
             origem='entradas',        
             modo_pesquisa=True        
         )
@@ -533,8 +499,9 @@ def pesquisa(tipo):
                 query = query.filter(Produto.prod_codigo_barras.like(f"{q}%"))
             elif filtro == 'ncm':
                 query = query.filter(Produto.prod_ncm.ilike(f"%{q}%"))
-            else:  # descricao
-                query = query.filter(Produto.prod_nome.ilike(f"%{q}%"))
+            else:  # descricao: índice de busca, mais relevantes primeiro
+                produtos = buscar('produto', q)
+                return render_template('admin/pesquisa_produto.html', produtos=produtos, origem='entradas')
 
         produtos = query.all()
         return render_template('admin/pesquisa_produto.html', produtos=produtos, origem='entradas')
@@ -547,10 +514,10 @@ def pesquisa(tipo):
         if q:
             if filtro == 'cnpj':
                 query = query.filter(Fornecedor.forn_cnpj.like(f"%{q.replace('.', '').replace('/', '').replace('-', '')}%"))
-            elif filtro == 'fantasia':
-                query = query.filter(Fornecedor.forn_fantasia.ilike(f"%{q}%"))
-            else:  # razao
-                query = query.filter(Fornecedor.forn_razao.ilike(f"%{q}%"))
+            else:  # razao ou fantasia: índice de busca, mais relevantes primeiro
+                coluna = 'forn_fantasia' if filtro == 'fantasia' else 'forn_razao'
+                fornecedores = buscar('fornecedor', q, colunas=(coluna,))
+                return render_template('admin/pesquisa_fornecedor.html', fornecedores=fornecedores, origem='entradas')
 
         fornecedores = query.all()
         return render_template('admin/pesquisa_fornecedor.html', fornecedores=fornecedores, origem='entradas')
@@ -562,8 +529,8 @@ def pesquisa(tipo):
 @bp.route('/ordens-compra')
 @login_required
 def listar_ordens_compra():
-    ordens = OrdemCompra.query.all()
-    return render_template('entradas/ordens_compra.html', ordens=ordens)
+    pagina = paginar(OrdemCompra.query, OrdemCompra.oc_reg.desc())
+    return render_template('entradas/ordens_compra.html', ordens=pagina.itens, pagina=pagina)
 
 @bp.route('/ordens-compra/nova', methods=['GET', 'POST'])
 @login_required
@@ -715,7 +682,7 @@ def iniciar_compra_os(os_numero):
         ordem.fornecedor_id = fornecedor_id
         ordem.numero_pedido_fornecedor = numero_pedido_fornecedor
         ordem.pedido_compra_id = novo_pedido.oc_reg
-        ordem.status = 'aguardando_lentes'
+        mudar_status(ordem, 'aguardando_lentes')
         
         db.session.commit()
         flash(f'Pedido interno #{novo_pedido.oc_numero} criado. Aguardando NF com pedido {numero_pedido_fornecedor}.', 'success')
@@ -730,7 +697,7 @@ def iniciar_compra_os(os_numero):
 def listar_os_liberadas():
     """Lista todas as OS com status 'liberado_compra'"""
     ordens = OrdemServico.query.filter_by(status='liberado_compra').all()
-    return render_template('entradas/lista_os_liberadas.html', ordens=ordens)
+    return render_template('entradas/lista_os_liberadas.html', ordens=ordens, cursor_eventos=cursor_eventos())
 
 @bp.route('/os/<os_numero>/finalizar', methods=['GET', 'POST'])
 @login_required
@@ -749,13 +716,13 @@ def finalizar_os(os_numero):
         acao = request.form.get('acao')
         
         if acao == 'montagem':
-            ordem.status = 'servico_enviado_montagem'
+            mudar_status(ordem, 'servico_enviado_montagem')
             db.session.commit()
             flash('Status atualizado: Serviço enviado para montagem.', 'success')
             return redirect(url_for('entradas.listar_os_finalizacao'))
             
         elif acao == 'aguardando_armação':
-            ordem.status = 'servico_aguardando_armação'
+            mudar_status(ordem, 'servico_aguardando_armação')
             ordem.data_alerta_armação = datetime.utcnow()
             db.session.commit()
             flash('Status atualizado: Aguardando armação para montagem.', 'success')
@@ -776,7 +743,7 @@ def finalizar_os(os_numero):
 def listar_os_finalizacao():
     """Lista OS com status 'lente_recebida' (prontas para finalização)"""
     ordens = OrdemServico.query.filter_by(status='lente_recebida').all()
-    return render_template('entradas/lista_os_finalizacao.html', ordens=ordens)
+    return render_template('entradas/lista_os_finalizacao.html', ordens=ordens, cursor_eventos=cursor_eventos())
 
 @bp.route('/os/<os_numero>/devolucao', methods=['GET', 'POST'])
 @login_required
@@ -795,7 +762,7 @@ def registrar_devolucao(os_numero):
             return redirect(request.url)
         
         # Atualiza OS
-        ordem.status = 'servico_devolvido_compra'
+        mudar_status(ordem, 'servico_devolvido_compra')
         ordem.observacao_devolucao = observacao
         db.session.commit()
         flash('Devolução registrada com sucesso!', 'success')
@@ -818,7 +785,7 @@ def liberar_compra_devolvida(os_numero):
     
     # ✅ Mantém TUDO: fornecedor, número do pedido, etc.
     # Só muda o status de volta para o anterior
-    ordem.status = 'aguardando_lentes'
+    mudar_status(ordem, 'aguardando_lentes')
     
     db.session.commit()
     flash(f'OS {os_numero} reativada para aguardar nova lente!', 'success')
@@ -835,7 +802,7 @@ def conferir_montagem(os_numero):
         flash('Apenas OS em montagem podem ser conferidas.', 'warning')
         return redirect(url_for('entradas.listar_os_montagem'))
     
-    ordem.status = 'servico_montado_conferido'
+    mudar_status(ordem, 'servico_montado_conferido')
     db.session.commit()
     flash('Serviço marcado como montado e conferido!', 'success')
     return redirect(url_for('entradas.listar_os_montagem'))
\ No newline at end of file
@@ -2,7 +2,9 @@
 from flask import Blueprint, render_template, flash, redirect, url_for, request
 from flask_login import login_required
 from datetime import datetime, date, timedelta
-from ..models import Cliente, Fornecedor, SaidaNF, Entrada, Caixa
+from ..models import Cliente, Fornecedor, SaidaNF, Entrada, Caixa, ResumoDiaLoja
+from ..utils.livro_caixa import FORMAS_PAGAMENTO
+from ..utils.paginacao import paginar
 
 bp = Blueprint('financeiro', __name__, url_prefix='/financeiro')
 
@@ -31,8 +33,31 @@ def plano_contas():
 def caixas():
     """Relatório de caixas: abertura e fechamento por dia"""
     # Busca todos os caixas, ordenados por data (desc)
-    caixas = Caixa.query.order_by(Caixa.cai_data.desc()).all()
-    return render_template('financeiro/caixas.html', caixas=caixas)
+    pagina = paginar(Caixa.query, Caixa.cai_data.desc(), Caixa.cai_reg.desc())
+    return render_template('financeiro/caixas.html', caixas=pagina.itens, pagina=pagina)
+
+@bp.route('/resumo-dia')
+@login_required
+def resumo_dia():
+    """Fechamento do dia por loja (consolidado pelo job de fim de dia)"""
+    query = ResumoDiaLoja.query
+    data_de = request.args.get('data_de')
+    data_ate = request.args.get('data_ate')
+    loja = request.args.get('loja', '').strip()
+    try:
+        if data_de:
+            query = query.filter(ResumoDiaLoja.rd_data >= date.fromisoformat(data_de))
+        if data_ate:
+            query = query.filter(ResumoDiaLoja.rd_data <= date.fromisoformat(data_ate))
+    except ValueError:
+        flash('Data inválida: use o formato AAAA-MM-DD.', 'warning')
+        query = ResumoDiaLoja.query
+        data_de = data_ate = None
+    if loja:
+        query = query.filter(ResumoDiaLoja.rd_loja == loja.zfill(2))
+    pagina = paginar(query, ResumoDiaLoja.rd_data.desc(), ResumoDiaLoja.rd_loja)
+    return render_template('financeiro/resumo_dia.html', resumos=pagina.itens, pagina=pagina,
+                           formas=FORMAS_PAGAMENTO, data_de=data_de, data_ate=data_ate, loja=loja)
 
 @bp.route('/historico/cliente')
 @login_required
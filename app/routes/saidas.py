@@ -3,6 +3,8 @@ from flask_login import login_required, current_user
 from ..extensions import db
 from ..models import OrdemCompra
 from ..models import SaidaNF, Devolucao, Cliente, Produto, Fornecedor
+from ..utils.paginacao import paginar
+from ..utils.busca import buscar
 
 bp = Blueprint('saidas', __name__, url_prefix='/saidas')
 
@@ -47,8 +49,8 @@ def finalizar_pedido_venda(pedido_id):
 @bp.route('/nf-saida')
 @login_required
 def listar_nf_saida():
-    nfes = SaidaNF.query.order_by(SaidaNF.snf_data_emissao.desc()).all()
-    return render_template('saidas/lista_nf_saida.html', nfes=nfes)
+    pagina = paginar(SaidaNF.query, SaidaNF.snf_data_emissao.desc(), SaidaNF.snf_reg.desc())
+    return render_template('saidas/lista_nf_saida.html', nfes=pagina.itens, pagina=pagina)
 
 @bp.route('/nf-saida/nova')
 @login_required
@@ -58,8 +60,8 @@ def nova_nf_saida():
 @bp.route('/devolucoes')
 @login_required
 def listar_devolucoes():
-    devolucoes = Devolucao.query.order_by(Devolucao.data_devolucao.desc()).all()
-    return render_template('saidas/lista_devolucoes.html', devolucoes=devolucoes)
+    pagina = paginar(Devolucao.query, Devolucao.data_devolucao.desc(), Devolucao.id.desc())
+    return render_template('saidas/lista_devolucoes.html', devolucoes=pagina.itens, pagina=pagina)
 
 @bp.route('/devolucoes/nova')
 @login_required
@@ -80,9 +82,11 @@ def pesquisa(tipo):
             elif filtro == 'cpf':
                 query = query.filter(Cliente.cli_cpf_cnpj.ilike(f"%{q}%"))
             else:
-                query = query.filter(Cliente.cli_nome.ilike(f"%{q}%"))
-        clientes = query.all()
-        return render_template('admin/clientes.html', clientes=clientes, origem='saidas')
+                # Busca por nome: resultado limitado e ordenado por relevância, sem páginas
+                clientes = buscar('cliente', q)
+                return render_template('admin/clientes.html', clientes=clientes, pagina=None, origem='saidas')
+        pagina = paginar(query, Cliente.cli_nome, Cliente.cli_reg)
+        return render_template('admin/clientes.html', clientes=pagina.itens, pagina=pagina, origem='saidas')
 
     elif tipo == 'produto':
         q = request.args.get('q', '').strip()
@@ -94,8 +98,9 @@ def pesquisa(tipo):
                 query = query.filter(Produto.prod_codigo_barras.like(f"{q}%"))
             elif filtro == 'ncm':
                 query = query.filter(Produto.prod_ncm.ilike(f"%{q}%"))
-            else:  # descricao
-                query = query.filter(Produto.prod_nome.ilike(f"%{q}%"))
+            else:  # descricao: índice de busca, mais relevantes primeiro
+                produtos = buscar('produto', q)
+                return render_template('admin/pesquisa_produto.html', produtos=produtos, origem='saidas')
         produtos = query.all()
         # 👇 CORREÇÃO AQUI: usar o template de PESQUISA, não o de cadastro
         return render_template('admin/pesquisa_produto.html', produtos=produtos, origem='saidas')
@@ -108,10 +113,10 @@ def pesquisa(tipo):
         if q:
             if filtro == 'cnpj':
                 query = query.filter(Fornecedor.forn_cnpj.like(f"%{q.replace('.', '').replace('/', '').replace('-', '')}%"))
-            elif filtro == 'fantasia':
-                query = query.filter(Fornecedor.forn_fantasia.ilike(f"%{q}%"))
-            else:  # razao
-                query = query.filter(Fornecedor.forn_razao.ilike(f"%{q}%"))
+            else:  # razao ou fantasia: índice de busca, mais relevantes primeiro
+                coluna = 'forn_fantasia' if filtro == 'fantasia' else 'forn_razao'
+                fornecedores = buscar('fornecedor', q, colunas=(coluna,))
+                return render_template('admin/pesquisa_fornecedor.html', fornecedores=fornecedores, origem='saidas')
 
         fornecedores = query.all()
         return render_template('admin/pesquisa_fornecedor.html', fornecedores=fornecedores, origem='saidas')
@@ -122,5 +127,5 @@ def pesquisa(tipo):
 @bp.route('/devolucao')
 @login_required
 def lista_devolucoes():
-    devolucoes = Devolucao.query.order_by(Devolucao.data_devolucao.desc()).all()
-    return render_template('saidas/devolucoes.html', devolucoes=devolucoes)
\ No newline at end of file
+    pagina = paginar(Devolucao.query, Devolucao.data_devolucao.desc(), Devolucao.id.desc())
+    return render_template('saidas/devolucoes.html', devolucoes=pagina.itens, pagina=pagina)
\ No newline at end of file
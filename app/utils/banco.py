@@ -0,0 +1,96 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+# Perfil do SQLite em produção, aplicado a cada conexão nova do pool.
+# WAL deixa leituras rodarem junto com a escrita (um escritor por vez) e
+# busy_timeout faz o escritor esperar em vez de falhar com
+# "database is locked". Medição em benchmark_sqlite.py.
+SQLITE_PRAGMAS_PADRAO = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,         # ms esperando o lock de escrita
+    'synchronous': 'NORMAL',      # seguro com WAL; só o último commit pode se perder numa queda de energia
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,         # negativo = KiB (≈ 32 MB por conexão)
+    'temp_store': 'MEMORY',
+}
+
+
+def aplicar_pragmas(conexao, pragmas):
+    cursor = conexao.cursor()
+    for nome, valor in pragmas.items():
+        cursor.execute(f"PRAGMA {nome}={valor}")
+    cursor.close()
+
+
+def configurar_sqlite(engine, pragmas=None):
+    """Registra no engine o hook que aplica os PRAGMAs a cada conexão SQLite."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = {**SQLITE_PRAGMAS_PADRAO, **(pragmas or {})}
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao, registro):
+        aplicar_pragmas(conexao, pragmas)
+
+
+# --- Modo de implantação (DATABASE_URL) ---
+# Sem DATABASE_URL: SQLite em instance/devsoft.db (perfil acima).
+# Com DATABASE_URL=postgresql://...: pool por worker com uma conexão por
+# thread do gunicorn (GUNICORN_THREADS), e pool + overflow de todos os
+# WEB_CONCURRENCY workers juntos sem passar de DB_MAX_CONEXOES conexões.
+# Vários hosts podem usar o mesmo banco: os caches em memória passam a
+# ser invalidados pela tabela tb_versao (utils/versoes.py). DB_MAX_CONEXOES
+# vale por host; somados, os hosts não podem passar do max_connections do
+# servidor.
+# DATABASE_URL=sqlite:// usa um banco em memória compartilhado (testes locais).
+
+def url_do_banco(instance_path):
+    url = os.environ.get('DATABASE_URL', '').strip()
+    if not url:
+        return 'sqlite:///' + os.path.join(instance_path, 'devsoft.db')
+    if url.startswith('postgres://'):
+        # Heroku/Render ainda entregam o esquema antigo, que o SQLAlchemy 2 não aceita
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _env_int(nome, padrao):
+    valor = os.environ.get(nome, '').strip()
+    return int(valor) if valor else padrao
+
+
+def opcoes_do_engine(url):
+    """SQLALCHEMY_ENGINE_OPTIONS para a URL informada."""
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # Uma única conexão em memória, vista por todas as sessões e threads
+            return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        return {}
+
+    workers = max(1, _env_int('WEB_CONCURRENCY', 1))
+    threads = max(1, _env_int('GUNICORN_THREADS', 8))
+    teto = max(1, _env_int('DB_MAX_CONEXOES', 20) // workers)  # conexões deste worker
+    # Cada thread atende uma requisição e segura uma conexão: menos que isso
+    # e as threads ficam esperando pool_timeout
+    pool_size = max(1, min(_env_int('DB_POOL_SIZE', threads), teto))
+    # Overflow só até o teto: workers × (pool_size + max_overflow) <= DB_MAX_CONEXOES
+    max_overflow = max(0, min(_env_int('DB_MAX_OVERFLOW', teto - pool_size), teto - pool_size))
+    if pool_size < threads:
+        print(f"⚠️  AVISO: pool de {pool_size} conexões para {threads} threads por worker; "
+              f"aumente DB_MAX_CONEXOES ou reduza WEB_CONCURRENCY/GUNICORN_THREADS.")
+    opcoes = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_pre_ping': True,           # descarta conexões derrubadas pelo servidor/proxy
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+    }
+    if url.startswith('postgresql'):
+        opcoes['connect_args'] = {
+            'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 10),
+            'application_name': 'devsoft',
+            # Nenhuma consulta segura uma conexão do pool por mais que isso
+            'options': f"-c statement_timeout={_env_int('DB_STATEMENT_TIMEOUT_MS', 30000)}",
+        }
+    return opcoes
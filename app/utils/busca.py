@@ -0,0 +1,245 @@
+import re
+from collections import namedtuple
+from sqlalchemy import text
+from ..extensions import db
+from ..models import Produto, Cliente, Fornecedor
+
+# Busca textual de produtos, clientes e fornecedores.
+#
+# SQLite: tabelas FTS5 de conteúdo externo (fts_<entidade>) com tokenizador
+# unicode61 sem acentos ("JOAO" encontra "João"), mantidas por triggers na
+# própria tabela e ordenadas por bm25. Cada palavra digitada vira um prefixo,
+# então a busca funciona enquanto o usuário digita.
+# O rowid do FTS aponta para uma coluna inteira estável da tabela: a chave
+# INTEGER PRIMARY KEY, ou, em tb_fornecedor (chave texto), forn_seq, que
+# os triggers preenchem. O rowid implícito não serve: o VACUUM pode
+# renumerá-lo e o índice passaria a apontar para as linhas erradas.
+#
+# Postgres: índice GIN de trigramas (pg_trgm) sobre unaccent(lower(coluna));
+# por ser um índice de expressão, não precisa de sincronização.
+#
+# Outros bancos, ou se o índice não existir: ILIKE, como antes.
+
+# rowid: coluna inteira da tabela ligada ao rowid do FTS ('rowid' = a própria chave INTEGER PRIMARY KEY)
+IndiceBusca = namedtuple('IndiceBusca', 'modelo tabela chave colunas pesos rowid')
+
+INDICES = {
+    'produto': IndiceBusca(Produto, 'tb_produto', 'prod_reg', ('prod_nome',), (1.0,), 'rowid'),
+    'cliente': IndiceBusca(Cliente, 'tb_cliente', 'cli_reg', ('cli_nome',), (1.0,), 'rowid'),
+    # razão social pesa mais que o nome fantasia
+    'fornecedor': IndiceBusca(Fornecedor, 'tb_fornecedor', 'forn_cnpj', ('forn_razao', 'forn_fantasia'),
+                              (2.0, 1.0), 'forn_seq'),
+}
+
+LIMITE_PADRAO = 50
+
+
+def _palavras(termo):
+    return re.findall(r'\w+', termo or '')
+
+
+# --- SQLite / FTS5 ---
+
+def _ddl_sqlite(nome, indice):
+    fts = f'fts_{nome}'
+    tabela, chave = indice.tabela, indice.rowid
+    colunas = ', '.join(indice.colunas)
+    novos = ', '.join(f'new.{c}' for c in indice.colunas)
+    antigos = ', '.join(f'old.{c}' for c in indice.colunas)
+    comandos = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {colunas}, content='{tabela}', content_rowid='{chave}',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    ]
+    if chave == 'rowid':
+        inserir = f"INSERT INTO {fts}(rowid, {colunas}) VALUES (new.rowid, {novos});"
+    else:
+        comandos += [
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{tabela}_{chave} ON {tabela} ({chave})",
+            # Linhas antigas (coluna recém-criada): números acima do maior já usado
+            f"""UPDATE {tabela} SET {chave} = (SELECT COALESCE(MAX({chave}), 0) FROM {tabela}) + rowid
+                WHERE {chave} IS NULL""",
+        ]
+        inserir = f"""UPDATE {tabela} SET {chave} = (SELECT COALESCE(MAX({chave}), 0) + 1 FROM {tabela})
+                WHERE rowid = new.rowid AND new.{chave} IS NULL;
+            INSERT INTO {fts}(rowid, {colunas}) SELECT {chave}, {colunas} FROM {tabela} WHERE rowid = new.rowid;"""
+    comandos += [
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN
+            {inserir}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {colunas}) VALUES ('delete', old.{chave}, {antigos});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {colunas} ON {tabela} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {colunas}) VALUES ('delete', old.{chave}, {antigos});
+            INSERT INTO {fts}(rowid, {colunas}) VALUES (new.{chave}, {novos});
+        END""",
+    ]
+    return fts, comandos
+
+
+def _migrar_sqlite(conexao, nome, indice):
+    """
+    Bancos anteriores ao rowid estável: cria a coluna inteira que falta e
+    descarta o FTS antigo (ligado ao rowid implícito) para ser recriado.
+    Retorna True se o FTS foi descartado.
+    """
+    if indice.rowid == 'rowid':
+        return False
+    colunas = {linha[1] for linha in conexao.exec_driver_sql(f"PRAGMA table_info({indice.tabela})")}
+    if indice.rowid not in colunas:
+        conexao.exec_driver_sql(f"ALTER TABLE {indice.tabela} ADD COLUMN {indice.rowid} INTEGER")
+    fts = f'fts_{nome}'
+    sql = conexao.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = ?", (fts,)).scalar()
+    if sql is None or f"content_rowid='{indice.rowid}'" in sql:
+        return False
+    for gatilho in ('ai', 'ad', 'au'):
+        conexao.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{gatilho}")
+    conexao.exec_driver_sql(f"DROP TABLE {fts}")
+    return True
+
+
+def _consulta_fts(palavras):
+    # "joao"* AND "sil"* : cada palavra como prefixo, todas obrigatórias
+    return ' AND '.join(f'"{p}"*' for p in palavras)
+
+
+def _buscar_sqlite(nome, indice, palavras, colunas, limite):
+    fts = f'fts_{nome}'
+    consulta = _consulta_fts(palavras)
+    if colunas:
+        consulta = '{' + ' '.join(colunas) + '} : (' + consulta + ')'
+    pesos = ', '.join(str(p) for p in indice.pesos)
+    # Ordenação por bm25 e LIMIT na mesma consulta: todas as linhas casadas
+    # são pontuadas e só as `limite` melhores saem (ORDER BY rank é o
+    # caminho otimizado do FTS5; `rank MATCH` troca os pesos da coluna).
+    sql = text(f"""
+        SELECT t.{indice.chave} FROM (
+            SELECT rowid, rank FROM {fts}
+            WHERE {fts} MATCH :consulta AND rank MATCH :ranking
+            ORDER BY rank LIMIT :limite
+        ) f JOIN {indice.tabela} t ON t.{indice.rowid} = f.rowid
+        ORDER BY f.rank""")
+    params = {'consulta': consulta, 'ranking': f'bm25({pesos})', 'limite': limite}
+    return [linha[0] for linha in db.session.execute(sql, params)]
+
+
+# --- Postgres / pg_trgm ---
+
+def _ddl_postgresql(nome, indice):
+    comandos = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        # unaccent() não é IMMUTABLE; o índice de expressão precisa de um invólucro que seja
+        """CREATE OR REPLACE FUNCTION devsoft_sem_acento(text) RETURNS text
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+            AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, lower($1)) $$""",
+    ]
+    for coluna in indice.colunas:
+        comandos.append(
+            f"CREATE INDEX IF NOT EXISTS ix_trgm_{indice.tabela}_{coluna} ON {indice.tabela} "
+            f"USING gin (devsoft_sem_acento({coluna}) gin_trgm_ops)")
+    return f'ix_trgm_{indice.tabela}_{indice.colunas[0]}', comandos
+
+
+def _buscar_postgresql(nome, indice, palavras, colunas, limite):
+    colunas = colunas or indice.colunas
+    params = {'limite': limite, 'termo': ' '.join(palavras)}
+    condicoes = []
+    for i, palavra in enumerate(palavras):
+        params[f'p{i}'] = f'%{palavra}%'
+        condicoes.append('(' + ' OR '.join(
+            f"devsoft_sem_acento({c}) LIKE devsoft_sem_acento(:p{i})" for c in colunas) + ')')
+    relevancia = ' + '.join(
+        f"{peso} * similarity(devsoft_sem_acento(coalesce({c}, '')), devsoft_sem_acento(:termo))"
+        for c, peso in zip(indice.colunas, indice.pesos) if c in colunas)
+    sql = text(f"""
+        SELECT {indice.chave} FROM {indice.tabela}
+        WHERE {' AND '.join(condicoes)}
+        ORDER BY {relevancia} DESC, {indice.chave}
+        LIMIT :limite""")
+    return [linha[0] for linha in db.session.execute(sql, params)]
+
+
+_DIALETOS = {
+    'sqlite': (_ddl_sqlite, _buscar_sqlite),
+    'postgresql': (_ddl_postgresql, _buscar_postgresql),
+}
+
+
+def criar_indices_busca(reconstruir=False):
+    """
+    Cria índices e triggers de busca que ainda não existem (idempotente).
+    reconstruir=True reindexa tudo no SQLite (ex: índice corrompido ou
+    alterado fora dos triggers).
+    """
+    dialeto = db.engine.dialect.name
+    if dialeto not in _DIALETOS:
+        return []
+    criados = []
+    with db.engine.begin() as conexao:
+        for nome, indice in INDICES.items():
+            objeto, comandos = _DIALETOS[dialeto][0](nome, indice)
+            if dialeto == 'sqlite':
+                _migrar_sqlite(conexao, nome, indice)
+            existia = _existe(conexao, dialeto, objeto)
+            for comando in comandos:
+                conexao.exec_driver_sql(comando)
+            if not existia or reconstruir:
+                if dialeto == 'sqlite':
+                    # Tabela já tinha linhas antes do índice: indexa tudo de uma vez
+                    conexao.exec_driver_sql(f"INSERT INTO {objeto}({objeto}) VALUES ('rebuild')")
+                criados.append(objeto)
+    return criados
+
+
+def _existe(conexao, dialeto, objeto):
+    if dialeto == 'sqlite':
+        sql = "SELECT 1 FROM sqlite_master WHERE name = ?"
+        return conexao.exec_driver_sql(sql, (objeto,)).first() is not None
+    return conexao.exec_driver_sql("SELECT to_regclass(%(nome)s)", {'nome': objeto}).scalar() is not None
+
+
+_prontos = set()  # entidades com índice de busca confirmado neste worker
+
+
+def _indice_pronto(nome):
+    """O índice existe? (banco antigo sem init-db ainda não tem: usa ILIKE)"""
+    if nome not in _prontos:
+        dialeto = db.engine.dialect.name
+        objeto, _ = _DIALETOS[dialeto][0](nome, INDICES[nome])
+        with db.engine.connect() as conexao:
+            if _existe(conexao, dialeto, objeto):
+                _prontos.add(nome)
+    return nome in _prontos
+
+
+def _fallback_ilike(indice, palavras, colunas, limite):
+    modelo = indice.modelo
+    query = db.session.query(getattr(modelo, indice.chave))
+    for palavra in palavras:
+        query = query.filter(db.or_(*(getattr(modelo, c).ilike(f'%{palavra}%') for c in colunas or indice.colunas)))
+    return [linha[0] for linha in query.limit(limite)]
+
+
+def buscar_chaves(nome, termo, colunas=None, limite=LIMITE_PADRAO):
+    """Chaves de `nome` ('produto', 'cliente', 'fornecedor') que casam com `termo`, mais relevantes primeiro."""
+    indice = INDICES[nome]
+    palavras = _palavras(termo)
+    if not palavras:
+        return []
+    dialeto = db.engine.dialect.name
+    if dialeto in _DIALETOS and _indice_pronto(nome):
+        return _DIALETOS[dialeto][1](nome, indice, palavras, colunas, limite)
+    return _fallback_ilike(indice, palavras, colunas, limite)
+
+
+def buscar(nome, termo, colunas=None, limite=LIMITE_PADRAO):
+    """Objetos de `nome` que casam com `termo`, na ordem de relevância."""
+    chaves = buscar_chaves(nome, termo, colunas, limite)
+    if not chaves:
+        return []
+    indice = INDICES[nome]
+    objetos = indice.modelo.query.filter(getattr(indice.modelo, indice.chave).in_(chaves)).all()
+    posicao = {chave: i for i, chave in enumerate(chaves)}
+    return sorted(objetos, key=lambda o: posicao[getattr(o, indice.chave)])
@@ -1,32 +1,26 @@
 from sqlalchemy import text
 from ..extensions import db  # ← IMPORTANTE: importe db
+from .sequencias import proximo_numero
+
+# tipo -> (consulta do maior código já usado, base numérica do código)
+_CODIGOS = {
+    'armacao': ("SELECT MAX(prod_codigo_barras) FROM tb_produto WHERE prod_codigo_barras LIKE '1%'", 1000000),
+    'lente': ("SELECT MAX(codigo_base) FROM tb_lente_generica WHERE codigo_base LIKE '0%'", 0000000),
+    'servico': ("SELECT MAX(prod_codigo_barras) FROM tb_produto WHERE prod_codigo_barras LIKE '2%'", 2000000),
+}
 
 def gerar_proximo_codigo(tipo):
-    if tipo == 'armacao':
-        result = db.session.execute(
-            text("SELECT MAX(prod_codigo_barras) FROM tb_produto WHERE prod_codigo_barras LIKE '1%' AND prod_tipo = 'armacao'")
-        ).scalar()
-        base = 1000000
-    elif tipo == 'lente':
-        result = db.session.execute(
-            text("SELECT MAX(codigo_base) FROM tb_lente_generica WHERE codigo_base LIKE '0%'")
-        ).scalar()
-        base = 0000000
-    elif tipo == 'servico':
-        result = db.session.execute(
-            text("SELECT MAX(prod_codigo_barras) FROM tb_produto WHERE prod_codigo_barras LIKE '2%' AND prod_tipo = 'servico'")
-        ).scalar()
-        base = 2000000  
-    else:
+    if tipo not in _CODIGOS:
         raise ValueError("Tipo inválido")
+    consulta, base = _CODIGOS[tipo]
 
-    if result:
+    # Só usado na criação do contador: parte do maior código existente
+    def maior_codigo():
+        result = db.session.execute(text(consulta)).scalar()
         try:
-            ultimo_num = int(result)
-            novo_num = ultimo_num + 1
+            return int(result) - base if result else 0
         except (ValueError, TypeError):
-            novo_num = base + 1
-    else:
-        novo_num = base + 1
+            return 0
 
-    return f"{novo_num:07d}"
\ No newline at end of file
+    novo_num = base + proximo_numero(tipo, inicial=maior_codigo)
+    return f"{novo_num:07d}"
@@ -0,0 +1,207 @@
+import threading
+from datetime import datetime, timedelta
+from collections import namedtuple
+from itertools import chain
+from sqlalchemy import event, inspect, func
+from sqlalchemy.orm import Session
+from ..extensions import db
+from ..models import Produto, LenteGenerica, CodigoBarrasAlterado
+from .versoes import versao_atual, monitorar_modelos
+
+# Mapa código de barras -> item do PDV, carregado uma vez por worker. Só as
+# colunas usadas na venda são lidas, sem objetos ORM.
+# Todo flush que insere, altera ou exclui um Produto ou LenteGenerica grava
+# os códigos afetados em tb_codigo_barras_alterado (mesma transação). Quando
+# a versão 'codigos_barras' muda, o worker relê só esses códigos, pelo
+# índice único, em vez de recarregar o mapa inteiro.
+monitorar_modelos('codigos_barras', Produto, LenteGenerica)
+
+ItemCodigo = namedtuple('ItemCodigo', 'id codigo descricao valor_venda tipo saldo reserva')
+
+# primeiro dígito -> (tipo no PDV, mensagem quando não encontrado)
+_PREFIXOS = {
+    '0': ('lente', 'Lente genérica não encontrada'),
+    '1': ('armação', 'Armação não encontrada'),
+    '2': ('servico', 'Serviço não encontrado'),
+}
+LIMITE_LOTE = 500
+# No Postgres os ids não são confirmados em ordem: um id menor pode aparecer
+# depois de um maior. Cada atualização relê também essa quantidade de ids
+# atrás do cursor (reaplicar um código é inofensivo).
+JANELA_ALTERACOES = 100
+LIMITE_ALTERACOES = 5000  # mais que isso pendente (ex: importação grande): recarrega tudo
+
+
+def _item_servico(prod_reg, codigo, nome, descricao_servico, preco):
+    return ItemCodigo(prod_reg, codigo, descricao_servico or nome, float(preco or 0), 'servico', 0, 0)
+
+
+def _item_armacao(prod_reg, codigo, nome, tipo_aramacao, preco):
+    return ItemCodigo(prod_reg, codigo, f"{nome} ({tipo_aramacao or ''})", float(preco or 0), 'armação', 0, 0)
+
+
+def _item_lente(lente_id, codigo_base, descricao, preco):
+    return ItemCodigo(lente_id, codigo_base, descricao, float(preco or 0), 'lente', 0, 0)
+
+
+_COLUNAS_SERVICO = (Produto.prod_reg, Produto.prod_codigo_barras, Produto.prod_nome,
+                    Produto.prod_descricao_servico, Produto.prod_preco_custo)
+_COLUNAS_ARMACAO = (Produto.prod_reg, Produto.prod_codigo_barras, Produto.prod_nome,
+                    Produto.prod_tipo_aramacao, Produto.prod_preco_custo)
+_COLUNAS_LENTE = (LenteGenerica.id, LenteGenerica.codigo_base, LenteGenerica.descricao,
+                  LenteGenerica.preco_base)
+
+
+def _carregar_mapa():
+    mapa = {}
+    for linha in db.session.query(*_COLUNAS_SERVICO).filter(
+            Produto.prod_tipo == 'servico', Produto.prod_codigo_barras.like('2%')):
+        mapa[linha[1]] = _item_servico(*linha)
+    for linha in db.session.query(*_COLUNAS_ARMACAO).filter(
+            Produto.prod_tipo == 'armacao', Produto.prod_codigo_barras.like('1%')):
+        mapa[linha[1]] = _item_armacao(*linha)
+    for linha in db.session.query(*_COLUNAS_LENTE).filter(LenteGenerica.codigo_base.like('0%')):
+        mapa[linha[1]] = _item_lente(*linha)
+    return mapa
+
+
+# tipo no PDV -> (colunas, coluna do código, filtro do tipo, montagem do item)
+_CONSULTAS = {
+    'servico': (_COLUNAS_SERVICO, Produto.prod_codigo_barras, Produto.prod_tipo == 'servico', _item_servico),
+    'armação': (_COLUNAS_ARMACAO, Produto.prod_codigo_barras, Produto.prod_tipo == 'armacao', _item_armacao),
+    'lente': (_COLUNAS_LENTE, LenteGenerica.codigo_base, None, _item_lente),
+}
+
+
+def _buscar_varios(codigos):
+    """{código: item} lidos pelo índice único do código; os que não existem ficam de fora."""
+    por_tipo = {}
+    for codigo in codigos:
+        if codigo and codigo[0] in _PREFIXOS:
+            por_tipo.setdefault(_PREFIXOS[codigo[0]][0], []).append(codigo)
+    itens = {}
+    for tipo, lista in por_tipo.items():
+        colunas, coluna_codigo, filtro, montar = _CONSULTAS[tipo]
+        for i in range(0, len(lista), LIMITE_LOTE):
+            query = db.session.query(*colunas).filter(coluna_codigo.in_(lista[i:i + LIMITE_LOTE]))
+            if filtro is not None:
+                query = query.filter(filtro)
+            for linha in query:
+                itens[linha[1]] = montar(*linha)
+    return itens
+
+
+def _buscar_no_banco(codigo):
+    """Leitura pelo índice único do código, para itens que ainda não estão no mapa."""
+    return _buscar_varios([codigo]).get(codigo)
+
+
+# --- Registro dos códigos alterados ---
+
+def _codigos_do_objeto(obj):
+    atributo = 'prod_codigo_barras' if isinstance(obj, Produto) else 'codigo_base'
+    historico = inspect(obj).attrs[atributo].history
+    # deleted: o código antigo, quando o próprio código foi trocado
+    codigos = {c for c in chain(historico.added, historico.unchanged, historico.deleted) if c}
+    return codigos or {getattr(obj, atributo)}
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_codigos_alterados(session, flush_context, instances):
+    codigos = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Produto, LenteGenerica)):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            codigos |= _codigos_do_objeto(obj)
+    for codigo in sorted(c for c in codigos if c):
+        session.add(CodigoBarrasAlterado(cb_codigo=codigo))
+
+
+def _ultima_alteracao():
+    return db.session.query(func.max(CodigoBarrasAlterado.cb_reg)).scalar() or 0
+
+
+def _aplicar_alteracoes(mapa, cursor):
+    """
+    Relê os códigos alterados depois de `cursor` e atualiza o mapa no lugar.
+    Retorna o novo cursor, ou None se há alterações demais (recarregar tudo).
+    """
+    linhas = (db.session.query(CodigoBarrasAlterado.cb_reg, CodigoBarrasAlterado.cb_codigo)
+              .filter(CodigoBarrasAlterado.cb_reg > cursor - JANELA_ALTERACOES)
+              .order_by(CodigoBarrasAlterado.cb_reg)
+              .limit(LIMITE_ALTERACOES + 1).all())
+    if len(linhas) > LIMITE_ALTERACOES:
+        return None
+    codigos = {codigo for _, codigo in linhas}
+    itens = _buscar_varios(codigos)
+    for codigo in codigos:
+        if codigo in itens:
+            mapa[codigo] = itens[codigo]
+        else:
+            mapa.pop(codigo, None)  # excluído ou trocado de código
+    return max([cursor] + [reg for reg, _ in linhas])
+
+
+_mapa = None
+_versao_mapa = None
+_cursor = 0  # último cb_reg já aplicado ao mapa
+_lock = threading.Lock()
+
+
+def _mapa_atual():
+    global _mapa, _versao_mapa, _cursor
+    versao = versao_atual('codigos_barras')
+    if _mapa is None or versao != _versao_mapa:
+        with _lock:
+            if _mapa is None or versao != _versao_mapa:
+                cursor = _aplicar_alteracoes(_mapa, _cursor) if _mapa is not None else None
+                if cursor is None:
+                    # Cursor lido antes do mapa: o que mudar durante a carga é reaplicado depois
+                    cursor = _ultima_alteracao()
+                    _mapa = _carregar_mapa()
+                _cursor = cursor
+                _versao_mapa = versao
+    return _mapa
+
+
+def limpar_alteracoes(dias=30):
+    """Apaga o registro de códigos alterados com mais de `dias` (workers antigos já aplicaram). Sem commit."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    return CodigoBarrasAlterado.query.filter(CodigoBarrasAlterado.cb_data < limite).delete(synchronize_session=False)
+
+
+def resolver_codigo(codigo):
+    """
+    Resolve um código de 7 dígitos lido no PDV.
+    Retorna (item, erro): item é um dicionário no formato de
+    caixa.buscar_item_venda, ou None com a mensagem de erro.
+    """
+    codigo = (codigo or '').strip()
+    if len(codigo) != 7:
+        return None, 'Código deve ter exatamente 7 dígitos'
+    if codigo[0] not in _PREFIXOS:
+        return None, 'Código inválido. Use: 0=lente, 1=armação, 2=serviço'
+
+    mapa = _mapa_atual()
+    cursor = _cursor
+    item = mapa.get(codigo)
+    if item is None:
+        item = _buscar_no_banco(codigo)
+        if item is None:
+            return None, _PREFIXOS[codigo[0]][1]
+        with _lock:
+            # Só guarda se nenhuma atualização rodou desde a leitura do mapa:
+            # senão o item lido do banco pode ser mais velho que o do mapa
+            if _mapa is mapa and _cursor == cursor:
+                mapa.setdefault(codigo, item)
+    return item._asdict(), None
+
+
+def resolver_codigos(codigos):
+    """Resolve vários códigos de uma vez (até LIMITE_LOTE), na ordem recebida."""
+    resultado = []
+    for codigo in codigos[:LIMITE_LOTE]:
+        item, erro = resolver_codigo(codigo)
+        resultado.append({'codigo': codigo, 'item': item, 'erro': erro})
+    return resultado
@@ -0,0 +1,135 @@
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app, session
+from sqlalchemy import insert
+from ..extensions import db
+from ..models import Entrada, ItemEntrada, EntradaTemp, Produto
+
+
+def str_to_date(s):
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None
+
+
+LIMITE_IN = 500  # códigos por consulta IN
+
+
+def _em_lotes(query, coluna, valores):
+    """Linhas de `query` com `coluna` em `valores`, consultadas em lotes de LIMITE_IN."""
+    valores = list({v for v in valores if v})
+    for i in range(0, len(valores), LIMITE_IN):
+        yield from query.filter(coluna.in_(valores[i:i + LIMITE_IN]))
+
+
+def produtos_por_codigo(codigos):
+    """{código de barras: prod_reg} dos códigos já cadastrados, em lotes de LIMITE_IN."""
+    query = db.session.query(Produto.prod_codigo_barras, Produto.prod_reg)
+    return dict(_em_lotes(query, Produto.prod_codigo_barras, codigos))
+
+
+def valores_existentes(coluna, valores):
+    """Quais de `valores` já existem em `coluna` (ex: chaves de NF-e já lançadas), em lotes de LIMITE_IN."""
+    return {v for (v,) in _em_lotes(db.session.query(coluna), coluna, valores)}
+
+
+def inserir_itens_entrada(entrada_id, produtos, vincular_produtos=False):
+    """
+    Insere todos os itens da entrada num único INSERT em lote (executemany)
+    e devolve os ids criados, na ordem de `produtos`. Com vincular_produtos,
+    os itens cujo código já está cadastrado saem com produto_id preenchido.
+    """
+    if not produtos:
+        return []
+    cadastrados = produtos_por_codigo(p.get('codigo') for p in produtos) if vincular_produtos else {}
+    linhas = [{
+        'entrada_id': entrada_id,
+        'produto_id': cadastrados.get(prod.get('codigo')),
+        'quantidade': int(float(prod.get('quantidade', 1) or 1)),
+        'preco_unitario': float(prod.get('preco_unitario', 0.0) or 0.0)
+    } for prod in produtos]
+    if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        resultado = db.session.execute(
+            insert(ItemEntrada).returning(ItemEntrada.id, sort_by_parameter_order=True),
+            linhas
+        )
+        return resultado.scalars().all()
+    # SQLite < 3.35 (sem RETURNING): um INSERT por item, id pelo lastrowid
+    return [db.session.execute(insert(ItemEntrada).values(**linha)).inserted_primary_key[0] for linha in linhas]
+
+
+def criar_entrada(origem, cabecalho, produtos, usuario_id, vincular_produtos=False):
+    """
+    Cria a Entrada e seus itens na sessão atual (sem commit).
+    Por padrão os itens ficam sem produto vinculado; o vínculo é feito depois, na edição.
+    """
+    entrada = Entrada(
+        tipo=origem,
+        descricao=f"Entrada via {origem}",
+        nf_chave=cabecalho.get('nf_chave'),
+        nf_numero=cabecalho.get('nf_numero'),
+        serie=cabecalho.get('serie'),
+        data_emissao=str_to_date(cabecalho.get('data_emissao')),
+        data_recebimento=str_to_date(cabecalho.get('data_recebimento')),
+        nota_fiscal=cabecalho.get('nota_fiscal'),
+        tipo_nota=cabecalho.get('tipo_nota'),
+        natureza_operacao=cabecalho.get('natureza_operacao'),
+        fornecedor_id=cabecalho.get('fornecedor_cnpj'),
+        usuario_id=usuario_id
+    )
+    db.session.add(entrada)
+    db.session.flush()
+
+    inserir_itens_entrada(entrada.id, produtos, vincular_produtos)
+    return entrada
+
+
+# --- Entrada em conferência (staging no servidor) ---
+# A sessão (cookie) guarda só o token; o conteúdo fica em tb_entrada_temp,
+# visível para qualquer worker, e expira após ENTRADA_TEMP_TTL segundos.
+
+def _ttl_entrada_temp():
+    return timedelta(seconds=current_app.config.get('ENTRADA_TEMP_TTL', 6 * 3600))
+
+
+def guardar_entrada_temp(dados, usuario_id):
+    """Guarda a entrada em conferência e associa o token à sessão atual."""
+    agora = datetime.utcnow()
+    EntradaTemp.query.filter(EntradaTemp.et_expira_em < agora).delete(synchronize_session=False)
+
+    token_anterior = session.get('entrada_temp_token')
+    if token_anterior:
+        EntradaTemp.query.filter_by(et_token=token_anterior).delete(synchronize_session=False)
+
+    token = secrets.token_hex(16)
+    db.session.add(EntradaTemp(
+        et_token=token,
+        et_usuario_id=usuario_id,
+        et_dados=dados,
+        et_criado_em=agora,
+        et_expira_em=agora + _ttl_entrada_temp()
+    ))
+    db.session.commit()
+    session['entrada_temp_token'] = token
+    return dados
+
+
+def carregar_entrada_temp(usuario_id):
+    """Dados da entrada em conferência da sessão atual (None se não houver ou expirou)."""
+    token = session.get('entrada_temp_token')
+    if not token:
+        return None
+    temp = db.session.get(EntradaTemp, token)
+    if temp is None or temp.et_usuario_id != usuario_id or temp.et_expira_em < datetime.utcnow():
+        return None
+    return temp.et_dados
+
+
+def descartar_entrada_temp():
+    """Remove a entrada em conferência da sessão atual (sem commit)."""
+    token = session.pop('entrada_temp_token', None)
+    if token:
+        EntradaTemp.query.filter_by(et_token=token).delete(synchronize_session=False)
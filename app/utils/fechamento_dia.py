@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import select, func
+from ..extensions import db
+from ..models import Caixa, CaixaTotalForma, ResumoDiaLoja
+from .livro_caixa import totais_dos_caixas, saldo_esperado
+
+# Fechamento do dia por loja: cada loja é finalizada e consolidada em
+# ResumoDiaLoja na sua própria transação, em paralelo (uma thread e um app
+# context por loja). Uma loja com erro não impede as outras; rodar de novo
+# só reprocessa o que ainda está aberto e regrava o resumo.
+
+STATUS_PENDENTES = ('aberto', 'encerrado')
+
+
+def _retirado_no_fechamento(caixa):
+    """Dinheiro que a conferência tirou do caixa ao fechar; as sangrias do dia ficam no livro."""
+    return Decimal(str(caixa.cai_dinheiro_retrada or 0))
+
+
+def _saldo_final(caixa, vendido):
+    """
+    Saldo que fica no caixa: o conferido, se houve conferência, ou o esperado
+    pelo livro (saldo_esperado), menos o retirado no fechamento. Os dois
+    partem de tb_movimento_caixa, então uma sangria conta uma vez só.
+    """
+    if caixa.cai_status == 'encerrado':
+        base = Decimal(str(caixa.cai_total_conferencia or 0))
+    else:
+        base = saldo_esperado(caixa, vendido)
+    return base - _retirado_no_fechamento(caixa)
+
+
+def _finalizar_caixa(caixa, vendido):
+    if caixa.cai_status != 'encerrado':
+        # Sem conferência: o esperado pelo livro é a referência, sem falta apurada
+        caixa.cai_total_sistema = saldo_esperado(caixa, vendido)
+    caixa.cai_saldo_final = _saldo_final(caixa, vendido)
+    caixa.cai_hora_fechamento = datetime.utcnow()
+    caixa.cai_status = 'finalizado_dia'
+
+
+def _vendas_por_forma(caixa_ids):
+    linhas = db.session.execute(
+        select(CaixaTotalForma.ct_forma, func.sum(CaixaTotalForma.ct_total))
+        .where(CaixaTotalForma.ct_caixa_id.in_(caixa_ids))
+        .group_by(CaixaTotalForma.ct_forma)
+    )
+    return {forma: str(Decimal(str(total or 0)).quantize(Decimal('0.01'))) for forma, total in linhas}
+
+
+def _somar(caixas, atributo):
+    return sum((Decimal(str(getattr(c, atributo) or 0)) for c in caixas), Decimal('0.00'))
+
+
+def consolidar_loja(loja, dia):
+    """Finaliza os caixas pendentes da loja no dia e grava o ResumoDiaLoja. Faz commit."""
+    caixas = Caixa.query.filter(Caixa.cai_data == dia, Caixa.cai_loja == loja).all()
+    pendentes = [c for c in caixas if c.cai_status in STATUS_PENDENTES]
+    vendido = totais_dos_caixas([c.cai_reg for c in caixas])
+    for c in pendentes:
+        _finalizar_caixa(c, vendido[c.cai_reg])
+
+    resumo = db.session.merge(ResumoDiaLoja(
+        rd_data=dia,
+        rd_loja=loja,
+        rd_caixas=len(caixas),
+        rd_saldo_inicial=_somar(caixas, 'cai_saldo_inicial'),
+        rd_vendas=sum(vendido.values(), Decimal('0.00')),
+        rd_conferencia=_somar(caixas, 'cai_total_conferencia'),
+        rd_falta=_somar(caixas, 'cai_falta'),
+        # Só as sangrias do livro (cai_retiradas acompanha tb_movimento_caixa); o
+        # retirado na conferência de fechamento já sai de rd_saldo_final
+        rd_retiradas=_somar(caixas, 'cai_retiradas'),
+        rd_suprimentos=_somar(caixas, 'cai_suprimentos'),
+        rd_saldo_final=_somar(caixas, 'cai_saldo_final'),
+        rd_vendas_forma=_vendas_por_forma(list(vendido)) if caixas else {},
+        rd_processado_em=datetime.utcnow(),
+    ))
+    db.session.commit()
+    return {'loja': loja, 'ok': True, 'caixas': len(pendentes), 'vendas': resumo.rd_vendas, 'erro': None}
+
+
+def _consolidar_em_thread(app, loja, dia):
+    with app.app_context():
+        try:
+            return consolidar_loja(loja, dia)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception("Erro no fechamento do dia da loja %s", loja)
+            return {'loja': loja, 'ok': False, 'caixas': 0, 'vendas': None, 'erro': str(e)}
+
+
+def _threads(quantidade_lojas):
+    configurado = current_app.config.get('FECHAMENTO_DIA_THREADS')
+    if configurado:
+        return max(1, min(int(configurado), quantidade_lojas))
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite aceita um escritor por vez: threads só disputariam o lock
+        return 1
+    # Cada thread segura uma conexão do pool até o commit da sua loja: usa no
+    # máximo metade do pool, o resto fica para as requisições do worker
+    tamanho_pool = getattr(db.engine.pool, 'size', lambda: 1)()
+    return max(1, min(quantidade_lojas, tamanho_pool // 2))
+
+
+def consolidar_dia(dia, lojas=None):
+    """
+    Fecha o dia de cada loja (as que têm caixa no dia, se `lojas` não vier)
+    em paralelo. Retorna [{'loja', 'ok', 'caixas', 'vendas', 'erro'}] por loja.
+    """
+    if lojas is None:
+        lojas = [loja for (loja,) in db.session.query(Caixa.cai_loja)
+                 .filter(Caixa.cai_data == dia).distinct().order_by(Caixa.cai_loja)]
+    if not lojas:
+        return []
+    # Libera a conexão desta sessão antes de as threads começarem a escrever
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=_threads(len(lojas))) as executor:
+        return list(executor.map(lambda loja: _consolidar_em_thread(app, loja, dia), lojas))
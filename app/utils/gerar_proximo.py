@@ -1,11 +1,13 @@
 from ..extensions import db
 from sqlalchemy import func
 from ..models import OrdemServico
+from .sequencias import proximo_numero
 
 # Função para gerar próximo CV (global)
 def gerar_proximo_cv():
-    max_cv = db.session.query(func.max(OrdemServico.cv_numero)).scalar()
-    return (max_cv or 0) + 1
+    def maior_cv():
+        return db.session.query(func.max(OrdemServico.cv_numero)).scalar()
+    return proximo_numero('cv', inicial=maior_cv)
 
 # Função para gerar próximo OS (por loja)
 def gerar_proximo_os(loja_id: str) -> str:
@@ -14,16 +16,14 @@ def gerar_proximo_os(loja_id: str) -> str:
         raise ValueError("loja_id deve ser de 01 a 99")
     loja_id = loja_id.zfill(2)  # '1' vira '01'
     
-    # Maior OS dessa loja
-    max_os = db.session.query(
-        func.max(OrdemServico.os_numero)
-    ).filter(
-        OrdemServico.os_numero.like(f"{loja_id}%")
-    ).scalar()
+    # Maior OS dessa loja (só na criação do contador)
+    def maior_os():
+        max_os = db.session.query(
+            func.max(OrdemServico.os_numero)
+        ).filter(
+            OrdemServico.os_numero.like(f"{loja_id}%")
+        ).scalar()
+        return int(max_os[2:]) if max_os else 0
     
-    if max_os:
-        sequencial = int(max_os[2:]) + 1
-    else:
-        sequencial = 1  # Começa em 00001 → valor 1
-    
-    return f"{loja_id}{sequencial:05d}"  # ex: '0100001'
\ No newline at end of file
+    sequencial = proximo_numero('os', loja_id, inicial=maior_os)
+    return f"{loja_id}{sequencial:05d}"  # ex: '0100001'
@@ -0,0 +1,133 @@
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from ..extensions import db
+from ..models import Entrada, Fornecedor
+from .nfe import ler_nfe_completa
+from .entradas import criar_entrada, valores_existentes
+
+# Importação em lote de NF-e (ZIP ou pasta do servidor).
+# A leitura dos XMLs é feita em processos separados; a gravação fica no
+# processo principal, em transações de IMPORTACAO_LOTE notas.
+# Os processos são criados com "spawn": fork de um worker gthread copiaria
+# locks (logging, pool do SQLAlchemy) presos por outras threads e o filho
+# poderia travar para sempre.
+
+# Cada processo "spawn" reimporta o app (~1 s): abaixo disso, ler no próprio processo é mais rápido
+MINIMO_PARA_PROCESSOS = 16
+
+
+def _ler_arquivo(origem):
+    """Executado nos processos filhos: (nome, conteúdo em bytes ou caminho)."""
+    nome, conteudo = origem
+    try:
+        arquivo = io.BytesIO(conteudo) if isinstance(conteudo, bytes) else conteudo
+        cabecalho, itens = ler_nfe_completa(arquivo)
+        return nome, cabecalho, itens, None
+    except Exception as e:
+        return nome, None, None, str(e)
+
+
+def arquivos_do_zip(arquivo_zip):
+    """(nome, bytes) de cada .xml dentro do ZIP (caminho ou objeto arquivo)."""
+    with zipfile.ZipFile(arquivo_zip) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and info.filename.lower().endswith('.xml'):
+                yield info.filename, zf.read(info)
+
+
+def arquivos_do_diretorio(diretorio):
+    """(nome, caminho) de cada .xml da pasta, em ordem alfabética."""
+    for nome in sorted(os.listdir(diretorio)):
+        caminho = os.path.join(diretorio, nome)
+        if nome.lower().endswith('.xml') and os.path.isfile(caminho):
+            yield nome, caminho
+
+
+def _ler_todos(arquivos):
+    arquivos = list(arquivos)
+    processos = current_app.config.get('IMPORTACAO_PROCESSOS') or os.cpu_count() or 1
+    if len(arquivos) < MINIMO_PARA_PROCESSOS or processos <= 1:
+        return [_ler_arquivo(a) for a in arquivos]
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(processos, len(arquivos)), mp_context=contexto) as executor:
+        return list(executor.map(_ler_arquivo, arquivos, chunksize=4))
+
+
+def _gravar(nota, usuario_id, fornecedores, vincular_produtos):
+    cabecalho = dict(nota['cabecalho'])
+    if cabecalho.get('fornecedor_cnpj') not in fornecedores:
+        cabecalho['fornecedor_cnpj'] = None  # fornecedor ainda não cadastrado
+    entrada = criar_entrada('xml', cabecalho, nota['itens'], usuario_id, vincular_produtos)
+    nota['resultado'].update(status='importada', entrada_id=entrada.id)
+
+
+def importar_nfes(arquivos, usuario_id, vincular_produtos=False):
+    """
+    Importa as NF-e de `arquivos` (iterável de (nome, bytes ou caminho)).
+    Com vincular_produtos, itens de códigos já cadastrados saem vinculados.
+    Retorna {'arquivos': [resultado por arquivo], 'importadas', 'duplicadas',
+    'erros', 'itens', 'segundos', 'notas_por_segundo', 'itens_por_segundo'}.
+    """
+    inicio = time.perf_counter()
+    resultados, notas = [], []
+
+    for nome, cabecalho, itens, erro in _ler_todos(arquivos):
+        resultado = {'arquivo': nome, 'status': 'erro', 'nf_chave': '', 'nf_numero': '',
+                     'itens': 0, 'entrada_id': None, 'mensagem': erro or ''}
+        resultados.append(resultado)
+        if erro:
+            continue
+        resultado.update(nf_chave=cabecalho['nf_chave'], nf_numero=cabecalho['nf_numero'], itens=len(itens))
+        if not cabecalho['nf_chave']:
+            resultado['mensagem'] = 'NF-e sem chave de acesso'
+            continue
+        notas.append({'cabecalho': cabecalho, 'itens': itens, 'resultado': resultado})
+
+    # Duplicadas: já lançadas antes ou repetidas dentro do próprio lote
+    ja_lancadas = valores_existentes(Entrada.nf_chave, (n['cabecalho']['nf_chave'] for n in notas))
+    fornecedores = valores_existentes(Fornecedor.forn_cnpj, (n['cabecalho']['fornecedor_cnpj'] for n in notas))
+    novas = []
+    for nota in notas:
+        chave = nota['cabecalho']['nf_chave']
+        if chave in ja_lancadas:
+            nota['resultado'].update(status='duplicada', mensagem='NF-e já lançada')
+        else:
+            ja_lancadas.add(chave)
+            novas.append(nota)
+
+    tamanho_lote = current_app.config.get('IMPORTACAO_LOTE', 50)
+    for i in range(0, len(novas), tamanho_lote):
+        lote = novas[i:i + tamanho_lote]
+        try:
+            for nota in lote:
+                _gravar(nota, usuario_id, fornecedores, vincular_produtos)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Refaz o lote nota a nota para isolar a que falhou
+            for nota in lote:
+                try:
+                    _gravar(nota, usuario_id, fornecedores, vincular_produtos)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    nota['resultado'].update(status='erro', entrada_id=None, mensagem=str(e))
+
+    segundos = time.perf_counter() - inicio
+    importadas = [r for r in resultados if r['status'] == 'importada']
+    total_itens = sum(r['itens'] for r in importadas)
+    return {
+        'arquivos': resultados,
+        'importadas': len(importadas),
+        'duplicadas': sum(1 for r in resultados if r['status'] == 'duplicada'),
+        'erros': sum(1 for r in resultados if r['status'] == 'erro'),
+        'itens': total_itens,
+        'segundos': segundos,
+        'notas_por_segundo': len(resultados) / segundos if segundos else 0.0,
+        'itens_por_segundo': total_itens / segundos if segundos else 0.0,
+    }
@@ -0,0 +1,115 @@
+import threading
+from bisect import bisect_left
+from ..extensions import db
+from ..models import LenteGenerica
+from .lentes import eixos_da_grade, centesimos, posicao_centesimos
+from .versoes import versao_atual, monitorar_modelos
+
+# Qualquer alteração em LenteGenerica invalida o índice em todos os workers
+monitorar_modelos('lentes', LenteGenerica)
+
+
+class _EixoIntervalos:
+    """
+    Intervalos fechados [mín, máx] de um eixo (esf, cil ou add) de todas as
+    lentes. Os extremos dividem a reta em segmentos elementares e cada
+    segmento guarda, em um inteiro usado como bitmask, as lentes que o cobrem.
+    """
+
+    def __init__(self, intervalos):
+        self.pontos = sorted({v for intervalo in intervalos for v in intervalo})
+        segmentos = 2 * len(self.pontos) + 1
+        inicia = [0] * (segmentos + 1)
+        termina = [0] * (segmentos + 1)
+        for i, (minimo, maximo) in enumerate(intervalos):
+            inicia[2 * bisect_left(self.pontos, minimo) + 1] |= 1 << i
+            termina[2 * bisect_left(self.pontos, maximo) + 2] |= 1 << i
+
+        self.mascaras = []
+        atual = 0
+        for s in range(segmentos):
+            atual = (atual | inicia[s]) & ~termina[s]
+            self.mascaras.append(atual)
+
+    def lentes_que_cobrem(self, valor):
+        i = bisect_left(self.pontos, valor)
+        if i < len(self.pontos) and self.pontos[i] == valor:
+            return self.mascaras[2 * i + 1]
+        return self.mascaras[2 * i]
+
+
+class IndiceLentes:
+    """Índice de faixas esf/cil/add das lentes genéricas, para consulta por receita."""
+
+    def __init__(self, lentes):
+        self.lentes = []
+        self.eixos = []
+        for lente in lentes:
+            try:
+                eixos = eixos_da_grade(lente)
+            except ValueError:
+                continue  # passo inválido: a lente não tem grade
+            if not all(quantidade for _, _, quantidade in eixos):
+                continue
+            self.lentes.append({
+                'id': lente.id,
+                'codigo_base': lente.codigo_base,
+                'descricao': lente.descricao,
+                'tipo_lente': lente.tipo_lente,
+                'id_refracao': lente.id_refracao,
+                'antirreflexo': lente.antirreflexo,
+                'escurecimento': lente.escurecimento,
+                'preco': float(lente.preco_base or 0)
+            })
+            self.eixos.append(eixos)
+
+        self._por_eixo = [
+            _EixoIntervalos([
+                (inicio, inicio + (quantidade - 1) * passo)
+                for inicio, passo, quantidade in (eixos[e] for eixos in self.eixos)
+            ])
+            for e in range(3)
+        ]
+
+    def __len__(self):
+        return len(self.lentes)
+
+    def compativeis(self, esf, cil, add):
+        """Lentes cuja grade contém exatamente a combinação esf/cil/add."""
+        valores = (centesimos(esf), centesimos(cil), centesimos(add))
+        candidatas = -1
+        for eixo, valor in zip(self._por_eixo, valores):
+            candidatas &= eixo.lentes_que_cobrem(valor)
+            if not candidatas:
+                return []
+
+        resultado = []
+        while candidatas:
+            bit = candidatas & -candidatas
+            i = bit.bit_length() - 1
+            candidatas ^= bit
+            # Dentro da faixa não basta: o valor também precisa cair no passo
+            if posicao_centesimos(self.eixos[i], valores) is not None:
+                resultado.append(self.lentes[i])
+        return resultado
+
+
+_indice = None
+_versao_indice = None
+_lock = threading.Lock()
+
+
+def indice_lentes():
+    """Índice deste worker, reconstruído quando alguma LenteGenerica muda."""
+    global _indice, _versao_indice
+    versao = versao_atual('lentes')
+    if _indice is None or versao != _versao_indice:
+        with _lock:
+            if _indice is None or versao != _versao_indice:
+                _indice = IndiceLentes(db.session.query(LenteGenerica).all())
+                _versao_indice = versao
+    return _indice
+
+
+def lentes_compativeis(esf, cil, add):
+    return indice_lentes().compativeis(esf, cil, add)
@@ -0,0 +1,89 @@
+import re
+from datetime import date, timedelta
+from sqlalchemy import inspect, select
+from ..extensions import db
+from ..models import OrdemServico, Caixa, Devolucao, SaidaNF, ItemVenda, Entrada, Produto
+
+# Índices declarados nos modelos (index=True / __table_args__) e as consultas
+# quentes que dependem deles. create_all só cria índices junto com tabelas
+# novas; criar_indices aplica os que faltam em bancos já existentes.
+
+
+def criar_indices():
+    """Cria os índices declarados que ainda não existem no banco. Retorna os nomes criados."""
+    criados = []
+    with db.engine.begin() as conexao:
+        inspetor = inspect(conexao)
+        for tabela in db.metadata.sorted_tables:
+            if not inspetor.has_table(tabela.name):
+                continue  # tabela nova: create_all já cria com os índices
+            existentes = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name not in existentes:
+                    indice.create(conexao)
+                    criados.append(indice.name)
+    return criados
+
+
+def _consultas_quentes():
+    hoje = date.today()
+    amanha = hoje + timedelta(days=1)
+    return [
+        ('monitor de produção', select(OrdemServico).where(
+            OrdemServico.status.in_(['venda_concluida', 'liberado_compra'])
+        ).order_by(OrdemServico.data_emissao.desc())),
+        ('vendas do dia', select(OrdemServico).where(
+            OrdemServico.data_emissao >= hoje, OrdemServico.data_emissao < amanha,
+            OrdemServico.status == 'venda_concluida')),
+        ('OS da venda', select(OrdemServico).where(OrdemServico.cv_numero == 1)),
+        ('OS da loja', select(OrdemServico).where(OrdemServico.loja_id == '01')),
+        ('caixa do dia', select(Caixa).where(Caixa.cai_data == hoje).order_by(Caixa.cai_reg.desc())),
+        ('finalizar dia', select(Caixa).where(
+            Caixa.cai_data == hoje, Caixa.cai_status.in_(['aberto', 'encerrado']))),
+        ('caixa aberto da loja', select(Caixa).where(Caixa.cai_loja == '01', Caixa.cai_status == 'aberto')),
+        ('caixa aberto', select(Caixa).where(Caixa.cai_status == 'aberto')),
+        ('devoluções do dia', select(Devolucao).where(
+            Devolucao.data_devolucao >= hoje, Devolucao.data_devolucao < amanha)),
+        ('histórico do cliente', select(SaidaNF).where(
+            SaidaNF.snf_cliente_id == '00000000000', SaidaNF.snf_data_emissao >= hoje,
+            SaidaNF.snf_data_emissao <= amanha).order_by(SaidaNF.snf_data_emissao.desc())),
+        ('itens da venda', select(ItemVenda).where(ItemVenda.cv_numero == 1)),
+        ('entrada pela chave', select(Entrada).where(Entrada.nf_chave == '0' * 44)),
+        ('produtos por tipo', select(Produto.prod_reg).where(
+            Produto.prod_tipo == 'armacao', Produto.prod_codigo_barras.like('1%'))),
+    ]
+
+
+def _plano(conexao, consulta):
+    dialeto = conexao.dialect
+    compilada = consulta.compile(dialect=dialeto, compile_kwargs={'render_postcompile': True})
+    if compilada.positional:
+        parametros = tuple(compilada.params[nome] for nome in compilada.positiontup)
+    else:
+        parametros = compilada.params
+    if dialeto.name == 'sqlite':
+        linhas = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compilada), parametros).all()
+        return [linha[-1] for linha in linhas]
+    return [linha[0] for linha in conexao.exec_driver_sql('EXPLAIN ' + str(compilada), parametros)]
+
+
+def _usa_indice(plano):
+    texto = '\n'.join(plano)
+    # SQLite: "SCAN tabela" sem "USING ... INDEX" é leitura da tabela inteira
+    varredura = any(re.fullmatch(r'SCAN \w+', passo.strip()) for passo in plano)
+    return 'INDEX' in texto.upper() and not varredura and 'Seq Scan' not in texto
+
+
+def verificar_planos():
+    """[(consulta, usa índice, plano)] das consultas quentes, via EXPLAIN."""
+    resultado = []
+    with db.engine.connect() as conexao:
+        if conexao.dialect.name == 'postgresql':
+            # Com tabelas pequenas o Postgres prefere Seq Scan mesmo com índice.
+            # Desligando-o (só nesta transação, desfeita ao fechar a conexão),
+            # Seq Scan no plano quer dizer que nenhum índice serve à consulta.
+            conexao.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        for nome, consulta in _consultas_quentes():
+            plano = _plano(conexao, consulta)
+            resultado.append((nome, _usa_indice(plano), plano))
+    return resultado
@@ -0,0 +1,62 @@
+from werkzeug.security import generate_password_hash
+from ..extensions import db
+from .indices import criar_indices
+from .busca import criar_indices_busca
+from .os_status import reconstruir_contagens
+from .codigos_barras import limpar_alteracoes
+
+AMBIENTES_PADRAO = [
+    ('administrador', 'Ambiente administrativo'),
+    ('entradas', 'Módulo de Entradas'),
+    ('saidas', 'Módulo de Saídas'),
+    ('financeiro', 'Módulo Financeiro'),
+    ('caixa', 'Caixa / PDV'),
+    ('monitor_producao', 'Monitor de Produção')
+]
+
+
+def inicializar_banco():
+    """
+    Cria o esquema e os registros iniciais (ambientes e usuário master).
+    Pode ser executada várias vezes: só cria o que estiver faltando.
+    Deve rodar uma vez na implantação (flask init-db) ou no master do
+    gunicorn (on_starting), nunca dentro de uma requisição.
+    """
+    from ..models import Ambiente, Usuario
+
+    db.create_all()
+    # Bancos já existentes: aplica os índices declarados depois da criação das tabelas
+    criados = criar_indices()
+    if criados:
+        print(f"🗂️  Índices criados: {', '.join(criados)}")
+    criados = criar_indices_busca()
+    if criados:
+        print(f"🔎 Índices de busca criados: {', '.join(criados)}")
+    # Contagem de OS por status: carga inicial em bancos que já tinham OS
+    from ..models import ContagemStatusOS, OrdemServico
+    if not ContagemStatusOS.query.first() and OrdemServico.query.first():
+        reconstruir_contagens()
+        db.session.commit()
+        print("📊 Contagem de OS por status recalculada")
+    # Registro de códigos de barras alterados: os workers só precisam dos recentes
+    limpar_alteracoes()
+
+    for nome, descricao in AMBIENTES_PADRAO:
+        if not Ambiente.query.filter_by(amb_nome=nome).first():
+            db.session.add(Ambiente(
+                amb_nome=nome,
+                amb_ativo=True,
+                amb_descricao=descricao
+            ))
+
+    if not Usuario.query.filter_by(us_email='cruz@devsoft').first():
+        db.session.add(Usuario(
+            us_cad='Programador',
+            us_email='cruz@devsoft',
+            us_senha=generate_password_hash('DevsoftSistem'),
+            us_ativo=True,
+            us_forcar_troca_senha=False,
+            loja_id='01'
+        ))
+
+    db.session.commit()
@@ -1,8 +1,17 @@
 import os
+import sys
 import json
 import gzip
+import mmap
+import struct
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
 from decimal import Decimal
 from flask import current_app
+from ..models import LenteGenerica
 
 def gerar_valores(min_val, max_val, step):
     """Gera lista de valores com passo fixo (ex: -6.00, -5.75, ..., 6.00)"""
@@ -16,68 +25,550 @@ def gerar_valores(min_val, max_val, step):
     return valores
 
 
+def centesimos(valor):
+    """Converte uma dioptria (ex: '-3.25') em inteiro de centésimos (ex: -325)."""
+    return int(Decimal(str(valor)).quantize(Decimal('0.01')) * 100)
+
+
+def _formatar_centesimos(valor):
+    """Formata centésimos no mesmo padrão de gerar_valores (ex: -325 → '-3.25')."""
+    sinal = '-' if valor < 0 else ''
+    valor = abs(valor)
+    return f"{sinal}{valor // 100}.{valor % 100:02d}"
+
+
+def eixo_da_grade(min_val, max_val, step):
+    """Descreve um eixo da grade como (início, passo, quantidade), em centésimos."""
+    inicio = centesimos(min_val)
+    fim = centesimos(max_val)
+    passo = centesimos(step)
+    if passo <= 0:
+        raise ValueError("Passo da grade deve ser positivo")
+    if fim < inicio:
+        return (inicio, passo, 0)
+    return (inicio, passo, (fim - inicio) // passo + 1)
+
+
+def eixos_da_grade(generica):
+    """Eixos esf/cil/add da grade, na mesma ordem de gerar_combinacoes_lente."""
+    return (
+        eixo_da_grade(generica.esf_min, generica.esf_max, generica.esf_step),
+        eixo_da_grade(generica.cil_max, generica.cil_min, generica.cil_step),  # cil_max é negativo!
+        eixo_da_grade(generica.add_min, generica.add_max, generica.add_step),
+    )
+
+
+def posicao_na_grade(eixos, esf, cil, add):
+    """
+    Calcula a posição (0 = primeira combinação) de esf/cil/add na grade.
+    Retorna None se o valor estiver fora da faixa ou fora do passo.
+    """
+    return posicao_centesimos(eixos, (centesimos(esf), centesimos(cil), centesimos(add)))
+
+
+def posicao_centesimos(eixos, valores):
+    """Mesmo que posicao_na_grade, com (esf, cil, add) já em centésimos."""
+    posicao = 0
+    for (inicio, passo, quantidade), valor in zip(eixos, valores):
+        deslocamento = valor - inicio
+        if deslocamento < 0 or deslocamento % passo:
+            return None
+        indice = deslocamento // passo
+        if indice >= quantidade:
+            return None
+        posicao = posicao * quantidade + indice
+    return posicao
+
+
+def valores_da_posicao(eixos, posicao):
+    """Operação inversa de posicao_na_grade: devolve (esf, cil, add) em centésimos."""
+    valores = []
+    for inicio, passo, quantidade in reversed(eixos):
+        posicao, indice = divmod(posicao, quantidade)
+        valores.append(inicio + indice * passo)
+    return tuple(reversed(valores))
+
+
+def _partes_nome(generica):
+    """Prefixo e sufixo comuns a todos os nomes da grade."""
+    prefixo = f"LG {generica.descricao} {generica.tipo_lente} {generica.id_refracao}".upper()
+    sufixo = ''
+    if generica.antirreflexo:
+        sufixo += f" {generica.antirreflexo.upper()}"
+    if generica.escurecimento:
+        sufixo += f" {generica.escurecimento.upper()}"
+    return prefixo, sufixo
+
+
+def _montar_item(codigo_base, prefixo, sufixo, altura, preco, sequencia, esf, cil, add):
+    """Monta o dicionário de uma combinação a partir dos valores em centésimos."""
+    esf, cil, add = _formatar_centesimos(esf), _formatar_centesimos(cil), _formatar_centesimos(add)
+    return {
+        'codigo': f"{codigo_base}{sequencia:04d}",
+        'nome': f"{prefixo} {esf} {cil} {add}{sufixo}",
+        'esf': esf,
+        'cil': cil,
+        'add': add,
+        'altura': altura,
+        'preco': preco
+    }
+
+
+class CombinacoesLente(Sequence):
+    """
+    Combinações de uma lente genérica guardadas em colunas (array):
+    esf/cil/add em centésimos, sequência do código de barras e preço em
+    centavos. O nome e o dicionário de cada item só são montados quando
+    o item é acessado (combinacoes[i]), não na geração.
+    """
+
+    def __init__(self, generica):
+        self.codigo_base = generica.codigo_base
+        self.eixos = eixos_da_grade(generica)
+        self.prefixo, self.sufixo = _partes_nome(generica)
+        self.altura = generica.altura_fixa or "18"
+        self.preco_centavos = int(Decimal(str(generica.preco_base or 0)) * 100)
+
+        (esf_ini, esf_passo, n_esf), (cil_ini, cil_passo, n_cil), (add_ini, add_passo, n_add) = self.eixos
+        total = n_esf * n_cil * n_add
+
+        # Cada coluna é montada repetindo blocos inteiros (em C), sem laço por célula
+        self.esf = array('i')
+        for i in range(n_esf):
+            self.esf += array('i', [esf_ini + i * esf_passo]) * (n_cil * n_add)
+        bloco_cil = array('i')
+        for i in range(n_cil):
+            bloco_cil += array('i', [cil_ini + i * cil_passo]) * n_add
+        self.cil = bloco_cil * n_esf
+        self.add = array('i', range(add_ini, add_ini + n_add * add_passo, add_passo)) * (n_esf * n_cil)
+        self.sequencias = array('I', range(1, total + 1))
+        self.precos = array('q', [self.preco_centavos]) * total
+
+    def __len__(self):
+        return len(self.sequencias)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        return _montar_item(
+            self.codigo_base, self.prefixo, self.sufixo, self.altura,
+            self.precos[indice] / 100, self.sequencias[indice],
+            self.esf[indice], self.cil[indice], self.add[indice]
+        )
+
+
 def gerar_combinacoes_lente(generica):
-    """Gera todas as combinações válidas de uma lente genérica."""
-    esf_vals = gerar_valores(generica.esf_min, generica.esf_max, generica.esf_step)
-    cil_vals = gerar_valores(generica.cil_max, generica.cil_min, generica.cil_step)  # cil_max é negativo!
-    add_vals = gerar_valores(generica.add_min, generica.add_max, generica.add_step)
-
-    combinacoes = []
-    sequencia = 1
-    for esf in esf_vals:
-        for cil in cil_vals:
-            for add in add_vals:
-                codigo_barras = f"{generica.codigo_base}{sequencia:04d}"
-                nome = f"LG {generica.descricao} {generica.tipo_lente} {generica.id_refracao} {esf} {cil} {add}".upper()
-                if generica.antirreflexo:
-                    nome += f" {generica.antirreflexo.upper()}"
-                if generica.escurecimento:
-                    nome += f" {generica.escurecimento.upper()}"
-
-                combinacoes.append({
-                    'codigo': codigo_barras,
-                    'nome': nome,
-                    'esf': esf,
-                    'cil': cil,
-                    'add': add,
-                    'altura': generica.altura_fixa or "18",
-                    'preco': float(generica.preco_base)
-                })
-                sequencia += 1
-    return combinacoes
+    """Gera todas as combinações válidas de uma lente genérica (em colunas)."""
+    return CombinacoesLente(generica)
 
 
-def salvar_grade_compactada(generica, combinacoes):
-    """Salva as combinações em arquivo JSON compactado."""
+def _diretorio_grades():
     # Diretório relativo ao projeto (não ao módulo)
-    base_dir = current_app.root_path
-    grades_dir = os.path.join(base_dir, 'static', 'grades')
+    return os.path.join(current_app.root_path, 'static', 'grades')
+
+
+# Formato binário da grade (<codigo_base>.grd), lido via mmap:
+#   cabeçalho fixo: magic, versão, eixos esf/cil/add (início, passo, qtd em
+#                   centésimos), preço em centavos, nº de registros,
+#                   próxima sequência, nº de removidas e offsets das seções
+#   registros:      um uint32 por combinação, na ordem da grade, com a
+#                   sequência usada no código de barras
+#   removidas:      (sequência, esf, cil, add) das combinações que saíram
+#                   da grade; a sequência nunca é reutilizada por outra
+#   strings:        codigo_base, prefixo do nome, sufixo do nome e altura
+GRADE_MAGIC = b'LGRD'
+GRADE_VERSAO = 2
+_CABECALHO = struct.Struct('<4sHH iiI iiI iiI q IIIII')
+_CABECALHO_V1 = struct.Struct('<4sHH iiI iiI iiI q III')  # sem seção de removidas
+_REGISTRO = struct.Struct('<I')
+_REMOVIDA = struct.Struct('<Ihhh')
+_TAMANHO_STRING = struct.Struct('<H')
+
+
+def _caminho_grade(codigo_base):
+    return os.path.join(_diretorio_grades(), f"{codigo_base}.grd")
+
+
+def _empacotar_strings(*valores):
+    partes = []
+    for valor in valores:
+        dados = valor.encode('utf-8')
+        partes.append(_TAMANHO_STRING.pack(len(dados)))
+        partes.append(dados)
+    return b''.join(partes)
+
+
+def _sequencias_em_bytes(sequencias):
+    registros = array('I', sequencias)  # cópia: a coluna original não é alterada
+    if sys.byteorder == 'big':
+        registros.byteswap()
+    return registros.tobytes()
+
+
+def _gravar_grade(generica, eixos, registros, proxima_sequencia, removidas=b'', n_removidas=0):
+    """
+    Grava o arquivo .grd em um temporário e troca atomicamente, para não
+    afetar workers que estejam com a versão anterior mapeada.
+    """
+    total = eixos[0][2] * eixos[1][2] * eixos[2][2]
+    prefixo, sufixo = _partes_nome(generica)
+    strings = _empacotar_strings(generica.codigo_base, prefixo, sufixo, generica.altura_fixa or "18")
+
+    offset_removidas = _CABECALHO.size + total * _REGISTRO.size
+    offset_strings = offset_removidas + n_removidas * _REMOVIDA.size
+    cabecalho = _CABECALHO.pack(
+        GRADE_MAGIC, GRADE_VERSAO, 0,
+        *eixos[0], *eixos[1], *eixos[2],
+        int(Decimal(str(generica.preco_base or 0)) * 100),
+        total, proxima_sequencia, n_removidas, offset_removidas, offset_strings
+    )
+
+    grades_dir = _diretorio_grades()
     os.makedirs(grades_dir, exist_ok=True)
+    grade_path = _caminho_grade(generica.codigo_base)
+    # Nome único por gravação: duas threads (ou workers) regravando a mesma
+    # grade não escrevem no mesmo temporário
+    with tempfile.NamedTemporaryFile(dir=grades_dir, prefix=f"{generica.codigo_base}.",
+                                     suffix='.tmp', delete=False) as f:
+        temp_path = f.name
+        try:
+            f.write(cabecalho)
+            f.write(registros)
+            f.write(removidas)
+            f.write(strings)
+        except Exception:
+            f.close()
+            os.unlink(temp_path)
+            raise
+    os.replace(temp_path, grade_path)
+    cache_grades().descartar(generica.codigo_base)
+
+
+def salvar_grade_compactada(generica, combinacoes):
+    """
+    Salva a grade completa no formato binário de registros fixos
+    (<codigo_base>.grd). As sequências recomeçam conforme as combinações;
+    para preservar códigos já emitidos use regenerar_grade_incremental.
+    """
+    eixos = eixos_da_grade(generica)
+    total = eixos[0][2] * eixos[1][2] * eixos[2][2]
+    if len(combinacoes) != total:
+        raise ValueError("Combinações não correspondem às faixas da lente")
+
+    if isinstance(combinacoes, CombinacoesLente):
+        sequencias = combinacoes.sequencias
+    else:
+        tamanho_base = len(generica.codigo_base)
+        sequencias = [int(item['codigo'][tamanho_base:]) for item in combinacoes]
+
+    _gravar_grade(generica, eixos, _sequencias_em_bytes(sequencias), max(sequencias, default=0) + 1)
+
+
+def regenerar_grade_incremental(generica):
+    """
+    Regrava a grade após mudança de faixa, preço ou descrição da lente,
+    sem trocar os códigos de barras já emitidos:
+      - combinações que continuam na grade mantêm a sequência;
+      - combinações novas recebem sequências a partir da próxima livre
+        (ou a antiga, se a combinação já existiu e tinha sido removida);
+      - combinações que saíram viram removidas, e a sequência fica reservada.
+    Se os eixos não mudaram, os registros são copiados sem recálculo.
+    Retorna um resumo com as quantidades mantidas, novas e removidas.
+    """
+    antiga = cache_grades().obter(generica.codigo_base)
+    if antiga is None:
+        combinacoes = gerar_combinacoes_lente(generica)
+        salvar_grade_compactada(generica, combinacoes)
+        return {'mantidas': 0, 'novas': len(combinacoes), 'removidas': 0}
 
-    grade_path = os.path.join(grades_dir, f"{generica.codigo_base}.json.gz")
-    with gzip.open(grade_path, 'wt', encoding='utf-8') as f:
-        json.dump(combinacoes, f, ensure_ascii=False)
+    eixos = eixos_da_grade(generica)
+    if eixos == antiga.eixos:
+        _gravar_grade(
+            generica, eixos, antiga.registros_em_bytes(), antiga.proxima_sequencia,
+            antiga.removidas_em_bytes(), antiga.n_removidas
+        )
+        return {'mantidas': antiga.total, 'novas': 0, 'removidas': 0}
+
+    removidas = {(esf, cil, add): sequencia for sequencia, esf, cil, add in antiga.removidas()}
+    nova = CombinacoesLente(generica)
+    proxima = antiga.proxima_sequencia
+    sequencias = array('I', bytes(len(nova) * _REGISTRO.size))
+    mantidas = 0
+    for posicao, valores in enumerate(zip(nova.esf, nova.cil, nova.add)):
+        posicao_antiga = posicao_centesimos(antiga.eixos, valores)
+        if posicao_antiga is not None:
+            sequencias[posicao] = antiga.sequencia(posicao_antiga)
+            mantidas += 1
+        elif valores in removidas:
+            sequencias[posicao] = removidas.pop(valores)
+        else:
+            sequencias[posicao] = proxima
+            proxima += 1
+
+    novas_removidas = 0
+    for posicao_antiga in range(antiga.total):
+        valores = valores_da_posicao(antiga.eixos, posicao_antiga)
+        if posicao_centesimos(eixos, valores) is None:
+            removidas[valores] = antiga.sequencia(posicao_antiga)
+            novas_removidas += 1
+
+    registros_removidas = b''.join(
+        _REMOVIDA.pack(sequencia, *valores) for valores, sequencia in removidas.items()
+    )
+    _gravar_grade(
+        generica, eixos, _sequencias_em_bytes(sequencias), proxima,
+        registros_removidas, len(removidas)
+    )
+    return {'mantidas': mantidas, 'novas': len(nova) - mantidas, 'removidas': novas_removidas}
+
+
+class GradeMapeada:
+    """
+    Grade binária aberta com mmap. Nada é decodificado na abertura além do
+    cabeçalho e das strings; cada consulta lê só o registro da posição.
+    """
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, versao = struct.unpack_from('<4sH', self._mapa, 0)
+            if magic != GRADE_MAGIC or versao not in (1, GRADE_VERSAO):
+                raise ValueError(f"Arquivo de grade inválido: {caminho}")
+            if versao == 1:
+                campos = _CABECALHO_V1.unpack_from(self._mapa, 0)
+                self._offset_registros = _CABECALHO_V1.size
+                self.total, self.proxima_sequencia, offset_strings = campos[13:16]
+                self.n_removidas, self._offset_removidas = 0, offset_strings
+            else:
+                campos = _CABECALHO.unpack_from(self._mapa, 0)
+                self._offset_registros = _CABECALHO.size
+                (self.total, self.proxima_sequencia, self.n_removidas,
+                 self._offset_removidas, offset_strings) = campos[13:18]
+            self.eixos = (tuple(campos[3:6]), tuple(campos[6:9]), tuple(campos[9:12]))
+            self.preco = campos[12] / 100
+            self.codigo_base, self.prefixo, self.sufixo, self.altura = self._ler_strings(offset_strings, 4)
+        except Exception:
+            self._mapa.close()
+            raise
+
+    def _ler_strings(self, offset, quantidade):
+        valores = []
+        for _ in range(quantidade):
+            (tamanho,) = _TAMANHO_STRING.unpack_from(self._mapa, offset)
+            offset += _TAMANHO_STRING.size
+            valores.append(self._mapa[offset:offset + tamanho].decode('utf-8'))
+            offset += tamanho
+        return valores
+
+    def __len__(self):
+        return self.total
+
+    def sequencia(self, posicao):
+        (sequencia,) = _REGISTRO.unpack_from(self._mapa, self._offset_registros + posicao * _REGISTRO.size)
+        return sequencia
+
+    def registros_em_bytes(self):
+        return self._mapa[self._offset_registros:self._offset_registros + self.total * _REGISTRO.size]
+
+    def removidas_em_bytes(self):
+        return self._mapa[self._offset_removidas:self._offset_removidas + self.n_removidas * _REMOVIDA.size]
+
+    def removidas(self):
+        """(sequência, esf, cil, add) das combinações que saíram da grade."""
+        return _REMOVIDA.iter_unpack(self.removidas_em_bytes())
+
+    def item(self, posicao):
+        """Monta o dicionário da combinação na posição informada."""
+        return _montar_item(
+            self.codigo_base, self.prefixo, self.sufixo, self.altura,
+            self.preco, self.sequencia(posicao), *valores_da_posicao(self.eixos, posicao)
+        )
+
+    def buscar(self, esf, cil, add):
+        posicao = posicao_na_grade(self.eixos, esf, cil, add)
+        if posicao is None:
+            return None
+        return self.item(posicao)
+
+    def fechar(self):
+        self._mapa.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class CacheGrades:
+    """
+    Cache LRU, por worker, das grades abertas (GradeMapeada), por codigo_base.
+    O custo de cada grade é o tamanho do arquivo; ao passar do limite, as
+    menos usadas saem primeiro. Uma grade é recarregada quando o mtime,
+    inode ou tamanho do arquivo mudam (ex: depois de salvar_grade_compactada).
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._grades = OrderedDict()  # codigo_base -> (assinatura, custo, grade)
+        self._lock = threading.Lock()
+        self.bytes_em_uso = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self.invalidacoes = 0
+
+    def obter(self, codigo_base):
+        """Retorna a GradeMapeada do codigo_base ou None se não houver arquivo."""
+        caminho = _caminho_grade(codigo_base)
+        try:
+            st = os.stat(caminho)
+        except FileNotFoundError:
+            self.descartar(codigo_base)
+            return None
+        assinatura = (st.st_mtime_ns, st.st_ino, st.st_size)
+
+        with self._lock:
+            entrada = self._grades.get(codigo_base)
+            if entrada and entrada[0] == assinatura:
+                self._grades.move_to_end(codigo_base)
+                self.acertos += 1
+                return entrada[2]
+            self.falhas += 1
+            if entrada:
+                self.invalidacoes += 1
+                self._remover(codigo_base)
+
+        grade = GradeMapeada(caminho)
+        with self._lock:
+            if codigo_base in self._grades:
+                self._remover(codigo_base)
+            self._grades[codigo_base] = (assinatura, st.st_size, grade)
+            self.bytes_em_uso += st.st_size
+            while self.bytes_em_uso > self.limite_bytes and len(self._grades) > 1:
+                self._remover(next(iter(self._grades)))
+                self.remocoes += 1
+        return grade
+
+    def _remover(self, codigo_base):
+        # O mmap não é fechado aqui: outra thread pode estar lendo a grade.
+        # Ele é liberado quando a última referência deixa de existir.
+        _, custo, _ = self._grades.pop(codigo_base)
+        self.bytes_em_uso -= custo
+
+    def descartar(self, codigo_base):
+        with self._lock:
+            if codigo_base in self._grades:
+                self._remover(codigo_base)
+
+    def limpar(self):
+        with self._lock:
+            self._grades.clear()
+            self.bytes_em_uso = 0
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'grades': len(self._grades),
+                'bytes_em_uso': self.bytes_em_uso,
+                'limite_bytes': self.limite_bytes,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0,
+                'remocoes': self.remocoes,
+                'invalidacoes': self.invalidacoes
+            }
+
+
+_cache_grades = None
+
+
+def cache_grades():
+    """Cache de grades deste worker (limite em GRADES_CACHE_MAX_BYTES)."""
+    global _cache_grades
+    if _cache_grades is None:
+        _cache_grades = CacheGrades(current_app.config.get('GRADES_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    return _cache_grades
+
+
+def estatisticas_cache_grades():
+    return cache_grades().estatisticas()
+
+
+def _caminho_grade_legada(codigo_base):
+    return os.path.join(_diretorio_grades(), f"{codigo_base}.json.gz")
+
+
+def converter_grade_legada(generica):
+    """
+    Converte a grade antiga em JSON compactado (.json.gz) para o formato
+    binário (.grd), mantendo a sequência de cada combinação. Cada item é
+    posicionado pelos eixos atuais da lente; se o JSON não cobrir a grade
+    inteira, levanta ValueError e a grade legada continua sendo usada.
+    O .json.gz não é apagado.
+    """
+    with gzip.open(_caminho_grade_legada(generica.codigo_base), 'rt', encoding='utf-8') as f:
+        combinacoes = json.load(f)
+
+    eixos = eixos_da_grade(generica)
+    total = eixos[0][2] * eixos[1][2] * eixos[2][2]
+    tamanho_base = len(generica.codigo_base)
+    sequencias = array('I', bytes(total * _REGISTRO.size))
+    preenchidas = 0
+    for item in combinacoes:
+        posicao = posicao_na_grade(eixos, item['esf'], item['cil'], item['add'])
+        if posicao is None or sequencias[posicao]:
+            raise ValueError(f"Grade legada {generica.codigo_base} não corresponde às faixas da lente")
+        sequencias[posicao] = int(item['codigo'][tamanho_base:])
+        preenchidas += 1
+    if preenchidas != total:
+        raise ValueError(f"Grade legada {generica.codigo_base} não corresponde às faixas da lente")
+
+    _gravar_grade(generica, eixos, _sequencias_em_bytes(sequencias), max(sequencias, default=0) + 1)
+
+
+def _buscar_na_grade_legada(grade_path, esf, cil, add):
+    """Varredura linear das grades antigas em JSON compactado (.json.gz)."""
+    with gzip.open(grade_path, 'rt', encoding='utf-8') as f:
+        combinacoes = json.load(f)
+
+    esf_busca = f"{float(esf):.2f}"
+    cil_busca = f"{float(cil):.2f}"
+    add_busca = f"{float(add):.2f}"
+
+    for item in combinacoes:
+        if item['esf'] == esf_busca and item['cil'] == cil_busca and item['add'] == add_busca:
+            return item
+    return None
 
 
 def buscar_combinacao_na_grade(codigo_base, esf, cil, add):
-    """Busca uma combinação específica na grade compactada."""
-    base_dir = current_app.root_path
-    grade_path = os.path.join(base_dir, 'static', 'grades', f"{codigo_base}.json.gz")
-    
-    if not os.path.exists(grade_path):
-        return None
+    """
+    Busca uma combinação específica na grade.
+    A posição é calculada pelos eixos do cabeçalho (O(1)) e só o registro
+    correspondente é lido do arquivo mapeado, mantido no cache do worker.
+    Uma grade legada (.json.gz) é convertida para .grd na primeira leitura.
+    """
+    legado_path = _caminho_grade_legada(codigo_base)
 
     try:
-        with gzip.open(grade_path, 'rt', encoding='utf-8') as f:
-            combinacoes = json.load(f)
-
-        esf_busca = f"{float(esf):.2f}"
-        cil_busca = f"{float(cil):.2f}"
-        add_busca = f"{float(add):.2f}"
+        grade = cache_grades().obter(codigo_base)
+        if grade is not None:
+            return grade.buscar(esf, cil, add)
 
-        for item in combinacoes:
-            if item['esf'] == esf_busca and item['cil'] == cil_busca and item['add'] == add_busca:
-                return item
+        if os.path.exists(legado_path):
+            generica = LenteGenerica.query.filter_by(codigo_base=codigo_base).first()
+            if generica is not None:
+                try:
+                    converter_grade_legada(generica)
+                except ValueError:
+                    current_app.logger.warning("Grade legada %s não convertida: faixas diferentes da lente", codigo_base)
+                else:
+                    grade = cache_grades().obter(codigo_base)
+                    return grade.buscar(esf, cil, add)
+            return _buscar_na_grade_legada(legado_path, esf, cil, add)
     except Exception:
         return None
-    return None
\ No newline at end of file
+    return None
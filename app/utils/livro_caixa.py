@@ -0,0 +1,174 @@
+from decimal import Decimal
+from sqlalchemy import update, select, insert, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from ..extensions import db
+from ..models import Caixa, VendaPagamento, CaixaTotalForma, MovimentoCaixa
+
+# Livro de vendas do caixa: cada pagamento vira uma linha em
+# tb_venda_pagamento e, na mesma transação, soma no total da linha
+# (caixa, forma) de tb_caixa_total_forma. O fechamento lê só esses totais
+# (uma linha por forma), sem varrer as vendas do dia.
+#
+# Sangrias e suprimentos vão para tb_movimento_caixa, também só com INSERT.
+# Cada lançamento guarda o saldo acumulado (mc_saldo), então o saldo atual
+# é o do último lançamento do caixa, uma busca no índice (caixa, mc_reg).
+
+FORMAS_PAGAMENTO = {
+    'dinheiro': 'Dinheiro',
+    'cheque': 'Cheque',
+    'pix': 'PIX',
+    'credito': 'Cartão Crédito',
+    'debito': 'Cartão Débito',
+    'ticket': 'Ticket',
+    'convenio': 'Convênio',
+    'banco': 'Depósito Bancário',
+    'carne': 'Carnê',
+}
+# Formas em que o comprovante (CV/NSU) é obrigatório: conciliação com a operadora
+FORMAS_CARTAO = ('credito', 'debito')
+
+_totais = CaixaTotalForma.__table__
+
+
+def _somar(conexao, caixa_id, forma, valor):
+    """Soma `valor` ao total (caixa, forma); False se a linha ainda não existe."""
+    filtro = (_totais.c.ct_caixa_id == caixa_id) & (_totais.c.ct_forma == forma)
+    comando = update(_totais).where(filtro).values(
+        ct_total=_totais.c.ct_total + valor,
+        ct_quantidade=_totais.c.ct_quantidade + 1,
+    )
+    return conexao.execute(comando).rowcount > 0
+
+
+def _criar_total(conexao, caixa_id, forma):
+    valores = dict(ct_caixa_id=caixa_id, ct_forma=forma, ct_total=0, ct_quantidade=0)
+    if conexao.dialect.name == 'sqlite':
+        comando = sqlite_insert(_totais).values(**valores).on_conflict_do_nothing()
+    elif conexao.dialect.name == 'postgresql':
+        comando = postgresql_insert(_totais).values(**valores).on_conflict_do_nothing()
+    else:
+        comando = insert(_totais).values(**valores)
+    # Se outra venda do mesmo caixa criou a linha ao mesmo tempo, o INSERT é ignorado
+    conexao.execute(comando)
+
+
+def registrar_pagamento(caixa, forma, valor, cv_numero=None, usuario_id=None):
+    """
+    Lança um pagamento no livro do caixa e atualiza o total da forma.
+    Entra na transação corrente: o commit fica com quem chamou.
+    """
+    if forma not in FORMAS_PAGAMENTO:
+        raise ValueError(f"Forma de pagamento inválida: {forma}")
+    valor = Decimal(str(valor))
+    if not valor.is_finite():
+        raise ValueError(f"Valor de pagamento inválido: {valor}")
+    valor = valor.quantize(Decimal('0.01'))
+    db.session.add(VendaPagamento(
+        vp_caixa_id=caixa.cai_reg,
+        vp_forma=forma,
+        vp_valor=valor,
+        vp_cv_numero=cv_numero,
+        vp_usuario_id=usuario_id,
+    ))
+    conexao = db.session.connection()
+    if not _somar(conexao, caixa.cai_reg, forma, valor):
+        _criar_total(conexao, caixa.cai_reg, forma)
+        _somar(conexao, caixa.cai_reg, forma, valor)
+
+
+def totais_por_forma(caixa_id):
+    """{forma: total} do caixa, lido da tabela de totais."""
+    linhas = db.session.execute(
+        select(_totais.c.ct_forma, _totais.c.ct_total).where(_totais.c.ct_caixa_id == caixa_id)
+    )
+    return {forma: Decimal(str(total or 0)).quantize(Decimal('0.01')) for forma, total in linhas}
+
+
+def totais_dos_caixas(caixa_ids):
+    """{caixa_id: total vendido} de vários caixas numa consulta só."""
+    if not caixa_ids:
+        return {}
+    linhas = db.session.execute(
+        select(_totais.c.ct_caixa_id, func.sum(_totais.c.ct_total))
+        .where(_totais.c.ct_caixa_id.in_(caixa_ids))
+        .group_by(_totais.c.ct_caixa_id)
+    )
+    totais = {caixa_id: Decimal('0.00') for caixa_id in caixa_ids}
+    totais.update({caixa_id: Decimal(str(total or 0)).quantize(Decimal('0.01')) for caixa_id, total in linhas})
+    return totais
+
+
+def total_do_caixa(caixa_id):
+    """Total vendido no caixa (todas as formas)."""
+    return totais_dos_caixas([caixa_id])[caixa_id]
+
+
+
+TIPOS_MOVIMENTO = {'sangria': -1, 'suprimento': 1}
+
+
+def registrar_movimento(caixa, tipo, valor, observacao=None, usuario_id=None):
+    """
+    Lança uma sangria ou suprimento, com o saldo acumulado do caixa, e soma
+    em cai_retiradas/cai_suprimentos. Sem commit (fica com quem chamou).
+    """
+    if tipo not in TIPOS_MOVIMENTO:
+        raise ValueError(f"Tipo de movimento inválido: {tipo}")
+    valor = Decimal(str(valor))
+    if not valor.is_finite() or valor <= 0:
+        raise ValueError("O valor do movimento deve ser positivo.")
+    valor = valor.quantize(Decimal('0.01'))
+
+    # O UPDATE no caixa vem primeiro: trava a linha (Postgres) ou o banco
+    # (SQLite) até o commit, então dois lançamentos simultâneos no mesmo
+    # caixa não leem o mesmo saldo anterior.
+    coluna = Caixa.cai_retiradas if tipo == 'sangria' else Caixa.cai_suprimentos
+    db.session.execute(
+        update(Caixa.__table__).where(Caixa.cai_reg == caixa.cai_reg)
+        .values({coluna.key: func.coalesce(coluna, 0) + valor})
+    )
+    db.session.expire(caixa, [coluna.key])
+
+    movimento = MovimentoCaixa(
+        mc_caixa_id=caixa.cai_reg,
+        mc_tipo=tipo,
+        mc_valor=valor,
+        mc_saldo=saldo_movimentos(caixa.cai_reg) + TIPOS_MOVIMENTO[tipo] * valor,
+        mc_observacao=observacao,
+        mc_usuario_id=usuario_id,
+    )
+    db.session.add(movimento)
+    db.session.flush()
+    return movimento
+
+
+def saldo_movimentos(caixa_id):
+    """Suprimentos - sangrias do caixa até agora (saldo do último lançamento)."""
+    saldo = db.session.execute(
+        select(MovimentoCaixa.mc_saldo).where(MovimentoCaixa.mc_caixa_id == caixa_id)
+        .order_by(MovimentoCaixa.mc_reg.desc()).limit(1)
+    ).scalar()
+    return Decimal(str(saldo or 0)).quantize(Decimal('0.01'))
+
+
+def saldo_gaveta(caixa):
+    """Dinheiro que deveria estar na gaveta: fundo inicial + vendas em dinheiro + suprimentos - sangrias."""
+    dinheiro = totais_por_forma(caixa.cai_reg).get('dinheiro', Decimal('0.00'))
+    return Decimal(str(caixa.cai_saldo_inicial or 0)) + dinheiro + saldo_movimentos(caixa.cai_reg)
+
+
+def saldo_esperado(caixa, vendido=None):
+    """
+    O que o caixa deveria ter em todas as formas: fundo inicial + vendas +
+    suprimentos - sangrias. `vendido` (de totais_dos_caixas) evita reler o livro.
+    """
+    if vendido is None:
+        vendido = total_do_caixa(caixa.cai_reg)
+    return Decimal(str(caixa.cai_saldo_inicial or 0)) + vendido + saldo_movimentos(caixa.cai_reg)
+
+
+def movimentos_do_caixa(caixa_id):
+    """Extrato de sangrias e suprimentos do caixa, em ordem de lançamento."""
+    return (MovimentoCaixa.query.filter_by(mc_caixa_id=caixa_id)
+            .order_by(MovimentoCaixa.mc_reg).all())
@@ -0,0 +1,110 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# Leitura de NF-e em fluxo (iterparse): cada <det> é convertido e descartado
+# assim que termina, então a memória não cresce com o número de itens e o
+# arquivo enviado não precisa ser gravado em disco.
+
+NS = '{http://www.portalfiscal.inf.br/nfe}'
+
+
+def _nome(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def campos_do_prod(prod_elem):
+    """Lê os filhos de <prod> numa única passada: {tag sem namespace: texto}."""
+    return {_nome(filho.tag): (filho.text or '').strip() for filho in prod_elem}
+
+
+def _texto(elem, tag, padrao=''):
+    filho = elem.find(NS + tag)
+    return filho.text.strip() if filho is not None and filho.text else padrao
+
+
+def _item(det):
+    prod_elem = det.find(NS + 'prod')
+    if prod_elem is None:
+        return None  # pula itens sem elemento <prod>
+    campos = campos_do_prod(prod_elem)
+    codigo = campos.get('cProd', '')
+    return {
+        'codigo': codigo,
+        'descricao': campos.get('xProd', ''),
+        'quantidade': float(campos.get('qCom') or 0),
+        'preco_unitario': float(campos.get('vUnCom') or 0),
+        'ncm': campos.get('NCM', ''),
+        'codigo_fornecedor': codigo
+    }
+
+
+def ler_nfe(arquivo):
+    """
+    Lê uma NF-e (caminho ou objeto arquivo) em uma única passada.
+    Gera ('cabecalho', dict) uma vez, antes do primeiro item, e depois
+    ('item', dict) para cada <det>.
+    """
+    cabecalho = {
+        'nf_chave': '',
+        'nf_numero': '',
+        'serie': '1',
+        'data_emissao': datetime.now().strftime('%Y-%m-%d'),
+        'fornecedor_cnpj': '',
+        'fornecedor_nome': '',
+        'nota_fiscal': 'recebida',
+        'tipo_nota': 'nfe',
+        'natureza_operacao': '1.102'
+    }
+    cabecalho_enviado = False
+    pilha = []
+
+    try:
+        for evento, elem in ET.iterparse(arquivo, events=('start', 'end')):
+            if evento == 'start':
+                if elem.tag == NS + 'infNFe':
+                    # Id="NFe" + 44 dígitos da chave de acesso
+                    cabecalho['nf_chave'] = elem.get('Id', '').removeprefix('NFe')
+                pilha.append(elem)
+                continue
+
+            pilha.pop()
+            tag = elem.tag
+            if tag == NS + 'ide':
+                cabecalho['nf_numero'] = _texto(elem, 'nNF')
+                cabecalho['serie'] = _texto(elem, 'serie', '1')
+                emissao = _texto(elem, 'dhEmi') or _texto(elem, 'dEmi')
+                if emissao:
+                    cabecalho['data_emissao'] = emissao[:10]
+            elif tag == NS + 'emit':
+                cabecalho['fornecedor_cnpj'] = _texto(elem, 'CNPJ') or _texto(elem, 'CPF')
+                cabecalho['fornecedor_nome'] = _texto(elem, 'xNome')
+            elif tag == NS + 'det':
+                if not cabecalho_enviado:
+                    cabecalho_enviado = True
+                    yield 'cabecalho', cabecalho
+                item = _item(elem)
+                if item is not None:
+                    yield 'item', item
+            else:
+                continue
+
+            # Elemento já lido: solta da árvore para não acumular
+            if pilha:
+                pilha[-1].remove(elem)
+            elem.clear()
+    except ET.ParseError as e:
+        raise ValueError(f"Erro ao carregar XML: {e}") from e
+
+    if not cabecalho_enviado:
+        yield 'cabecalho', cabecalho
+
+
+def ler_nfe_completa(arquivo):
+    """Cabeçalho e lista de itens de uma NF-e, lida em fluxo."""
+    cabecalho, itens = {}, []
+    for tipo, dados in ler_nfe(arquivo):
+        if tipo == 'cabecalho':
+            cabecalho = dados
+        else:
+            itens.append(dados)
+    return cabecalho, itens
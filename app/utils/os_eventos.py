@@ -0,0 +1,141 @@
+import threading
+import time
+from flask import current_app, has_request_context
+from sqlalchemy import event, inspect, func, or_
+from sqlalchemy.orm import Session
+from ..extensions import db
+from ..models import OrdemServico, OrdemServicoEvento
+from .versoes import monitorar_modelos, versao_atual
+
+# Eventos de status das OS para os monitores (produção, OS liberadas...).
+# Toda mudança de OrdemServico.status feita pela sessão vira uma linha em
+# tb_os_evento no mesmo flush (commit junto, rollback junto).
+#
+# Os monitores acompanham por long-poll: a requisição volta assim que há
+# eventos depois do cursor do navegador, ou vazia depois de MONITOR_ESPERA
+# segundos. Enquanto espera, só consulta o banco quando a versão
+# 'os_eventos' muda. No máximo MONITOR_ESPERAS requisições por worker
+# ficam esperando; as demais voltam na hora, para não ocupar as threads
+# que atendem o PDV.
+#
+# Cursor: no Postgres os ids não são confirmados em ordem (o id N-1 pode
+# aparecer depois do N). O navegador guarda as lacunas (ids abaixo do
+# cursor que ainda não viu, até JANELA ids atrás) e as pede de novo em
+# cada consulta.
+
+VERSAO = 'os_eventos'
+LOTE = 200  # eventos por consulta
+JANELA = 100  # ids atrás do cursor que ainda podem aparecer
+monitorar_modelos(VERSAO, OrdemServico)
+
+def _usuario_atual():
+    if not has_request_context():
+        return None
+    from flask_login import current_user
+    return getattr(current_user, 'us_reg', None)
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_transicoes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, OrdemServico):
+            continue
+        if obj in session.new:
+            anterior, atual = None, obj.status or OrdemServico.status.default.arg
+        else:
+            historico = inspect(obj).attrs.status.history
+            if not historico.has_changes():
+                continue
+            anterior = historico.deleted[0] if historico.deleted else None
+            atual = obj.status
+            if anterior == atual:
+                continue
+        session.add(OrdemServicoEvento(
+            ev_os_numero=str(obj.os_numero),
+            ev_loja=obj.loja_id,
+            ev_status_anterior=anterior,
+            ev_status=atual,
+            ev_usuario_id=_usuario_atual(),
+        ))
+
+
+def ultimo_evento():
+    """Id do evento mais recente (cursor inicial de uma página de monitor)."""
+    return db.session.query(func.max(OrdemServicoEvento.ev_reg)).scalar() or 0
+
+
+def cursor_eventos():
+    """Cursor inicial de um monitor: {'ultimo': id, 'lacunas': ids ainda não confirmados abaixo dele}."""
+    ultimo = ultimo_evento()
+    existentes = {reg for (reg,) in db.session.query(OrdemServicoEvento.ev_reg)
+                  .filter(OrdemServicoEvento.ev_reg > ultimo - JANELA)}
+    lacunas = [i for i in range(max(1, ultimo - JANELA + 1), ultimo) if i not in existentes]
+    return {'ultimo': ultimo, 'lacunas': lacunas}
+
+
+def eventos_desde(ultimo_id, lacunas=(), limite=LOTE):
+    """Eventos com id maior que `ultimo_id` ou entre as `lacunas` (ids dentro da JANELA), em ordem."""
+    filtro = OrdemServicoEvento.ev_reg > ultimo_id
+    lacunas = [i for i in lacunas if ultimo_id - JANELA < i < ultimo_id][:JANELA]
+    if lacunas:
+        filtro = or_(filtro, OrdemServicoEvento.ev_reg.in_(lacunas))
+    return (OrdemServicoEvento.query.filter(filtro)
+            .order_by(OrdemServicoEvento.ev_reg)
+            .limit(limite).all())
+
+
+def como_dict(evento):
+    return {
+        'id': evento.ev_reg,
+        'os': evento.ev_os_numero,
+        'loja': evento.ev_loja,
+        'de': evento.ev_status_anterior,
+        'para': evento.ev_status,
+        'data': evento.ev_data.isoformat() if evento.ev_data else None,
+    }
+
+
+_esperas = None
+_lock_esperas = threading.Lock()
+
+
+def _vagas_de_espera():
+    global _esperas
+    if _esperas is None:
+        with _lock_esperas:
+            if _esperas is None:
+                _esperas = threading.BoundedSemaphore(current_app.config.get('MONITOR_ESPERAS', 2))
+    return _esperas
+
+
+def aguardar_eventos(ultimo_id, lacunas=()):
+    """
+    Eventos novos para o monitor. Sem nenhum, espera até MONITOR_ESPERA
+    segundos (padrão 10) que apareçam. Retorna (eventos, esperou): esperou
+    False quando todas as vagas de espera do worker estavam ocupadas e a
+    resposta voltou na hora (o navegador deve aguardar antes de repetir).
+    """
+    versao = versao_atual(VERSAO)  # antes da consulta: um commit no meio muda a versão
+    eventos = eventos_desde(ultimo_id, lacunas)
+    if eventos:
+        return eventos, True
+    vagas = _vagas_de_espera()
+    if not vagas.acquire(blocking=False):
+        return [], False
+    try:
+        intervalo = current_app.config.get('MONITOR_INTERVALO', 0.5)
+        fim = time.monotonic() + current_app.config.get('MONITOR_ESPERA', 10)
+        while time.monotonic() < fim:
+            # Devolve a conexão ao pool enquanto espera
+            db.session.close()
+            time.sleep(intervalo)
+            atual = versao_atual(VERSAO)
+            if atual != versao:
+                versao = atual
+                eventos = eventos_desde(ultimo_id, lacunas)
+                if eventos:
+                    return eventos, True
+        return [], True
+    finally:
+        vagas.release()
+        db.session.close()
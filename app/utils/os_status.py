@@ -0,0 +1,135 @@
+from collections import Counter
+from sqlalchemy import event, update, select, insert, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Session
+from ..extensions import db
+from ..models import OrdemServico, OrdemServicoEvento, ContagemStatusOS
+from . import os_eventos  # noqa: F401  (registra o log de transições em tb_os_evento)
+
+# Serviço de status das OS. As rotas mudam o status por mudar_status, que
+# valida a transição. Cada mudança (por aqui ou não) gera um evento em
+# tb_os_evento (utils/os_eventos.py) e, no mesmo flush, atualiza
+# tb_os_contagem_status: -1 no status anterior e +1 no novo, por loja.
+# Os painéis leem essa tabela (uma linha por loja e status) em vez de um
+# GROUP BY em ordem_servico.
+
+CANCELADA = 'cancelada'
+
+# status atual -> status seguintes permitidos (cancelar vale de qualquer status aberto)
+TRANSICOES = {
+    'aberta': {'venda_concluida'},
+    'venda_concluida': {'liberado_compra'},
+    'garantia': {'liberado_compra'},
+    'liberado_compra': {'aguardando_lentes'},
+    'aguardando_lentes': {'lente_recebida'},
+    'lente_recebida': {'servico_enviado_montagem', 'servico_aguardando_armação', 'servico_devolvido_compra'},
+    'servico_devolvido_compra': {'aguardando_lentes'},
+    'servico_aguardando_armação': {'armação_enviada_montagem', 'servico_enviado_montagem'},
+    'servico_enviado_montagem': {'armação_enviada_montagem', 'servico_montado_conferido'},
+    'armação_enviada_montagem': {'servico_montado_conferido', 'devolucao_quebra_armação'},
+    'reposicao_recebida': {'servico_montado_conferido'},
+    'devolucao_quebra_armação': {'servico_aguardando_armação'},
+    'servico_montado_conferido': {'servico_pronto_entrega'},
+    'servico_pronto_entrega': set(),
+    CANCELADA: set(),
+}
+
+
+class TransicaoInvalida(ValueError):
+    pass
+
+
+def transicao_permitida(atual, novo):
+    if novo == CANCELADA:
+        return atual != CANCELADA
+    return novo in TRANSICOES.get(atual, set())
+
+
+def mudar_status(ordem, novo):
+    """
+    Muda o status da OS, se a transição for permitida (TransicaoInvalida se
+    não for). O evento e a contagem entram no próximo flush; o commit fica
+    com quem chamou.
+    """
+    if not transicao_permitida(ordem.status, novo):
+        raise TransicaoInvalida(f"OS {ordem.os_numero}: transição de '{ordem.status}' para '{novo}' não permitida.")
+    ordem.status = novo
+
+
+# --- Contagem por (loja, status) ---
+
+_contagens = ContagemStatusOS.__table__
+
+
+def _somar(conexao, loja, status, delta):
+    filtro = (_contagens.c.cs_loja == loja) & (_contagens.c.cs_status == status)
+    comando = update(_contagens).where(filtro).values(cs_quantidade=_contagens.c.cs_quantidade + delta)
+    return conexao.execute(comando).rowcount > 0
+
+
+def _criar_contagem(conexao, loja, status):
+    valores = dict(cs_loja=loja, cs_status=status, cs_quantidade=0)
+    if conexao.dialect.name == 'sqlite':
+        comando = sqlite_insert(_contagens).values(**valores).on_conflict_do_nothing()
+    elif conexao.dialect.name == 'postgresql':
+        comando = postgresql_insert(_contagens).values(**valores).on_conflict_do_nothing()
+    else:
+        comando = insert(_contagens).values(**valores)
+    conexao.execute(comando)
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_contagens(session, flush_context):
+    # Em after_flush, session.new/deleted ainda mostram o que acabou de ser gravado
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, OrdemServicoEvento):
+            if obj.ev_status_anterior is not None:
+                deltas[(obj.ev_loja, obj.ev_status_anterior)] -= 1
+            deltas[(obj.ev_loja, obj.ev_status)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, OrdemServico) and obj.status:
+            deltas[(obj.loja_id, obj.status)] -= 1
+    if not deltas:
+        return
+
+    conexao = session.connection()
+    # Ordem fixa das chaves: duas transações nunca travam as mesmas linhas em ordem inversa
+    for (loja, status), delta in sorted(deltas.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+        if delta and not _somar(conexao, loja, status, delta):
+            _criar_contagem(conexao, loja, status)
+            _somar(conexao, loja, status, delta)
+
+
+def reconstruir_contagens():
+    """Recalcula tb_os_contagem_status a partir de ordem_servico (carga inicial). Sem commit."""
+    db.session.execute(_contagens.delete())
+    linhas = db.session.execute(
+        select(OrdemServico.loja_id, OrdemServico.status, func.count())
+        .where(OrdemServico.status.isnot(None))
+        .group_by(OrdemServico.loja_id, OrdemServico.status)
+    ).all()
+    if linhas:
+        db.session.execute(insert(_contagens), [
+            dict(cs_loja=loja, cs_status=status, cs_quantidade=quantidade) for loja, status, quantidade in linhas
+        ])
+
+
+def contagens_por_status(loja=None):
+    """{status: quantidade} (da loja, ou de todas somadas), lido da tabela de contagens."""
+    query = select(_contagens.c.cs_status, func.sum(_contagens.c.cs_quantidade))
+    if loja:
+        query = query.where(_contagens.c.cs_loja == loja)
+    linhas = db.session.execute(query.group_by(_contagens.c.cs_status))
+    return {status: int(quantidade) for status, quantidade in linhas if quantidade}
+
+
+def contagens_por_loja():
+    """{loja: {status: quantidade}} de todas as lojas."""
+    resultado = {}
+    for loja, status, quantidade in db.session.execute(
+            select(_contagens.c.cs_loja, _contagens.c.cs_status, _contagens.c.cs_quantidade)
+            .where(_contagens.c.cs_quantidade != 0)):
+        resultado.setdefault(loja, {})[status] = quantidade
+    return resultado
@@ -0,0 +1,119 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app, request
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+# Paginação por chave (keyset/seek): em vez de OFFSET, cada página continua
+# a partir da chave da última linha da anterior, levada num token opaco
+# (?cursor=...). O custo por página é o de uma busca no índice da ordenação,
+# não importa quantas linhas já ficaram para trás.
+
+Pagina = namedtuple('Pagina', 'itens proximo tamanho primeira')
+# itens: objetos da página; proximo: token da próxima página (None na última);
+# tamanho: itens por página; primeira: True se não veio de um cursor
+
+PAGINA_PADRAO = 50
+PAGINA_MAXIMA = 200
+
+
+def _codificar(valores):
+    serializaveis = [v.isoformat() if isinstance(v, (date, datetime)) else
+                     str(v) if isinstance(v, Decimal) else v for v in valores]
+    texto = json.dumps(serializaveis, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar(token, colunas):
+    """Valores da chave do token, convertidos para o tipo de cada coluna (None se inválido)."""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(valores, list) or len(valores) != len(colunas):
+            return None
+        convertidos = []
+        for valor, (coluna, _) in zip(valores, colunas):
+            tipo = coluna.type.python_type
+            if valor is None or isinstance(valor, tipo):
+                convertidos.append(valor)
+            elif tipo is datetime:
+                convertidos.append(datetime.fromisoformat(valor))
+            elif tipo is date:
+                convertidos.append(date.fromisoformat(valor))
+            else:
+                convertidos.append(tipo(valor))
+        return convertidos
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def _depois_de(colunas, valores):
+    """Condição "linha vem depois da chave `valores`" na ordem de `colunas` (nulos por último)."""
+    (coluna, decrescente), valor = colunas[0], valores[0]
+    if len(colunas) == 1:
+        if valor is None:
+            return False
+        return coluna < valor if decrescente else coluna > valor
+
+    resto = _depois_de(colunas[1:], valores[1:])
+    if valor is None:
+        return and_(coluna.is_(None), resto)
+    depois = coluna < valor if decrescente else coluna > valor
+    if coluna.nullable:
+        depois = or_(depois, coluna.is_(None))
+    return or_(depois, and_(coluna == valor, resto))
+
+
+def _condicao(colunas, valores):
+    direcoes = {decrescente for _, decrescente in colunas}
+    if len(direcoes) == 1 and not any(c.nullable for c, _ in colunas):
+        # Mesma direção e sem nulos: comparação de tupla, que o índice resolve com uma busca
+        chave = tuple_(*(c for c, _ in colunas))
+        return chave < tuple_(*valores) if direcoes == {True} else chave > tuple_(*valores)
+    return _depois_de(colunas, valores)
+
+
+def _ordenacao(colunas):
+    for coluna, decrescente in colunas:
+        ordem = coluna.desc() if decrescente else coluna.asc()
+        yield ordem.nulls_last() if coluna.nullable else ordem
+
+
+def _coluna_e_direcao(item):
+    if isinstance(item, UnaryExpression):
+        return item.element, item.modifier is operators.desc_op
+    return item.expression, False
+
+
+def paginar(query, *ordem, cursor=None, tamanho=None):
+    """
+    Página de `query` ordenada por `ordem`: colunas (ex: Caixa.cai_data.desc(),
+    Caixa.cai_reg.desc()). A última coluna deve ser única (a chave primária),
+    para a ordem ser estável. `cursor` e `tamanho` vêm de request.args
+    ('cursor' e 'por_pagina') quando não informados; o tamanho é limitado a
+    PAGINACAO_MAXIMA (config) itens.
+    """
+    colunas = [_coluna_e_direcao(item) for item in ordem]
+
+    maximo = current_app.config.get('PAGINACAO_MAXIMA', PAGINA_MAXIMA)
+    if tamanho is None:
+        tamanho = request.args.get('por_pagina', type=int) or current_app.config.get('PAGINACAO_PADRAO', PAGINA_PADRAO)
+    tamanho = max(1, min(tamanho, maximo))
+    if cursor is None:
+        cursor = request.args.get('cursor')
+
+    valores = _decodificar(cursor, colunas) if cursor else None
+    if valores is not None:
+        query = query.filter(_condicao(colunas, valores))
+
+    # Uma linha a mais indica se existe próxima página
+    linhas = query.order_by(None).order_by(*_ordenacao(colunas)).limit(tamanho + 1).all()
+    proximo = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        ultima = linhas[-1]
+        proximo = _codificar([getattr(ultima, coluna.key) for coluna, _ in colunas])
+    return Pagina(linhas, proximo, tamanho, valores is None)
@@ -0,0 +1,53 @@
+from collections import namedtuple
+from flask import g
+from ..extensions import db
+from ..models import Ambiente, Usuario
+from ..models.usuario import usuario_ambiente
+from .versoes import versao_atual, monitorar_modelos
+
+# Snapshot imutável dos ambientes de cada usuário, guardado por worker.
+# Qualquer commit que altere Ambiente ou Usuario (inclusive a lista
+# ambientes_permitidos, em admin.listar_usuarios, ou toggle_ambiente_ativo)
+# avança a versão 'permissoes' e os snapshots são refeitos no próximo uso.
+monitorar_modelos('permissoes', Ambiente, Usuario)
+
+EMAILS_MASTER = frozenset({'cruz@devsoft', 'master@system'})
+
+AmbientePermitido = namedtuple('AmbientePermitido', 'amb_id amb_nome')
+Permissoes = namedtuple('Permissoes', 'nomes ambientes')  # frozenset de nomes, tupla de AmbientePermitido
+
+_snapshots = {}  # us_reg (ou 'master') -> (versão, Permissoes)
+
+
+def eh_master(usuario):
+    return getattr(usuario, 'us_email', None) in EMAILS_MASTER
+
+
+def _carregar(chave):
+    consulta = db.session.query(Ambiente.amb_id, Ambiente.amb_nome)
+    if chave == 'master':
+        # Master vê todos os ambientes ativos
+        linhas = consulta.filter(Ambiente.amb_ativo == True).all()
+    else:
+        linhas = consulta.join(usuario_ambiente, usuario_ambiente.c.ambiente_id == Ambiente.amb_id) \
+            .filter(usuario_ambiente.c.usuario_id == chave).all()
+    ambientes = tuple(AmbientePermitido(*linha) for linha in linhas)
+    return Permissoes(frozenset(a.amb_nome for a in ambientes), ambientes)
+
+
+def permissoes_do_usuario(usuario):
+    """Permissões do usuário logado, sem consultar o banco quando já em cache."""
+    if 'permissoes' in g:
+        return g.permissoes
+
+    chave = 'master' if eh_master(usuario) else usuario.us_reg
+    versao = versao_atual('permissoes')
+    em_cache = _snapshots.get(chave)
+    if em_cache and em_cache[0] == versao:
+        permissoes = em_cache[1]
+    else:
+        permissoes = _carregar(chave)
+        _snapshots[chave] = (versao, permissoes)
+
+    g.permissoes = permissoes
+    return permissoes
@@ -0,0 +1,80 @@
+import threading
+from flask import current_app
+from sqlalchemy import update, select, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from ..extensions import db
+from ..models import Sequencia
+
+# Números são alocados com um UPDATE atômico na linha (seq_nome, seq_loja):
+# o banco serializa o incremento (lock de escrita no SQLite, lock de linha
+# no Postgres), então workers concorrentes nunca recebem o mesmo número.
+
+_tabela = Sequencia.__table__
+_blocos = {}  # (nome, loja) -> [próximo, último] reservados por este worker
+_lock_blocos = threading.Lock()
+
+
+def _incrementar(conexao, nome, loja, quantidade):
+    """Soma `quantidade` ao contador e retorna o novo valor (None se não existe)."""
+    filtro = (_tabela.c.seq_nome == nome) & (_tabela.c.seq_loja == loja)
+    comando = update(_tabela).where(filtro).values(seq_valor=_tabela.c.seq_valor + quantidade)
+    if conexao.dialect.update_returning:
+        return conexao.execute(comando.returning(_tabela.c.seq_valor)).scalar()
+    # SQLite < 3.35: o UPDATE já segura o lock de escrita até o fim da transação
+    if conexao.execute(comando).rowcount == 0:
+        return None
+    return conexao.execute(select(_tabela.c.seq_valor).where(filtro)).scalar()
+
+
+def _criar_sequencia(conexao, nome, loja, inicial):
+    """Cria o contador partindo do maior número já usado (calculado por `inicial`)."""
+    valores = dict(seq_nome=nome, seq_loja=loja, seq_valor=(inicial() if inicial else 0) or 0)
+    if conexao.dialect.name == 'sqlite':
+        comando = sqlite_insert(_tabela).values(**valores).on_conflict_do_nothing()
+    elif conexao.dialect.name == 'postgresql':
+        comando = postgresql_insert(_tabela).values(**valores).on_conflict_do_nothing()
+    else:
+        comando = insert(_tabela).values(**valores)
+    # Se outro worker criou a sequência ao mesmo tempo, o INSERT é ignorado
+    conexao.execute(comando)
+
+
+def _alocar(conexao, nome, loja, quantidade, inicial):
+    valor = _incrementar(conexao, nome, loja, quantidade)
+    if valor is None:
+        _criar_sequencia(conexao, nome, loja, inicial)
+        valor = _incrementar(conexao, nome, loja, quantidade)
+    return valor
+
+
+def proximo_numero(nome, loja='00', inicial=None, bloco=None):
+    """
+    Retorna o próximo número da sequência (nome, loja).
+
+    `inicial` é uma função que devolve o maior número já existente; só é
+    chamada na primeira vez, quando o contador ainda não existe no banco.
+
+    Sem bloco, o incremento entra na transação corrente: se ela sofrer
+    rollback, o número volta a ficar livre. Com bloco > 1 (ou configurado em
+    SEQUENCIA_BLOCOS[nome]), o worker reserva vários números de uma vez em
+    transação própria e os entrega da memória; números não usados até o fim
+    do processo são perdidos. No SQLite, use bloco apenas antes de escrever
+    na sessão, pois a reserva abre uma segunda conexão de escrita.
+    """
+    if bloco is None:
+        bloco = current_app.config.get('SEQUENCIA_BLOCOS', {}).get(nome, 1)
+
+    if bloco <= 1:
+        return _alocar(db.session.connection(), nome, loja, 1, inicial)
+
+    chave = (nome, loja)
+    with _lock_blocos:
+        reservado = _blocos.get(chave)
+        if not reservado or reservado[0] > reservado[1]:
+            with db.engine.begin() as conexao:
+                ultimo = _alocar(conexao, nome, loja, bloco, inicial)
+            reservado = _blocos[chave] = [ultimo - bloco + 1, ultimo]
+        numero = reservado[0]
+        reservado[0] += 1
+    return numero
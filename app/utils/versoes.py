@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event, update, select, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Session
+from ..extensions import db
+from ..models import Versao
+
+# Versões dos caches em memória (por worker): cada cache compara a versão
+# que carregou com a atual a cada uso e recarrega quando ela muda.
+#
+# SQLite (o banco é um arquivo local, então é sempre um host só): a versão
+# é o mtime de instance/versoes/<nome>, um os.stat sem consulta ao banco.
+#
+# Outros bancos (Postgres compartilhado por vários hosts): a versão é um
+# contador em tb_versao, incrementado na própria transação que alterou os
+# modelos (antes do commit) e lido no máximo a cada VERSOES_TTL segundos
+# (padrão 1) por worker. Um arquivo local não serviria: os outros hosts
+# nunca veriam a alteração.
+
+_modelos_monitorados = {}  # nome da versão -> tupla de modelos
+_versoes = Versao.__table__
+_lidas = {}  # nome -> (instante da leitura, versão), só para o banco
+_lock_lidas = threading.Lock()
+
+
+def _em_arquivo(engine=None):
+    return (engine or db.engine).dialect.name == 'sqlite'
+
+
+def _caminho_versao(nome):
+    return os.path.join(current_app.instance_path, 'versoes', nome)
+
+
+def versao_atual(nome):
+    """Versão atual de `nome` (0 se nunca foi marcada)."""
+    if _em_arquivo():
+        try:
+            return os.stat(_caminho_versao(nome)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    agora = time.monotonic()
+    lida = _lidas.get(nome)
+    if lida and agora - lida[0] < current_app.config.get('VERSOES_TTL', 1.0):
+        return lida[1]
+    valor = db.session.execute(select(_versoes.c.ver_valor).where(_versoes.c.ver_nome == nome)).scalar() or 0
+    with _lock_lidas:
+        _lidas[nome] = (agora, valor)
+    return valor
+
+
+def _incrementar(conexao, nome):
+    comando = update(_versoes).where(_versoes.c.ver_nome == nome).values(ver_valor=_versoes.c.ver_valor + 1)
+    if conexao.execute(comando).rowcount:
+        return
+    valores = dict(ver_nome=nome, ver_valor=0)
+    if conexao.dialect.name == 'sqlite':
+        comando_insert = sqlite_insert(_versoes).values(**valores).on_conflict_do_nothing()
+    elif conexao.dialect.name == 'postgresql':
+        comando_insert = postgresql_insert(_versoes).values(**valores).on_conflict_do_nothing()
+    else:
+        comando_insert = insert(_versoes).values(**valores)
+    # Se outra transação criou a linha ao mesmo tempo, o INSERT é ignorado
+    conexao.execute(comando_insert)
+    conexao.execute(comando)
+
+
+def _marcar_arquivo(nome):
+    caminho = _caminho_versao(nome)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    anterior = versao_atual(nome)
+    agora = max(time.time_ns(), anterior + 1)  # sempre avança, mesmo com relógio grosseiro
+    with open(caminho, 'a'):
+        pass
+    os.utime(caminho, ns=(agora, agora))
+
+
+def marcar_alteracao(nome):
+    """Avança a versão de `nome`, invalidando os caches de todos os workers."""
+    if _em_arquivo():
+        _marcar_arquivo(nome)
+        return
+    with db.engine.begin() as conexao:
+        _incrementar(conexao, nome)
+    _lidas.pop(nome, None)
+
+
+def monitorar_modelos(nome, *modelos):
+    """Marca `nome` como alterado a cada commit que inserir, alterar ou excluir um dos modelos."""
+    _modelos_monitorados[nome] = _modelos_monitorados.get(nome, ()) + modelos
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_alteracoes(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        for nome, modelos in _modelos_monitorados.items():
+            if isinstance(obj, modelos):
+                session.info.setdefault('versoes_alteradas', set()).add(nome)
+
+
+@event.listens_for(Session, 'before_commit')
+def _gravar_versoes_no_banco(session):
+    if _em_arquivo(session.get_bind()):
+        return
+    # O commit ainda vai dar flush no que estiver pendente: faz isso antes, para coletar tudo
+    session.flush()
+    nomes = sorted(session.info.get('versoes_alteradas', ()))
+    # Em ordem: duas transações nunca travam as mesmas linhas em ordem inversa
+    for nome in nomes:
+        _incrementar(session.connection(), nome)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_alteracoes(session):
+    nomes = session.info.pop('versoes_alteradas', ())
+    if _em_arquivo(session.get_bind()):
+        for nome in nomes:
+            _marcar_arquivo(nome)
+    else:
+        for nome in nomes:
+            _lidas.pop(nome, None)  # este worker vê a alteração na hora; os outros em até VERSOES_TTL
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop('versoes_alteradas', None)
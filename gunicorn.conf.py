@@ -0,0 +1,18 @@
+# Configuração do gunicorn (lida automaticamente quando iniciado na raiz do projeto)
+# Ex: gunicorn run:app
+import os
+
+# O pool do banco (app/utils/banco.py) divide DB_MAX_CONEXOES por este mesmo número
+# e reserva uma conexão por thread (GUNICORN_THREADS, abaixo)
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Threads por worker (gthread): requisições simultâneas por worker. Os
+# monitores de OS esperam eventos em long-poll (app/utils/os_eventos.py),
+# mas no máximo MONITOR_ESPERAS (padrão 2) threads ficam presas assim
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    """Cria esquema e registros iniciais uma vez, no master, antes do fork dos workers."""
+    from run import init_db_once
+    init_db_once()
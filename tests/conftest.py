@@ -0,0 +1,35 @@
+import pytest
+from app import create_app
+from app.extensions import db
+from app.utils.inicializacao import inicializar_banco
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Aplicação com um banco SQLite novo por teste (fora de instance/)."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'devsoft.db'}")
+    aplicacao = create_app()
+    aplicacao.config['TESTING'] = True
+    # Versões dos caches (utils/versoes.py) também ficam no diretório do teste
+    aplicacao.instance_path = str(tmp_path)
+    with aplicacao.app_context():
+        inicializar_banco()
+        yield aplicacao
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def usuario(app):
+    """Usuário master criado por inicializar_banco."""
+    from app.models import Usuario
+    return Usuario.query.first()
+
+
+@pytest.fixture
+def cliente(app, usuario):
+    """Test client já autenticado como o usuário master."""
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(usuario.us_reg)
+    return cliente
@@ -0,0 +1,103 @@
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from app.extensions import db
+from app.models import Caixa, ResumoDiaLoja
+from app.utils import fechamento_dia
+from app.utils.fechamento_dia import consolidar_loja, consolidar_dia
+from app.utils.livro_caixa import registrar_pagamento, registrar_movimento
+
+DIA = date(2026, 3, 10)
+
+
+def _caixa(loja, saldo_inicial, **campos):
+    caixa = Caixa(cai_data=DIA, cai_loja=loja, cai_status='aberto', cai_saldo_inicial=Decimal(saldo_inicial), **campos)
+    db.session.add(caixa)
+    db.session.flush()
+    return caixa
+
+
+@pytest.fixture
+def dia_da_loja(app):
+    # Conferido no fechamento: 50 + 300 (dinheiro) + 80 (PIX) - 100 (sangria) = 330,
+    # e 150 em dinheiro retirados na conferência
+    conferido = _caixa('01', '50.00')
+    registrar_pagamento(conferido, 'dinheiro', '300.00')
+    registrar_pagamento(conferido, 'pix', '80.00')
+    registrar_movimento(conferido, 'sangria', '100.00')
+    conferido.cai_status = 'encerrado'
+    conferido.cai_total_conferencia = Decimal('330.00')
+    conferido.cai_total_sistema = Decimal('330.00')
+    conferido.cai_falta = Decimal('0.00')
+    conferido.cai_dinheiro_retrada = Decimal('150.00')
+
+    # Ainda aberto: 20 + 100 (dinheiro) - 30 (sangria) + 10 (suprimento) = 100
+    aberto = _caixa('01', '20.00')
+    registrar_pagamento(aberto, 'dinheiro', '100.00')
+    registrar_movimento(aberto, 'sangria', '30.00')
+    registrar_movimento(aberto, 'suprimento', '10.00')
+
+    outra_loja = _caixa('02', '0.00')
+    registrar_pagamento(outra_loja, 'dinheiro', '999.00')
+    db.session.commit()
+    return conferido, aberto, outra_loja
+
+
+def test_consolidar_loja_totaliza_pelo_livro(dia_da_loja):
+    conferido, aberto, outra_loja = dia_da_loja
+
+    resultado = consolidar_loja('01', DIA)
+
+    assert resultado == {'loja': '01', 'ok': True, 'caixas': 2, 'vendas': Decimal('480.00'), 'erro': None}
+    assert (conferido.cai_status, conferido.cai_saldo_final) == ('finalizado_dia', Decimal('180.00'))
+    assert (aberto.cai_status, aberto.cai_saldo_final) == ('finalizado_dia', Decimal('100.00'))
+    assert aberto.cai_total_sistema == Decimal('100.00')
+    assert outra_loja.cai_status == 'aberto'
+
+    resumo = db.session.get(ResumoDiaLoja, (DIA, '01'))
+    assert resumo.rd_caixas == 2
+    assert resumo.rd_saldo_inicial == Decimal('70.00')
+    assert resumo.rd_vendas == Decimal('480.00')
+    assert resumo.rd_conferencia == Decimal('330.00')
+    assert resumo.rd_falta == Decimal('0.00')
+    assert resumo.rd_retiradas == Decimal('130.00')  # só as sangrias do livro
+    assert resumo.rd_suprimentos == Decimal('10.00')
+    assert resumo.rd_saldo_final == Decimal('280.00')
+    assert resumo.rd_vendas_forma == {'dinheiro': '400.00', 'pix': '80.00'}
+
+
+def test_consolidar_de_novo_nao_muda_os_totais(dia_da_loja):
+    consolidar_loja('01', DIA)
+    primeiro = db.session.get(ResumoDiaLoja, (DIA, '01'))
+    totais = (primeiro.rd_vendas, primeiro.rd_retiradas, primeiro.rd_saldo_final)
+
+    resultado = consolidar_loja('01', DIA)
+
+    assert resultado['caixas'] == 0  # nada mais pendente
+    db.session.expire_all()
+    resumo = db.session.get(ResumoDiaLoja, (DIA, '01'))
+    assert (resumo.rd_vendas, resumo.rd_retiradas, resumo.rd_saldo_final) == totais
+
+
+def test_consolidar_dia_fecha_cada_loja(dia_da_loja):
+    resultados = consolidar_dia(DIA)
+
+    assert [(r['loja'], r['ok'], r['vendas']) for r in resultados] == [
+        ('01', True, Decimal('480.00')), ('02', True, Decimal('999.00'))]
+    assert ResumoDiaLoja.query.filter_by(rd_data=DIA).count() == 2
+
+
+def test_threads_usam_no_maximo_metade_do_pool(app, monkeypatch):
+    assert fechamento_dia._threads(10) == 1  # SQLite: um escritor por vez
+
+    engine = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), pool=SimpleNamespace(size=lambda: 8))
+    monkeypatch.setattr(fechamento_dia, 'db', SimpleNamespace(engine=engine))
+    assert fechamento_dia._threads(10) == 4
+    assert fechamento_dia._threads(3) == 3
+    engine.pool.size = lambda: 1
+    assert fechamento_dia._threads(10) == 1
+
+    app.config['FECHAMENTO_DIA_THREADS'] = 6
+    assert fechamento_dia._threads(10) == 6
@@ -0,0 +1,163 @@
+import gzip
+import json
+import os
+import random
+import threading
+from decimal import Decimal
+
+import pytest
+from app.extensions import db
+from app.models import LenteGenerica
+from app.utils import lentes
+
+
+@pytest.fixture
+def grades_dir(app, tmp_path, monkeypatch):
+    diretorio = tmp_path / 'grades'
+    monkeypatch.setattr(lentes, '_diretorio_grades', lambda: str(diretorio))
+    monkeypatch.setattr(lentes, '_cache_grades', None)
+    return diretorio
+
+
+@pytest.fixture
+def generica(grades_dir):
+    lente = LenteGenerica(
+        codigo_base='0000001', descricao='Teste', tipo_lente='MF', id_refracao='1.56',
+        preco_base=Decimal('150.00'), antirreflexo='ar',
+        esf_min=Decimal('-1.00'), esf_max=Decimal('1.00'), esf_step=Decimal('0.25'),
+        cil_min=Decimal('0.00'), cil_max=Decimal('-1.00'), cil_step=Decimal('0.25'),
+        add_min=Decimal('1.00'), add_max=Decimal('1.50'), add_step=Decimal('0.25'),
+    )
+    db.session.add(lente)
+    db.session.commit()
+    return lente
+
+
+def _gravar_legada(generica, combinacoes):
+    os.makedirs(lentes._diretorio_grades(), exist_ok=True)
+    with gzip.open(lentes._caminho_grade_legada(generica.codigo_base), 'wt', encoding='utf-8') as f:
+        json.dump(combinacoes, f)
+
+
+def test_grade_binaria_devolve_as_mesmas_combinacoes(generica):
+    combinacoes = lentes.gerar_combinacoes_lente(generica)
+    lentes.salvar_grade_compactada(generica, combinacoes)
+
+    with lentes.GradeMapeada(lentes._caminho_grade(generica.codigo_base)) as grade:
+        assert grade.eixos == lentes.eixos_da_grade(generica)
+        assert len(grade) == len(combinacoes) == 9 * 5 * 3
+        assert grade.proxima_sequencia == len(combinacoes) + 1
+        assert grade.n_removidas == 0
+        assert [grade.item(i) for i in range(len(grade))] == list(combinacoes)
+
+
+def test_busca_na_grade_pela_posicao(generica):
+    combinacoes = lentes.gerar_combinacoes_lente(generica)
+    lentes.salvar_grade_compactada(generica, combinacoes)
+
+    esperado = next(c for c in combinacoes if (c['esf'], c['cil'], c['add']) == ('-0.50', '-0.25', '1.25'))
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, '-0.50', '-0.25', '1.25') == esperado
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, -0.5, -0.25, 1.25) == esperado
+    # fora do passo e fora da faixa
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, '-0.30', '-0.25', '1.25') is None
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, '2.00', '-0.25', '1.25') is None
+
+
+def test_grade_legada_convertida_na_primeira_leitura(generica):
+    combinacoes = list(lentes.gerar_combinacoes_lente(generica))
+    random.Random(1).shuffle(combinacoes)  # ordem do JSON não precisa ser a da grade
+    _gravar_legada(generica, combinacoes)
+
+    item = lentes.buscar_combinacao_na_grade(generica.codigo_base, '0.75', '-1.00', '1.50')
+
+    assert os.path.exists(lentes._caminho_grade(generica.codigo_base))
+    assert item == next(c for c in combinacoes if (c['esf'], c['cil'], c['add']) == ('0.75', '-1.00', '1.50'))
+    for c in combinacoes:
+        assert lentes.buscar_combinacao_na_grade(generica.codigo_base, c['esf'], c['cil'], c['add'])['codigo'] == c['codigo']
+
+
+def test_grade_legada_incompativel_continua_em_json(generica):
+    combinacoes = list(lentes.gerar_combinacoes_lente(generica))[1:]  # falta uma célula
+    _gravar_legada(generica, combinacoes)
+
+    item = lentes.buscar_combinacao_na_grade(generica.codigo_base, combinacoes[0]['esf'],
+                                             combinacoes[0]['cil'], combinacoes[0]['add'])
+
+    assert item == combinacoes[0]
+    assert not os.path.exists(lentes._caminho_grade(generica.codigo_base))
+
+
+def test_gravacoes_simultaneas_da_mesma_grade(app, generica, grades_dir):
+    erros = []
+
+    def gravar():
+        with app.app_context():
+            try:
+                lentes.salvar_grade_compactada(generica, lentes.gerar_combinacoes_lente(generica))
+            except Exception as e:
+                erros.append(e)
+
+    threads = [threading.Thread(target=gravar) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not erros
+    assert sorted(os.listdir(grades_dir)) == [f"{generica.codigo_base}.grd"]
+    with lentes.GradeMapeada(lentes._caminho_grade(generica.codigo_base)) as grade:
+        assert len(grade) == 9 * 5 * 3
+
+
+def _codigos(generica):
+    grade = lentes.cache_grades().obter(generica.codigo_base)
+    return {(c['esf'], c['cil'], c['add']): c['codigo'] for c in (grade.item(i) for i in range(len(grade)))}
+
+
+def test_regeneracao_incremental_preserva_codigos_e_reserva_removidas(generica):
+    lentes.salvar_grade_compactada(generica, lentes.gerar_combinacoes_lente(generica))
+    originais = _codigos(generica)
+
+    generica.esf_max = Decimal('0.50')  # saem esf 0.75 e 1.00
+    resumo = lentes.regenerar_grade_incremental(generica)
+
+    assert resumo == {'mantidas': 7 * 5 * 3, 'novas': 0, 'removidas': 2 * 5 * 3}
+    atuais = _codigos(generica)
+    assert atuais == {chave: codigo for chave, codigo in originais.items() if chave[0] not in ('0.75', '1.00')}
+    grade = lentes.cache_grades().obter(generica.codigo_base)
+    assert grade.n_removidas == 2 * 5 * 3
+    assert grade.proxima_sequencia == len(originais) + 1
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, '1.00', '0.00', '1.00') is None
+
+
+def test_regeneracao_incremental_reaproveita_sequencia_de_celula_que_volta(generica):
+    lentes.salvar_grade_compactada(generica, lentes.gerar_combinacoes_lente(generica))
+    originais = _codigos(generica)
+    generica.esf_max = Decimal('0.50')
+    lentes.regenerar_grade_incremental(generica)
+
+    generica.esf_max = Decimal('1.50')  # 0.75 e 1.00 voltam; 1.25 e 1.50 são novas
+    resumo = lentes.regenerar_grade_incremental(generica)
+
+    assert resumo == {'mantidas': 7 * 5 * 3, 'novas': 4 * 5 * 3, 'removidas': 0}
+    atuais = _codigos(generica)
+    for chave, codigo in originais.items():
+        assert atuais[chave] == codigo
+    novos = sorted(codigo for chave, codigo in atuais.items() if chave[0] in ('1.25', '1.50'))
+    base = generica.codigo_base
+    assert novos == [f"{base}{seq:04d}" for seq in range(len(originais) + 1, len(originais) + 31)]
+    grade = lentes.cache_grades().obter(generica.codigo_base)
+    assert grade.n_removidas == 0
+    assert len(set(atuais.values())) == len(atuais)
+
+
+def test_regeneracao_sem_mudar_eixos_so_regrava_cabecalho(generica):
+    lentes.salvar_grade_compactada(generica, lentes.gerar_combinacoes_lente(generica))
+    originais = _codigos(generica)
+
+    generica.preco_base = Decimal('199.90')
+    resumo = lentes.regenerar_grade_incremental(generica)
+
+    assert resumo == {'mantidas': len(originais), 'novas': 0, 'removidas': 0}
+    assert _codigos(generica) == originais
+    assert lentes.buscar_combinacao_na_grade(generica.codigo_base, '0.00', '0.00', '1.00')['preco'] == 199.9
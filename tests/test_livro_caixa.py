@@ -0,0 +1,61 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from app.extensions import db
+from app.models import Caixa, VendaPagamento
+from app.utils.livro_caixa import registrar_pagamento, registrar_movimento, totais_por_forma, saldo_esperado
+
+
+@pytest.fixture
+def caixa(app, usuario):
+    aberto = Caixa(cai_data=date.today(), cai_loja=usuario.loja_id or '01', cai_status='aberto',
+                   cai_saldo_inicial=Decimal('50.00'))
+    db.session.add(aberto)
+    db.session.commit()
+    return aberto
+
+
+@pytest.mark.parametrize('valor', ['NaN', 'nan', 'Infinity', '-Infinity', 'sNaN', '0', '-10', 'abc'])
+def test_pdv_recusa_valor_invalido(cliente, caixa, valor):
+    resposta = cliente.post('/caixa/pdv', data={'acao': 'finalizar', 'pagamento': 'dinheiro', 'valor': valor})
+
+    assert resposta.status_code == 302
+    assert VendaPagamento.query.count() == 0
+    assert totais_por_forma(caixa.cai_reg) == {}
+
+
+def test_pdv_cartao_exige_comprovante(cliente, caixa):
+    cliente.post('/caixa/pdv', data={'acao': 'finalizar', 'pagamento': 'credito', 'valor': '80,00'})
+    assert VendaPagamento.query.count() == 0
+
+    cliente.post('/caixa/pdv', data={'acao': 'finalizar', 'pagamento': 'credito', 'valor': '80,00',
+                                     'cv_numero': '123456'})
+    pagamento = VendaPagamento.query.one()
+    assert (pagamento.vp_forma, pagamento.vp_valor, pagamento.vp_cv_numero) == ('credito', Decimal('80.00'), 123456)
+    assert totais_por_forma(caixa.cai_reg) == {'credito': Decimal('80.00')}
+
+
+@pytest.mark.parametrize('valor', [Decimal('NaN'), float('inf'), 'Infinity'])
+def test_livro_recusa_valor_nao_finito(caixa, valor):
+    with pytest.raises(ValueError):
+        registrar_pagamento(caixa, 'dinheiro', valor)
+    with pytest.raises(ValueError):
+        registrar_movimento(caixa, 'sangria', valor)
+
+
+def test_fechamento_compara_com_o_esperado_pelo_livro(cliente, caixa):
+    registrar_pagamento(caixa, 'dinheiro', '300.00')
+    registrar_pagamento(caixa, 'pix', '80.00')
+    registrar_movimento(caixa, 'sangria', '100.00')
+    db.session.commit()
+    assert saldo_esperado(caixa) == Decimal('330.00')
+
+    # Gaveta conferida certa: 300 vendidos - 100 de sangria em dinheiro, mais o PIX
+    cliente.post('/caixa/fechar', data={'dinheiro_caixa': '200.00', 'pix_caixa': '80.00'})
+
+    db.session.refresh(caixa)
+    assert caixa.cai_status == 'encerrado'
+    assert caixa.cai_total_sistema == Decimal('330.00')
+    assert caixa.cai_total_conferencia == Decimal('330.00')
+    assert caixa.cai_falta == Decimal('0.00')
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+from app.extensions import db
+from app.models import OrdemServico, OrdemServicoEvento
+from app.utils import os_eventos
+from app.utils.os_eventos import cursor_eventos, eventos_desde, aguardar_eventos, JANELA
+
+
+def _evento(reg=None, os_numero='0000001'):
+    db.session.add(OrdemServicoEvento(ev_reg=reg, ev_os_numero=os_numero, ev_loja='01',
+                                      ev_status_anterior='venda_concluida', ev_status='liberado_compra'))
+    db.session.commit()
+
+
+@pytest.fixture
+def monitor(app, monkeypatch):
+    app.config.update(MONITOR_ESPERA=1.0, MONITOR_INTERVALO=0.05, MONITOR_ESPERAS=2)
+    monkeypatch.setattr(os_eventos, '_esperas', None)
+    return app
+
+
+def test_cursor_sem_eventos(app):
+    assert cursor_eventos() == {'ultimo': 0, 'lacunas': []}
+
+
+def test_cursor_aponta_ids_ainda_nao_confirmados(app):
+    for reg in (1, 2, 5, 7):  # 3, 4 e 6 ainda não confirmados (Postgres: transações em andamento)
+        _evento(reg)
+
+    assert cursor_eventos() == {'ultimo': 7, 'lacunas': [3, 4, 6]}
+
+
+def test_cursor_ignora_lacunas_fora_da_janela(app):
+    _evento(1)
+    _evento(JANELA + 10)
+
+    cursor = cursor_eventos()
+
+    assert cursor['ultimo'] == JANELA + 10
+    assert cursor['lacunas'] == list(range(11, JANELA + 10))
+
+
+def test_eventos_desde_traz_lacuna_confirmada_depois(app):
+    for reg in (1, 2, 4):
+        _evento(reg)
+    cursor = cursor_eventos()
+    assert cursor == {'ultimo': 4, 'lacunas': [3]}
+
+    _evento(3)  # a transação do id 3 confirmou depois da do 4
+    _evento(5)
+
+    assert [e.ev_reg for e in eventos_desde(cursor['ultimo'], cursor['lacunas'])] == [3, 5]
+    # lacunas fora da janela ou acima do cursor não ampliam a consulta
+    assert [e.ev_reg for e in eventos_desde(4, [3, 9])] == [3, 5]
+    assert [e.ev_reg for e in eventos_desde(JANELA + 4, [3])] == []
+
+
+def test_mudanca_de_status_gera_evento(app):
+    ordem = OrdemServico(os_numero='0000009', cv_numero=1, loja_id='01', status='venda_concluida')
+    db.session.add(ordem)
+    db.session.commit()
+    ordem.status = 'liberado_compra'
+    db.session.commit()
+
+    eventos = [(e.ev_os_numero, e.ev_status_anterior, e.ev_status) for e in eventos_desde(0)]
+    assert eventos == [('0000009', None, 'venda_concluida'), ('0000009', 'venda_concluida', 'liberado_compra')]
+
+
+def test_long_poll_volta_quando_surge_evento(monitor):
+    ordem = OrdemServico(os_numero='0000010', cv_numero=1, loja_id='01', status='venda_concluida')
+    db.session.add(ordem)
+    db.session.commit()
+    ultimo = cursor_eventos()['ultimo']
+
+    def liberar():
+        time.sleep(0.2)
+        with monitor.app_context():
+            os_ = db.session.get(OrdemServico, '0000010')
+            os_.status = 'liberado_compra'
+            db.session.commit()
+
+    thread = threading.Thread(target=liberar)
+    inicio = time.monotonic()
+    thread.start()
+    eventos, esperou = aguardar_eventos(ultimo)
+    thread.join()
+
+    assert esperou
+    assert [e.ev_status for e in eventos] == ['liberado_compra']
+    assert time.monotonic() - inicio < monitor.config['MONITOR_ESPERA']
+
+
+def test_long_poll_sem_eventos_volta_vazio_no_prazo(monitor):
+    monitor.config['MONITOR_ESPERA'] = 0.2
+
+    assert aguardar_eventos(0) == ([], True)
+
+
+def test_long_poll_sem_vaga_volta_na_hora(monitor, monkeypatch):
+    vagas = threading.BoundedSemaphore(1)
+    vagas.acquire()
+    monkeypatch.setattr(os_eventos, '_esperas', vagas)
+
+    inicio = time.monotonic()
+    assert aguardar_eventos(0) == ([], False)
+    assert time.monotonic() - inicio < 0.1
+
+
+def test_rota_de_eventos(cliente, monitor):
+    for reg in (1, 2, 4):
+        _evento(reg)
+    _evento(3)
+
+    dados = cliente.get('/caixa/producao/eventos?desde=4&lacunas=3,x,').get_json()
+
+    assert [e['id'] for e in dados['eventos']] == [3]
+    assert dados['repetir_em_ms'] == 0
@@ -0,0 +1,95 @@
+import pytest
+from app.extensions import db
+from app.models import OrdemServico, ContagemStatusOS
+from app.utils.inicializacao import inicializar_banco
+from app.utils.os_status import (
+    transicao_permitida, mudar_status, TransicaoInvalida, CANCELADA,
+    reconstruir_contagens, contagens_por_status, contagens_por_loja,
+)
+
+
+def _os(numero, loja='01', status='venda_concluida'):
+    ordem = OrdemServico(os_numero=numero, cv_numero=int(numero), loja_id=loja, status=status)
+    db.session.add(ordem)
+    return ordem
+
+
+@pytest.fixture
+def ordens(app):
+    ordens = [_os('0000001'), _os('0000002'), _os('0000003', loja='02'), _os('0000004', status='garantia')]
+    db.session.commit()
+    return ordens
+
+
+def test_transicoes_permitidas():
+    assert transicao_permitida('venda_concluida', 'liberado_compra')
+    assert transicao_permitida('lente_recebida', 'servico_aguardando_armação')
+    assert not transicao_permitida('venda_concluida', 'servico_pronto_entrega')
+    assert not transicao_permitida('servico_pronto_entrega', 'aberta')
+    assert transicao_permitida('aguardando_lentes', CANCELADA)
+    assert not transicao_permitida(CANCELADA, CANCELADA)
+
+
+def test_mudar_status_recusa_transicao_invalida(ordens):
+    ordem = ordens[0]
+
+    with pytest.raises(TransicaoInvalida):
+        mudar_status(ordem, 'servico_pronto_entrega')
+    assert ordem.status == 'venda_concluida'
+
+    mudar_status(ordem, 'liberado_compra')
+    db.session.commit()
+    assert db.session.get(OrdemServico, '0000001').status == 'liberado_compra'
+
+
+def test_contagens_acompanham_criacao_transicao_e_exclusao(ordens):
+    assert contagens_por_loja() == {'01': {'venda_concluida': 2, 'garantia': 1}, '02': {'venda_concluida': 1}}
+
+    mudar_status(ordens[0], 'liberado_compra')
+    mudar_status(ordens[3], 'liberado_compra')
+    db.session.commit()
+    mudar_status(ordens[0], 'aguardando_lentes')
+    db.session.delete(ordens[2])
+    db.session.commit()
+
+    assert contagens_por_loja() == {'01': {'venda_concluida': 1, 'liberado_compra': 1, 'aguardando_lentes': 1}}
+    assert contagens_por_status() == {'venda_concluida': 1, 'liberado_compra': 1, 'aguardando_lentes': 1}
+    assert contagens_por_status('02') == {}
+
+
+def test_contagens_desfeitas_com_rollback(ordens):
+    mudar_status(ordens[0], 'liberado_compra')
+    db.session.flush()
+    db.session.rollback()
+
+    assert contagens_por_status('01') == {'venda_concluida': 2, 'garantia': 1}
+
+
+def test_reconstruir_contagens(ordens):
+    # Tabela de contagem fora de sincronia (ex: status alterado por SQL direto)
+    db.session.execute(OrdemServico.__table__.update()
+                       .where(OrdemServico.os_numero == '0000002').values(status=CANCELADA))
+    db.session.query(ContagemStatusOS).filter_by(cs_loja='02').delete()
+    db.session.commit()
+    assert contagens_por_status() == {'venda_concluida': 2, 'garantia': 1}
+
+    reconstruir_contagens()
+    db.session.commit()
+
+    assert contagens_por_loja() == {'01': {'venda_concluida': 1, CANCELADA: 1, 'garantia': 1},
+                                    '02': {'venda_concluida': 1}}
+
+
+def test_inicializacao_reconstroi_contagem_vazia(ordens):
+    db.session.query(ContagemStatusOS).delete()
+    db.session.commit()
+
+    inicializar_banco()
+
+    assert contagens_por_status() == {'venda_concluida': 3, 'garantia': 1}
+
+
+def test_painel_de_producao(cliente, ordens):
+    resposta = cliente.get('/caixa/producao/painel')
+
+    assert resposta.status_code == 200
@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+import pytest
+from app.extensions import db
+from app.models import Caixa
+from app.utils.paginacao import paginar
+
+
+@pytest.fixture
+def caixas(app):
+    """Caixas com datas repetidas e nulas, gravados fora de ordem."""
+    inicio = date(2026, 1, 1)
+    datas = [inicio + timedelta(days=d % 4) if d % 3 else None for d in range(17)]
+    novos = [Caixa(cai_data=dia, cai_loja='01', cai_status='fechado') for dia in datas]
+    db.session.add_all(novos)
+    db.session.flush()
+    # cai_data tem default: None no objeto viraria a data de hoje
+    nulos = [c.cai_reg for c, dia in zip(novos, datas) if dia is None]
+    Caixa.query.filter(Caixa.cai_reg.in_(nulos)).update({'cai_data': None})
+    db.session.commit()
+    return Caixa.query.all()
+
+
+def _todas_as_paginas(query, *ordem, tamanho=3):
+    vistos, cursor = [], ''
+    while True:
+        pagina = paginar(query, *ordem, cursor=cursor, tamanho=tamanho)
+        vistos.extend(pagina.itens)
+        if pagina.proximo is None:
+            return vistos
+        cursor = pagina.proximo
+
+
+def test_ordem_decrescente_com_nulos_por_ultimo(caixas):
+    esperado = sorted(caixas, key=lambda c: (c.cai_data is None, -(c.cai_data or date.min).toordinal(), -c.cai_reg))
+
+    vistos = _todas_as_paginas(Caixa.query, Caixa.cai_data.desc(), Caixa.cai_reg.desc())
+
+    assert [c.cai_reg for c in vistos] == [c.cai_reg for c in esperado]
+
+
+def test_ordem_crescente_com_nulos_por_ultimo(caixas):
+    esperado = sorted(caixas, key=lambda c: (c.cai_data is None, c.cai_data or date.min, c.cai_reg))
+
+    vistos = _todas_as_paginas(Caixa.query, Caixa.cai_data, Caixa.cai_reg, tamanho=4)
+
+    assert [c.cai_reg for c in vistos] == [c.cai_reg for c in esperado]
+
+
+def test_pagina_que_termina_num_nulo(caixas):
+    nulos = sum(1 for c in caixas if c.cai_data is None)
+    com_data = len(caixas) - nulos
+
+    primeira = paginar(Caixa.query, Caixa.cai_data.desc(), Caixa.cai_reg.desc(), cursor='', tamanho=com_data + 1)
+    assert primeira.itens[-1].cai_data is None
+    resto = paginar(Caixa.query, Caixa.cai_data.desc(), Caixa.cai_reg.desc(), cursor=primeira.proximo, tamanho=50)
+
+    assert len(resto.itens) == nulos - 1
+    assert all(c.cai_data is None for c in resto.itens)
+    assert not {c.cai_reg for c in resto.itens} & {c.cai_reg for c in primeira.itens}
+
+
+def test_cursor_invalido_volta_para_a_primeira_pagina(caixas):
+    pagina = paginar(Caixa.query, Caixa.cai_data.desc(), Caixa.cai_reg.desc(), cursor='lixo', tamanho=5)
+
+    assert pagina.primeira
+    assert len(pagina.itens) == 5
@@ -0,0 +1,71 @@
+import threading
+
+from app.extensions import db
+from app.models import Sequencia
+from app.utils import sequencias
+from app.utils.sequencias import proximo_numero
+
+
+def test_primeiro_numero_parte_do_maior_existente(app):
+    chamadas = []
+
+    def maior_existente():
+        chamadas.append(1)
+        return 41
+
+    assert proximo_numero('cv', inicial=maior_existente) == 42
+    assert proximo_numero('cv', inicial=maior_existente) == 43
+    assert len(chamadas) == 1  # só na criação do contador
+    db.session.commit()
+    assert db.session.get(Sequencia, ('cv', '00')).seq_valor == 43
+
+
+def test_sequencias_independentes_por_loja(app):
+    assert proximo_numero('os', '01') == 1
+    assert proximo_numero('os', '01') == 2
+    assert proximo_numero('os', '02') == 1
+    assert proximo_numero('oc_2026') == 1
+
+
+def test_rollback_devolve_o_numero(app):
+    assert proximo_numero('cv') == 1
+    db.session.commit()
+    assert proximo_numero('cv') == 2
+    db.session.rollback()
+    assert proximo_numero('cv') == 2
+
+
+def test_reserva_em_bloco(app, monkeypatch):
+    monkeypatch.setattr(sequencias, '_blocos', {})
+    numeros = [proximo_numero('produto', bloco=5) for _ in range(7)]
+
+    assert numeros == list(range(1, 8))
+    # dois blocos reservados no banco, mesmo com só 7 números entregues
+    assert db.session.get(Sequencia, ('produto', '00')).seq_valor == 10
+
+
+def test_numeros_unicos_com_threads_concorrentes(app):
+    db.session.commit()
+    numeros = []
+    erros = []
+    lock = threading.Lock()
+
+    def alocar():
+        with app.app_context():
+            try:
+                for _ in range(10):
+                    numero = proximo_numero('cv', inicial=lambda: 100)
+                    db.session.commit()
+                    with lock:
+                        numeros.append(numero)
+            except Exception as e:
+                erros.append(e)
+
+    threads = [threading.Thread(target=alocar) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not erros
+    assert sorted(numeros) == list(range(101, 181))